@@ -56,7 +56,11 @@ from flask_limiter.util import get_remote_address
 import openai
 from factories.llm_provider_factory import LLMProviderFactory
 
-from services.embedding_strategies import CohereEmbeddingStrategy
+from services.embedding_cache import EmbeddingCache
+from services.embedding_strategies import (
+    CohereBatchEmbeddingStrategy,
+    CohereEmbeddingStrategy,
+)
 from services.document_processing_strategies import SegmentationStrategy
 
 
@@ -250,8 +254,19 @@ def create_app(config_object=None):
     selected_config = treeseg_configs["augmend"]
     prompt = app.config["RAG_GENERATION_PROMPT"]
 
-    embedding_strategy = CohereEmbeddingStrategy(
-        embeddings_providers=embeddings_providers
+    embedding_cache = (
+        EmbeddingCache(config_object.EMBEDDING_CACHE_PATH)
+        if config_object.EMBEDDING_CACHE_PATH
+        else None
+    )
+    # The strategy is only used for background ingestion, so it may use embed jobs
+    embedding_strategy_class = (
+        CohereBatchEmbeddingStrategy
+        if config_object.EMBEDDING_BATCH_JOBS
+        else CohereEmbeddingStrategy
+    )
+    embedding_strategy = embedding_strategy_class(
+        embeddings_providers=embeddings_providers, embedding_cache=embedding_cache
     )
 
     # Initialize processing strategy with treeseg config
@@ -442,6 +457,7 @@ def create_app(config_object=None):
 
     # Register shutdown
     atexit.register(lambda: scheduler.shutdown())
+    atexit.register(embeddings_providers["voyage"].provider.close_sessions)
 
     @app.after_request
     def log_response_headers(response):
@@ -46,12 +46,16 @@ def create_petition_blueprint(chat_pdf, email_service, file_service: FileService
 
         # Check if a file with the same title already exists in the public index
         if title:
-            existing_document = FileMetadata.objects(
-                title=title,
-                index_names__in=[
-                    "FIX_DOC_PETITION_ROUTES_INDEX"
-                ],  # Note: this needs to be a list
-            ).first()
+            existing_document = (
+                FileMetadata.objects(
+                    title=title,
+                    index_names__in=[
+                        "FIX_DOC_PETITION_ROUTES_INDEX"
+                    ],  # Note: this needs to be a list
+                )
+                .only("id")
+                .first()
+            )
             if existing_document:
                 return (
                     jsonify(
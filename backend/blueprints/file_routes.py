@@ -198,17 +198,24 @@ def create_file_blueprint(
             ):
                 has_permission = True
 
-            # Check organization permissions
+            # Check organization permissions: one query for the organizations owning
+            # the document's indices, one existence check for a membership in any
             if not has_permission:
-                for index_name in metadata.index_names:
-                    organization = Organization.objects(index_name=index_name).first()
-                    if organization:
-                        user_org = UserOrganization.objects(
-                            user=current_user.id, organization=organization.id
-                        ).first()
-                        if user_org:
-                            has_permission = True
-                            break
+                org_ids = list(
+                    Organization.objects(index_name__in=metadata.index_names).scalar(
+                        "id"
+                    )
+                )
+                has_permission = (
+                    bool(org_ids)
+                    and UserOrganization.objects(
+                        user=current_user.id, organization__in=org_ids
+                    )
+                    .only("id")
+                    .limit(1)
+                    .first()
+                    is not None
+                )
 
             if not has_permission:
                 error_message, _ = log_error(
@@ -3,10 +3,24 @@ from flask_mail import Message as MailMessage
 
 from loguru import logger
 
+from services.mongodb_service import is_db_ready
+
 
 def create_misc_blueprint(email_service):
     misc_bp = Blueprint("misc", __name__, url_prefix="/api")
 
+    @misc_bp.route("/livez", methods=["GET"])
+    def livez():
+        """Liveness probe: the worker is up and serving requests."""
+        return jsonify({"status": "ok"}), 200
+
+    @misc_bp.route("/readyz", methods=["GET"])
+    def readyz():
+        """Readiness probe: MongoDB has been reached."""
+        if not is_db_ready():
+            return jsonify({"status": "starting"}), 503
+        return jsonify({"status": "ok"}), 200
+
     @misc_bp.route("/contact", methods=["POST"])
     def contact_us():
         try:
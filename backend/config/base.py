@@ -40,6 +40,17 @@ class BaseConfig:
     ELASTICSEARCH_USER = env.str("ELASTICSEARCH_USER")
     ELASTICSEARCH_PASSWORD = env.str("ELASTICSEARCH_PASSWORD")
     MONGODB_URI = env.str("MONGODB_URI", "mongodb://localhost:27017/documents")
+    # MongoDB connection pool bounds per worker process. gevent workers run many
+    # greenlets each, so the maximum stays well above the CPU count; connections
+    # are opened on demand rather than held idle.
+    MONGO_MAX_POOL = env.int("MONGO_MAX_POOL", 100)
+    MONGO_MIN_POOL = env.int("MONGO_MIN_POOL", 0)
+    # Global write concern, e.g. "majority" or "1". Opt-in: it used to be forced
+    # to "majority", unset now leaves the server's default write concern
+    MONGO_WRITE_CONCERN = env.str("MONGO_WRITE_CONCERN", None)
+    # Start serving before MongoDB answers. Only enable where a readiness probe
+    # on /api/readyz keeps traffic away until the database is reached
+    MONGO_CONNECT_IN_BACKGROUND = env.bool("MONGO_CONNECT_IN_BACKGROUND", False)
 
     # AWS configuration
     AWS_REGION = env.str("AWS_REGION", "us-west-1")
@@ -70,6 +81,10 @@ class BaseConfig:
     STRIPE_WEBHOOK_SECRET = env.str("STRIPE_WEBHOOK_SECRET")
     HYPERBOLIC_API_KEY = env.str("HYPERBOLIC_API_KEY")
     VOYAGE_API_KEY = env.str("VOYAGE_API_KEY")
+    # Optional SQLite file for persisting document embeddings across restarts
+    EMBEDDING_CACHE_PATH = env.str("EMBEDDING_CACHE_PATH", None)
+    # Embed ingested documents with Cohere embed jobs instead of real-time calls
+    EMBEDDING_BATCH_JOBS = env.bool("EMBEDDING_BATCH_JOBS", False)
 
     # Rate limiting defaults (can be overridden)
     RATELIMIT_DEFAULT = "200 per minute"
@@ -56,6 +56,8 @@ class FileMetadata(Document):
         "collection": "file_metadata",
         "indexes": [
             "name",
+            "s3_url",
+            ("title", "index_names"),  # Duplicate title checks on upload
             "document_hash",
             "index_names",
             "originating_user",
@@ -0,0 +1,28 @@
+from dataclasses import dataclass, fields
+from typing import Any
+
+
+@dataclass(slots=True)
+class SectionMetadata:
+    """Metadata attached to a processed document section"""
+
+    file_url: str
+    section_title: str
+    title: str
+    pages: list[int]
+    page_images: list[str]  # Base64-encoded JPEG page images
+    section_text: str
+    filter_dimensions: dict[str, Any]
+    nominal_creator_name: str
+
+    def as_dict(self) -> dict[str, Any]:
+        """Shallow dict view of the metadata, e.g. for indexing into the vector store"""
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+
+@dataclass(slots=True)
+class SectionRecord:
+    """A processed document section ready for embedding"""
+
+    contextualized_segment_text: str
+    metadata: SectionMetadata
@@ -1,6 +1,18 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Any, AsyncIterator, Iterator, Union, TypedDict
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Any,
+    AsyncIterator,
+    Iterator,
+    Union,
+    TypedDict,
+    Protocol,
+    runtime_checkable,
+)
+from utils.cache import TTLCache
 from utils.types import NOT_GIVEN, NotGiven
 import random
 import asyncio
@@ -9,6 +21,7 @@ import tiktoken
 import functools
 import time
 import base64
+from threading import Lock
 from project_types.error_types import (
     RateLimitError,
     TimeoutError,
@@ -20,6 +33,11 @@ from project_types.error_types import (
 from project_types.provider_limiter import ProviderLimiter, RateLimitConfig
 
 
+# Texts at least this long (system prompts, document content) have their token
+# counts memoized, since they are typically resent unchanged on every call
+TOKEN_COUNT_CACHE_MIN_CHARS = 2048
+
+
 class CacheControl(TypedDict, total=False):
     """Cache control settings for message content"""
 
@@ -53,6 +71,14 @@ class ProviderResponse:
     raw_response: Any = None
 
 
+@runtime_checkable
+class LLMResponse(Protocol):
+    """Structural type for non-streaming responses returned by LLM providers"""
+
+    content: str
+    raw_response: Any
+
+
 def retry_with_exponential_backoff(func):
     """Decorator to add retry logic with exponential backoff"""
 
@@ -120,6 +146,9 @@ def retry_with_exponential_backoff(func):
 class LLMProvider(ABC):
     """Abstract base class for LLM providers"""
 
+    # Whether system blocks may carry cache_control for server-side prompt caching
+    supports_prompt_cache: bool = False
+
     def __init__(self, rate_limit_config: RateLimitConfig, provider_type: str):
         self.rate_limit_config = rate_limit_config
         self.provider_type = provider_type
@@ -127,8 +156,10 @@ class LLMProvider(ABC):
         self._input_token_count = 0  # For billing tracking
         self._output_token_count = 0  # For billing tracking
         self.tokenizer = tiktoken.get_encoding("cl100k_base")  # Shared tokenizer
-        # Initialize system message cache
-        self._system_message_cache: Dict[str, Any] = {}
+        # Token counts of long texts, keyed by (length, hash) so the texts
+        # themselves are not kept alive
+        self._token_count_cache = TTLCache(maxsize=256)
+        self._token_count_lock = Lock()
 
     def _extract_image_dimensions(self, base64_data: str) -> tuple[int, int]:
         """Extract image dimensions from base64 data"""
@@ -186,6 +217,19 @@ class LLMProvider(ABC):
             logger.warning(f"Error calculating image tokens: {e}")
             return int((1568 * 1568) / 600)  # Conservative fallback
 
+    def _count_text_tokens(self, text: str) -> int:
+        """Token count of text, memoized for long texts."""
+        if len(text) < TOKEN_COUNT_CACHE_MIN_CHARS:
+            return len(self.tokenizer.encode(text))
+        key = (len(text), hash(text))
+        with self._token_count_lock:
+            tokens = self._token_count_cache.get(key)
+        if tokens is None:
+            tokens = len(self.tokenizer.encode(text))
+            with self._token_count_lock:
+                self._token_count_cache[key] = tokens
+        return tokens
+
     def _count_tokens(self, messages: List[Message]) -> int:
         """
         Centralized token counting using tiktoken.
@@ -196,14 +240,14 @@ class LLMProvider(ABC):
             for message in messages:
                 # Handle content that could be either string or list of content blocks
                 if isinstance(message.get("content"), str):
-                    content_tokens = len(self.tokenizer.encode(message["content"]))
+                    content_tokens = self._count_text_tokens(message["content"])
                     format_tokens = 4  # Basic message overhead
                     total_tokens += content_tokens + format_tokens
                 elif isinstance(message.get("content"), list):
                     for content_block in message["content"]:
                         if content_block["type"] == "text":
-                            content_tokens = len(
-                                self.tokenizer.encode(content_block["text"])
+                            content_tokens = self._count_text_tokens(
+                                content_block["text"]
                             )
                             format_tokens = 4  # Basic message overhead
                             total_tokens += content_tokens + format_tokens
@@ -16,6 +16,8 @@ from anthropic import Anthropic, AsyncAnthropic
 class AnthropicProvider(LLMProvider):
     """Anthropic implementation supporting both sync and async operations"""
 
+    supports_prompt_cache = True
+
     def __init__(
         self,
         sync_client: Optional[Anthropic] = None,
@@ -1,4 +1,7 @@
+import asyncio
+import weakref
 from typing import Optional, Union
+import aiohttp
 import voyageai
 from PIL import Image
 from project_types.embedding_provider import (
@@ -36,6 +39,30 @@ class VoyageProvider(EmbeddingProvider):
             ),
         )
         self.provider_type = "voyage"
+        # One HTTP session per event loop; aiohttp sessions are bound to a loop
+        self._sessions: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def _session(self) -> aiohttp.ClientSession:
+        """
+        Shared HTTP session for the running event loop, so async requests reuse
+        pooled connections instead of the SDK opening a new session per call.
+        """
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=100, limit_per_host=20, ttl_dns_cache=300
+                )
+            )
+            self._sessions[loop] = session
+        return session
+
+    def close_sessions(self) -> None:
+        """Close the shared sessions of event loops that are still running."""
+        for loop, session in list(self._sessions.items()):
+            if not session.closed and loop.is_running():
+                asyncio.run_coroutine_threadsafe(session.close(), loop)
 
     def _prepare_voyage_inputs(
         self, inputs: list[MultimodalInput]
@@ -179,10 +206,14 @@ class VoyageProvider(EmbeddingProvider):
             )
 
             # Use multimodal_embed for all cases as it handles both text and images
-            response = await self.async_client.multimodal_embed(
-                inputs=voyage_inputs,
-                model=model_id,
-            )
+            session_token = voyageai.aiosession.set(self._session())
+            try:
+                response = await self.async_client.multimodal_embed(
+                    inputs=voyage_inputs,
+                    model=model_id,
+                )
+            finally:
+                voyageai.aiosession.reset(session_token)
 
             # Determine input type based on inputs
             detected_type = (
@@ -3,6 +3,7 @@ This module provides functionality for processing and ingesting documents into a
 It includes text extraction, segmentation, embedding generation, and storage of document sections.
 """
 
+import asyncio
 from loguru import logger
 from utils.error_handlers import log_error
 import hashlib
@@ -15,10 +16,15 @@ from services.document_processing_strategies import (
     SegmentationStrategy,
 )
 from services.embedding_strategies import EmbeddingStrategy, CohereEmbeddingStrategy
+from project_types.document_section import SectionRecord
 from typing import Any, Optional, Callable
 import unicodedata
 import re
 
+# Sections embedded and indexed at once during ingestion; enough to fill one
+# Cohere embedding batch while keeping the streamed sections bounded
+MAX_SECTIONS_IN_FLIGHT = 96
+
 
 def slugify(text):
     """
@@ -110,6 +116,101 @@ class DocumentProcessor:
             log_error(e, "Error calculating document hash")
             return ""
 
+    def _record_file_metadata(
+        self,
+        file_path: str,
+        file_url: str,
+        title: str,
+        thumbnail_urls: list[str],
+        index_names: list[str],
+        index_display_names: dict[str, str],
+        file_visibility: str,
+        originating_user_id: str,
+        filter_dimensions: dict,
+        nominal_creator_name: str,
+    ) -> list[str]:
+        """
+        Create or update the FileMetadata object of the document in each index.
+
+        Blocking (file hashing and MongoDB calls), so ingest runs it in a worker
+        thread.
+
+        Returns:
+            list[str]: The FileMetadata ids, one per index
+        """
+        doc_ids = []
+        # Process each index separately
+        for index_name in index_names:
+            # Calculate document hash for this index
+            document_hash = self.calculate_document_hash(file_path, index_name)
+
+            # Check if document already exists in this index
+            existing_doc = FileMetadata.objects(
+                document_hash=document_hash, index_names=[index_name]
+            ).first()
+            index_display_name = index_display_names[index_name]
+
+            if existing_doc:
+                logger.info(
+                    f"Document with hash {document_hash} already exists in index {index_name}. Updating metadata."
+                )
+                # Update existing document metadata
+                args = {
+                    "title": title,
+                    "s3_url": file_url,
+                    "thumbnail_urls": thumbnail_urls,
+                    "visibility": file_visibility,
+                    "originating_user": User.objects(
+                        id=str(originating_user_id)
+                    ).first(),
+                    "organizations": [
+                        Organization.objects(index_name=index_name).first()
+                    ],
+                    "filter_dimensions": filter_dimensions,
+                    "is_deleted": False,
+                    "index_display_name": index_display_name,
+                }
+                if nominal_creator_name:
+                    args["nominal_creator_name"] = nominal_creator_name
+                elif existing_doc.nominal_creator_name:
+                    args["nominal_creator_name"] = existing_doc.nominal_creator_name
+
+                existing_doc.update(**args)
+                doc = existing_doc
+            else:
+                logger.info(
+                    f"Processing new document with hash {document_hash} for index {index_name}"
+                )
+                # Create and save new FileMetadata object for this index
+                args = {
+                    "name": title,
+                    "s3_url": file_url,
+                    "document_hash": document_hash,
+                    "title": title,
+                    "index_names": [index_name],
+                    "thumbnail_urls": thumbnail_urls,
+                    "visibility": file_visibility,
+                    "originating_user": User.objects(
+                        id=str(originating_user_id)
+                    ).first(),
+                    "organizations": [
+                        Organization.objects(index_name=index_name).first()
+                    ],
+                    "filter_dimensions": filter_dimensions,
+                    "index_display_name": index_display_name,
+                }
+                if nominal_creator_name:
+                    args["nominal_creator_name"] = nominal_creator_name
+
+                doc = FileMetadata(**args)
+                doc.save()
+                logger.info(
+                    f"New FileMetadata object created and saved for document: {title} in index {index_name}"
+                )
+            doc_ids.append(str(doc.id))
+
+        return doc_ids
+
     async def ingest(
         self,
         file_path: str,
@@ -149,146 +250,60 @@ class DocumentProcessor:
                 if progress_callback:
                     progress_callback(progress, step)
 
-            # Process the document using the configured strategy (0.0 -> 0.4)
-            update_progress(0.0, "Starting text extraction")
-            processed_sections = await self.processing_strategy.process_document(
-                file_path=file_path,
-                file_url=file_url,
-                title=title,
-                filter_dimensions=filter_dimensions,
-                nominal_creator_name=nominal_creator_name,
-                llm_providers=self.llm_providers,
+            index_display_names = await asyncio.to_thread(
+                lambda: {
+                    index_name: IndexRegistry.objects.get(
+                        index_name=index_name
+                    ).index_display_name
+                    for index_name in index_names
+                }
             )
 
-            if not processed_sections:
-                logger.error("No sections were processed from the document.")
-                return None
-
-            update_progress(0.4, "Text extraction complete")
+            # Sections are streamed from the processing strategy, so each one is
+            # embedded and indexed as soon as it is ready (0.0 -> 0.8). Sections
+            # are embedded concurrently so the embedding strategy can batch them,
+            # but at most MAX_SECTIONS_IN_FLIGHT at a time: the stream is not
+            # read further until one finishes, and finished sections are let go.
+            update_progress(0.0, "Starting text extraction")
+            logger.info("Generating and indexing embeddings for processed sections.")
+            section_count = 0
+            embedded_count = 0
 
-            # Generate embeddings for processed sections (0.4 -> 0.8)
-            logger.info("Generating embeddings for processed sections.")
-            documents_with_embeddings = []
-            total_sections = len(processed_sections)
+            async def embed_and_index(section: SectionRecord) -> None:
+                nonlocal embedded_count
 
-            for i, section in enumerate(processed_sections):
                 embedding = await self.embedding_strategy.embed_document(section)
-                if embedding:
-                    documents_with_embeddings.append(
-                        {**section, "embedding": embedding}
-                    )
-                    # Update progress for each section
-                    section_progress = 0.4 + (0.4 * ((i + 1) / total_sections))
-                    update_progress(
-                        section_progress,
-                        f"Generating embeddings ({i + 1}/{total_sections})",
-                    )
-                else:
+                if embedding is None:
                     logger.info(
                         f"No embedding generated for section {section}. Embedding: {embedding}"
                     )
-
-            logger.info(
-                f"Generated embeddings for {len(documents_with_embeddings)} sections."
-            )
-
-            # Index documents (0.8 -> 1.0)
-            update_progress(0.8, "Starting vector store indexing")
-
-            # Process each index separately
-            for index_name in index_names:
-                # Calculate document hash for this index
-                document_hash = self.calculate_document_hash(file_path, index_name)
-
-                # Check if document already exists in this index
-                existing_doc = FileMetadata.objects(
-                    document_hash=document_hash, index_names=[index_name]
-                ).first()
-                index_display_name = IndexRegistry.objects.get(
-                    index_name=index_name
-                ).index_display_name
-
-                if existing_doc:
-                    logger.info(
-                        f"Document with hash {document_hash} already exists in index {index_name}. Updating metadata."
-                    )
-                    # Update existing document metadata
-                    args = {
-                        "title": title,
-                        "s3_url": file_url,
-                        "thumbnail_urls": thumbnail_urls,
-                        "visibility": file_visibility,
-                        "originating_user": User.objects(
-                            id=str(originating_user_id)
-                        ).first(),
-                        "organizations": [
-                            Organization.objects(index_name=index_name).first()
-                        ],
-                        "filter_dimensions": filter_dimensions,
-                        "is_deleted": False,
-                        "index_display_name": index_display_name,
-                    }
-                    if nominal_creator_name:
-                        args["nominal_creator_name"] = nominal_creator_name
-                    elif existing_doc.nominal_creator_name:
-                        args["nominal_creator_name"] = existing_doc.nominal_creator_name
-
-                    existing_doc.update(**args)
-                    doc = existing_doc
-                else:
-                    logger.info(
-                        f"Processing new document with hash {document_hash} for index {index_name}"
-                    )
-                    # Create and save new FileMetadata object for this index
-                    args = {
-                        "name": title,
-                        "s3_url": file_url,
-                        "document_hash": document_hash,
-                        "title": title,
-                        "index_names": [index_name],
-                        "thumbnail_urls": thumbnail_urls,
-                        "visibility": file_visibility,
-                        "originating_user": User.objects(
-                            id=str(originating_user_id)
-                        ).first(),
-                        "organizations": [
-                            Organization.objects(index_name=index_name).first()
-                        ],
-                        "filter_dimensions": filter_dimensions,
-                        "index_display_name": index_display_name,
-                    }
-                    if nominal_creator_name:
-                        args["nominal_creator_name"] = nominal_creator_name
-
-                    doc = FileMetadata(**args)
-                    doc.save()
-                    logger.info(
-                        f"New FileMetadata object created and saved for document: {title} in index {index_name}"
-                    )
-
-                # Add embeddings to vector store for this index
-                for doc_with_embedding in documents_with_embeddings:
-                    embedding = doc_with_embedding["embedding"]
+                    return
+                if len(embedding) != self.dims:
+                    logger.error(f"Invalid embedding for document: {section.metadata}")
+                    return
+                embedded_count += 1
+
+                # Add the embedding to the vector store for each index
+                for index_name in index_names:
                     try:
-                        if embedding is None or len(embedding) != self.dims:
-                            logger.error(
-                                f"Invalid embedding for document: {doc_with_embedding['metadata']}"
-                            )
-                            continue
-
-                        metadata = doc_with_embedding["metadata"]
-                        metadata["contextualized_segment_text"] = doc_with_embedding[
-                            "contextualized_segment_text"
-                        ]
+                        metadata = section.metadata.as_dict()
+                        metadata["contextualized_segment_text"] = (
+                            section.contextualized_segment_text
+                        )
                         metadata["index_names"] = [index_name]
-                        metadata["index_display_name"] = index_display_name
+                        metadata["index_display_name"] = index_display_names[index_name]
 
                         logger.debug(
                             f"Adding embedding to vector store for index {index_name}: {metadata}"
                         )
 
-                        self.vector_store.add_embedding(
-                            embedding, metadata, index_name=index_name
+                        # Indexing is blocking Elasticsearch I/O, keep it off the
+                        # event loop that every upload's ingestion shares
+                        await asyncio.to_thread(
+                            self.vector_store.add_embedding,
+                            embedding,
+                            metadata,
+                            index_name=index_name,
                         )
                     except Exception as e:
                         log_error(
@@ -296,24 +311,73 @@ class DocumentProcessor:
                             f"Error adding document to vector store in index {index_name}",
                         )
 
+                update_progress(
+                    0.4,
+                    f"Generating embeddings ({embedded_count}/{section_count} sections)",
+                )
+
+            in_flight = asyncio.Semaphore(MAX_SECTIONS_IN_FLIGHT)
+            embed_tasks: set[asyncio.Task] = set()
+            embed_errors: list[BaseException] = []
+
+            def section_done(task: asyncio.Task) -> None:
+                embed_tasks.discard(task)
+                in_flight.release()
+                if not task.cancelled() and task.exception() is not None:
+                    embed_errors.append(task.exception())
+
+            async for section in self.processing_strategy.process_document(
+                file_path=file_path,
+                file_url=file_url,
+                title=title,
+                filter_dimensions=filter_dimensions,
+                nominal_creator_name=nominal_creator_name,
+                llm_providers=self.llm_providers,
+            ):
+                if section_count == 0:
+                    update_progress(0.4, "Text extraction complete")
+                section_count += 1
+                await in_flight.acquire()
+                task = asyncio.create_task(embed_and_index(section))
+                embed_tasks.add(task)
+                task.add_done_callback(section_done)
+
+            await asyncio.gather(*embed_tasks, return_exceptions=True)
+            if embed_errors:
+                raise embed_errors[0]
+
+            if not section_count:
+                logger.error("No sections were processed from the document.")
+                return None
+
+            logger.info(
+                f"Generated embeddings for {embedded_count} of {section_count} sections."
+            )
+
+            # Record document metadata (0.8 -> 1.0)
+            update_progress(0.8, "Updating document metadata")
+
+            doc_ids = await asyncio.to_thread(
+                self._record_file_metadata,
+                file_path,
+                file_url,
+                title,
+                thumbnail_urls,
+                index_names,
+                index_display_names,
+                file_visibility,
+                originating_user_id,
+                filter_dimensions,
+                nominal_creator_name,
+            )
+
             update_progress(1.0, "Vector store indexing complete")
 
             return {
                 "message": "File uploaded and processed successfully.",
                 "document_title": title,
                 "document_url": file_url,
-                "doc_ids": [
-                    str(
-                        FileMetadata.objects(
-                            document_hash=self.calculate_document_hash(
-                                file_path, index_name
-                            )
-                        )
-                        .first()
-                        .id
-                    )
-                    for index_name in index_names
-                ],
+                "doc_ids": doc_ids,
             }
 
         except Exception as e:
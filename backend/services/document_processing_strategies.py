@@ -5,15 +5,49 @@ consistent metadata structure with the existing implementation.
 """
 
 from abc import ABC, abstractmethod
-from typing import Any, Tuple, Optional
-from project_types.llm_provider import Message
+from collections import deque
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Tuple, Optional
+from project_types.llm_provider import LLMResponse, Message
+from project_types.document_section import SectionMetadata, SectionRecord
+import asyncio
+import re
+import weakref
 import fitz  # PyMuPDF
+import numpy as np
 from treeseg.treeseg import TreeSeg
 from utils.error_handlers import log_error
 from utils.pdf_utils import extract_and_process_pdf_pages
 from loguru import logger
 
 
+TITLE_MODEL_ID = "meta-llama/Llama-3.2-3B-Instruct"
+
+# Sections covering at least this fraction of the document (e.g. tiny documents
+# that segment into a single section) are their own context, so no
+# contextualization call is made for them
+SELF_CONTAINED_SECTION_RATIO = 0.8
+
+
+# Most section-title requests a single event loop keeps in flight at once, so
+# a document with hundreds of sections does not flood the title provider. Also
+# how many titles a document requests ahead of the section being yielded.
+TITLE_MAX_CONCURRENCY = 8
+
+# Per event loop because asyncio semaphores are bound to the loop they run on
+_title_semaphores: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def _title_semaphore() -> asyncio.Semaphore:
+    """Return the section-title semaphore for the running event loop."""
+    loop = asyncio.get_running_loop()
+    semaphore = _title_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(TITLE_MAX_CONCURRENCY)
+        _title_semaphores[loop] = semaphore
+    return semaphore
+
+
 class DocumentProcessingStrategy(ABC):
     """
     Abstract base class for document processing strategies.
@@ -21,7 +55,7 @@ class DocumentProcessingStrategy(ABC):
     """
 
     @abstractmethod
-    async def process_document(
+    def process_document(
         self,
         file_path: str,
         file_url: str,
@@ -29,10 +63,14 @@ class DocumentProcessingStrategy(ABC):
         filter_dimensions: dict[str, Any],
         nominal_creator_name: str,
         llm_providers: Optional[dict[str, Any]] = None,
-    ) -> list[dict[str, Any]]:
+    ) -> AsyncIterator[SectionRecord]:
         """
         Process a document into chunks ready for embedding.
 
+        Implementations are async generators that yield each chunk as soon as it
+        is ready, so callers can embed and index while later chunks are still
+        being processed, without holding the whole document in memory.
+
         Args:
             file_path: Path to the document file
             file_url: URL where the document is accessible
@@ -41,11 +79,80 @@ class DocumentProcessingStrategy(ABC):
             nominal_creator_name: Display name of the owner organization
             llm_providers: Optional LLM providers for additional processing
 
-        Returns:
-            list of dictionaries containing processed chunks with metadata
+        Yields:
+            SectionRecord objects containing processed chunks with metadata
         """
         pass
 
+    async def _section_titles(
+        self, texts: list[str], llm_providers: Optional[dict[str, Any]]
+    ) -> AsyncIterator[str]:
+        """
+        Yield a title for each text, in order.
+
+        Up to TITLE_MAX_CONCURRENCY titles are requested ahead of the one being
+        yielded, so titling overlaps with downstream work without waiting for
+        every title before the first section is ready. Texts without content,
+        or calls without LLM providers, get "Untitled Section".
+        """
+
+        async def section_title(text: str) -> str:
+            if llm_providers and text.strip():
+                return await self._generate_section_title(text, llm_providers)
+            return "Untitled Section"
+
+        requests: deque[asyncio.Task] = deque()
+        try:
+            for text in texts:
+                requests.append(asyncio.create_task(section_title(text)))
+                if len(requests) >= TITLE_MAX_CONCURRENCY:
+                    yield await requests.popleft()
+            while requests:
+                yield await requests.popleft()
+        finally:
+            for request in requests:
+                request.cancel()
+
+    async def _generate_section_title(
+        self, section_text: str, llm_providers: dict[str, Any]
+    ) -> str:
+        """Generate a title for a section using LLM."""
+        try:
+            messages: list[Message] = [
+                {
+                    "role": "system",
+                    "content": "You summarize medical documents.",
+                },
+                {
+                    "role": "user",
+                    "content": (
+                        f"Generate a concise and descriptive title for the following section. "
+                        f"Please format the title as follows: 'Title: **Your Title Here**' or 'Title: \"Your Title Here\"'.\n\n"
+                        f"{section_text}\n\n"
+                        f"Title: **Your Title Here**"
+                    ),
+                },
+            ]
+
+            async with _title_semaphore():
+                response: LLMResponse = await llm_providers["hyperbolic"].ainvoke(
+                    messages=messages, model_id=TITLE_MODEL_ID
+                )
+            content = response.content
+
+            title_match = re.search(r"\*\*(.*?)\*\*", content)
+            if title_match:
+                return title_match.group(1).strip()
+
+            title_match = re.search(r"\"(.*?)\"", content)
+            if title_match:
+                return title_match.group(1).strip()
+
+            return "Untitled Section"
+        except Exception as e:
+            log_error(e, "Error generating section title")
+            return "Untitled Section"
+
 
 class SegmentationStrategy(DocumentProcessingStrategy):
     """
@@ -65,84 +172,114 @@ class SegmentationStrategy(DocumentProcessingStrategy):
         filter_dimensions: dict[str, Any],
         nominal_creator_name: str,
         llm_providers: Optional[dict[str, Any]] = None,
-    ) -> list[dict[str, Any]]:
+    ) -> AsyncIterator[SectionRecord]:
         try:
-            # Extract text and create component mapping
-            full_text, component_map = self._extract_text(file_path)
-            if not full_text or not component_map:
-                return []
-
-            # Extract and process page images
-            page_images = extract_and_process_pdf_pages(
-                file_path,
-                target_width=1568,  # Claude's preferred dimension
-                target_height=1568,
-                zoom=3.0,  # High quality rendering
+            # Extract text and create component mapping. PyMuPDF calls are
+            # blocking, so run them in worker threads to keep the loop responsive
+            full_text, component_map = await asyncio.to_thread(
+                self._extract_text, file_path
             )
+            if not full_text or not component_map:
+                return
 
             # Segment the text
             sections = await self._segment_text(full_text, component_map)
             full_text_joined = " ".join(full_text)
 
-            # Process each section
-            processed_sections = []
-            for section in sections:
-                if llm_providers and "anthropic" in llm_providers:
-                    # Generate title and context if LLM providers are available
-                    section_title = await self._generate_section_title(
-                        section["text"], llm_providers
-                    )
-                    context, usage = await self._generate_context(
-                        full_text_joined, section["text"], llm_providers
-                    )
-                    logger.info(
-                        f"Generated section title *{section_title}* and context {context}"
+            # Bind the joined document text once so every section's context
+            # request references the same string instead of re-passing it
+            async def generate_context(section_text: str) -> Tuple[str, Any]:
+                return await self._generate_context(
+                    full_text_joined, section_text, llm_providers
+                )
+
+            use_llm = bool(llm_providers and "anthropic" in llm_providers)
+
+            # Page images of the previous section, reused for pages it shares with
+            # the next one; only the pages of the section being built are held
+            previous_images: dict[int, str] = {}
+
+            # Process each section, titled a bounded window ahead
+            async with aclosing(
+                self._section_titles(
+                    [section["text"] for section in sections],
+                    llm_providers if use_llm else None,
+                )
+            ) as section_titles:
+                for section in sections:
+                    # Render the section's new pages while its context is generated
+                    new_pages = [
+                        page_num
+                        for page_num in section["pages"]
+                        if page_num not in previous_images
+                    ]
+                    render_task = asyncio.create_task(
+                        asyncio.to_thread(
+                            extract_and_process_pdf_pages,
+                            file_path,
+                            target_width=1568,  # Claude's preferred dimension
+                            target_height=1568,
+                            pages=new_pages,
+                        )
                     )
-                else:
-                    section_title = "Untitled Section"
-                    context = ""
-
-                # Get page images for this section
-                section_page_images = [
-                    page_images[page_num - 1]
-                    for page_num in section["pages"]
-                    if 0 <= page_num - 1 < len(page_images)
-                ]
-
-                processed_sections.append(
-                    {
-                        "contextualized_segment_text": f"{context}\n\n{section['text']}"
+                    section_title = await anext(section_titles)
+
+                    if use_llm and (
+                        len(section["text"])
+                        < SELF_CONTAINED_SECTION_RATIO * len(full_text_joined)
+                    ):
+                        # Generate context if LLM providers are available
+                        context, usage = await generate_context(section["text"])
+                        logger.info(
+                            f"Generated section title *{section_title}* and context {context}"
+                        )
+                    else:
+                        context = ""
+
+                    # Get page images for this section
+                    page_images = {
+                        **previous_images,
+                        **dict(zip(new_pages, await render_task)),
+                    }
+                    previous_images = {
+                        page_num: page_images[page_num]
+                        for page_num in section["pages"]
+                        if page_num in page_images
+                    }
+                    section_page_images = list(previous_images.values())
+
+                    yield SectionRecord(
+                        contextualized_segment_text=f"{context}\n\n{section['text']}"
                         if context
                         else section["text"],
-                        "metadata": {
-                            "file_url": file_url,
-                            "section_title": section_title,
-                            "title": title,
-                            "pages": section["pages"],
-                            "page_images": section_page_images,
-                            "section_text": section["text"],
-                            "filter_dimensions": filter_dimensions,
-                            "nominal_creator_name": nominal_creator_name,
-                        },
-                    }
-                )
+                        metadata=SectionMetadata(
+                            file_url=file_url,
+                            section_title=section_title,
+                            title=title,
+                            pages=section["pages"],
+                            page_images=section_page_images,
+                            section_text=section["text"],
+                            filter_dimensions=filter_dimensions,
+                            nominal_creator_name=nominal_creator_name,
+                        ),
+                    )
             logger.info("Processed document sections.")
-            return processed_sections
         except Exception as e:
             log_error(e, "Error processing document with SegmentationStrategy")
-            return []
 
     def _extract_text(self, file_path: str) -> Tuple[list[str], list[int]]:
         """Extract text and page mapping from PDF."""
         try:
-            document = fitz.open(file_path)
             full_text = []
             component_to_page_map = []
 
-            for page_num in range(len(document)):
-                page = document.load_page(page_num)
-                page_text = page.get_text("text")
-                if page_text:
+            with fitz.open(file_path) as document:
+                for page_num, page in enumerate(document):
+                    page_text = page.get_text("text")
+                    # Scan-only pages yield nothing (or bare whitespace); skip them
+                    # so they don't feed empty components into segmentation
+                    if not page_text.strip():
+                        continue
                     components = page_text.split("\n")
                     full_text.extend(components)
                     component_to_page_map.extend([page_num + 1] * len(components))
@@ -169,32 +306,32 @@ class SegmentationStrategy(DocumentProcessingStrategy):
 
             logger.info("Treeseg segment cuts complete.")
 
+            # Join once and slice sections out of the shared buffer using
+            # prefix-summed line offsets (+1 for each "\n" separator)
+            joined_text = "\n".join(full_text)
+            offsets = np.cumsum([0] + [len(line) + 1 for line in full_text]).tolist()
+            page_map = np.asarray(component_map)
+
+            def build_section(start: int, end: int) -> dict[str, Any]:
+                # end is exclusive; max() keeps empty ranges from going negative
+                return {
+                    "text": joined_text[
+                        offsets[start] : max(offsets[end] - 1, offsets[start])
+                    ],
+                    "pages": np.unique(page_map[start:end]).tolist(),
+                }
+
             sections = []
             section_start = 0
 
             for i, is_transition in enumerate(transitions):
                 if is_transition:
-                    section_end = i - 1
-                    section_text = "\n".join(full_text[section_start : section_end + 1])
-                    pages = sorted(set(component_map[section_start : section_end + 1]))
-                    sections.append(
-                        {
-                            "text": section_text,
-                            "pages": pages,
-                        }
-                    )
+                    sections.append(build_section(section_start, i))
                     section_start = i
 
             # Handle the last section
             if section_start < len(full_text):
-                section_text = "\n".join(full_text[section_start:])
-                pages = sorted(set(component_map[section_start:]))
-                sections.append(
-                    {
-                        "text": section_text,
-                        "pages": pages,
-                    }
-                )
+                sections.append(build_section(section_start, len(full_text)))
             logger.info("Treeseg segment agglomeration complete.")
 
             return sections
@@ -202,50 +339,6 @@ class SegmentationStrategy(DocumentProcessingStrategy):
             log_error(e, "Error segmenting text with TreeSeg")
             return []
 
-    async def _generate_section_title(
-        self, section_text: str, llm_providers: dict[str, Any]
-    ) -> str:
-        """Generate a title for a section using LLM."""
-        try:
-            messages: list[Message] = [
-                {
-                    "role": "system",
-                    "content": "You summarize medical documents.",
-                },
-                {
-                    "role": "user",
-                    "content": (
-                        f"Generate a concise and descriptive title for the following section. "
-                        f"Please format the title as follows: 'Title: **Your Title Here**' or 'Title: \"Your Title Here\"'.\n\n"
-                        f"{section_text}\n\n"
-                        f"Title: **Your Title Here**"
-                    ),
-                },
-            ]
-
-            response = await llm_providers["hyperbolic"].ainvoke(
-                messages=messages,
-                model_id="meta-llama/Llama-3.2-3B-Instruct",
-            )
-            content = (
-                response.content if hasattr(response, "content") else str(response)
-            )
-
-            import re
-
-            title_match = re.search(r"\*\*(.*?)\*\*", content)
-            if title_match:
-                return title_match.group(1).strip()
-
-            title_match = re.search(r"\"(.*?)\"", content)
-            if title_match:
-                return title_match.group(1).strip()
-
-            return "Untitled Section"
-        except Exception as e:
-            log_error(e, "Error generating section title")
-            return "Untitled Section"
-
     async def _generate_context(
         self, full_text: str, section_text: str, llm_providers: dict[str, Any]
     ) -> Tuple[str, Any]:
@@ -275,7 +368,7 @@ class SegmentationStrategy(DocumentProcessingStrategy):
                 }
             ]
 
-            response = await llm_providers["anthropic"].ainvoke(
+            response: LLMResponse = await llm_providers["anthropic"].ainvoke(
                 messages=messages,
                 model_id="claude-3-5-sonnet-latest",
                 system_prompts=system_messages,
@@ -283,14 +376,8 @@ class SegmentationStrategy(DocumentProcessingStrategy):
                 temperature=0.5,
             )
 
-            content = (
-                response.content if hasattr(response, "content") else str(response)
-            )
-            usage = (
-                response.raw_response.usage
-                if hasattr(response, "raw_response")
-                else None
-            )
+            content = response.content
+            usage = getattr(response.raw_response, "usage", None)
 
             return content, usage
         except Exception as e:
@@ -313,55 +400,54 @@ class VoyageDocumentStrategy(DocumentProcessingStrategy):
         filter_dimensions: dict[str, Any],
         nominal_creator_name: str,
         llm_providers: Optional[dict[str, Any]] = None,
-    ) -> list[dict[str, Any]]:
+    ) -> AsyncIterator[SectionRecord]:
         try:
-            # Extract basic text content for search context
-            document = fitz.open(file_path)
-            processed_pages = []
-
-            # Extract and process page images
-            page_images = extract_and_process_pdf_pages(
-                file_path,
-                target_width=1568,  # Claude's preferred width
-                target_height=1568,  # Claude's preferred height
-                zoom=3.0,  # High quality rendering
-            )
-
-            for page_num in range(len(document)):
-                page = document.load_page(page_num)
-                page_text = page.get_text("text")
-
-                if llm_providers and "anthropic" in llm_providers:
-                    # Generate title and context if LLM providers are available
-                    section_title = await self._generate_section_title(
-                        page_text, llm_providers
+            # Extract basic text content for search context. PyMuPDF calls are
+            # blocking, so run them in worker threads
+            page_texts = await asyncio.to_thread(self._extract_page_texts, file_path)
+
+            # Scan-only pages still carry an image worth embedding, but there is
+            # no text to title, so no LLM call is made for them
+            use_llm = bool(llm_providers and "anthropic" in llm_providers)
+
+            # Titles are requested a bounded window ahead; each page image is
+            # rendered only once its page is reached, while earlier pages are
+            # embedded downstream
+            async with aclosing(
+                self._section_titles(page_texts, llm_providers if use_llm else None)
+            ) as section_titles:
+                for page_num, page_text in enumerate(page_texts):
+                    render_task = asyncio.create_task(
+                        asyncio.to_thread(
+                            extract_and_process_pdf_pages,
+                            file_path,
+                            target_width=1568,  # Claude's preferred width
+                            target_height=1568,  # Claude's preferred height
+                            pages=[page_num + 1],
+                        )
+                    )
+                    section_title = await anext(section_titles)
+                    # The page image, if it could be rendered
+                    page_image_list = await render_task
+
+                    yield SectionRecord(
+                        contextualized_segment_text=page_text,
+                        metadata=SectionMetadata(
+                            file_url=file_url,  # Voyage will use this to fetch and process the PDF
+                            section_title=section_title,
+                            title=title,
+                            pages=[page_num + 1],
+                            page_images=page_image_list,  # Add page image to metadata
+                            section_text=page_text,
+                            filter_dimensions=filter_dimensions,
+                            nominal_creator_name=nominal_creator_name,
+                        ),
                     )
-                else:
-                    section_title = "Untitled Section"
-
-                # Get the page image if available
-                page_image = (
-                    page_images[page_num] if page_num < len(page_images) else None
-                )
-                page_image_list = [page_image] if page_image else []
-
-                processed_pages.append(
-                    {
-                        "contextualized_segment_text": page_text,
-                        "metadata": {
-                            "file_url": file_url,  # Voyage will use this to fetch and process the PDF
-                            "section_title": section_title,
-                            "title": title,
-                            "pages": [page_num + 1],
-                            "page_images": page_image_list,  # Add page image to metadata
-                            "section_text": page_text,
-                            "filter_dimensions": filter_dimensions,
-                            "nominal_creator_name": nominal_creator_name,
-                        },
-                    }
-                )
-
-            return processed_pages
         except Exception as e:
             log_error(e, "Error processing document with VoyageDocumentStrategy")
-            return []
+
+    @staticmethod
+    def _extract_page_texts(file_path: str) -> list[str]:
+        """Extract the text of every page in the PDF."""
+        with fitz.open(file_path) as document:
+            return [page.get_text("text") for page in document]
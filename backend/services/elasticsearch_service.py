@@ -1,11 +1,24 @@
+import heapq
+import json
 import time
-from typing import Union, Optional, Any
+from collections import defaultdict
+from threading import Lock, RLock
+from typing import Iterator, Union, Optional, Any
 import os
+import numpy as np
 from loguru import logger
 from elasticsearch import Elasticsearch
 from elasticsearch import exceptions as es_exceptions
-from elasticsearch.helpers import bulk
+from elasticsearch.helpers import parallel_bulk
 
+try:
+    # Encodes bulk and search bodies several times faster than the stdlib json
+    # serializer, which matters for requests carrying dense vectors
+    from elasticsearch.serializer import OrjsonSerializer
+except ImportError:  # orjson is not installed
+    OrjsonSerializer = None
+
+from utils.cache import TTLCache
 from utils.error_handlers import log_error
 from services.embedding_service import EmbeddingModel
 
@@ -21,6 +34,13 @@ use_ssl = os.getenv("ELASTICSEARCH_USE_SSL", "true").lower() == "true"
 verify_certs = os.getenv("ELASTICSEARCH_VERIFY_CERTS", "true").lower() == "true"
 use_auth = os.getenv("ELASTICSEARCH_USE_AUTH", "true").lower() == "true"
 
+# Shared clients keyed on their connection parameters. _clients_lock only guards
+# the dicts; connecting happens under the key's own lock, so a slow connection
+# doesn't hold up callers asking for an existing client or a different host.
+_clients: dict[tuple, Elasticsearch] = {}
+_client_locks: dict[tuple, Lock] = {}
+_clients_lock = Lock()
+
 
 def create_elasticsearch_client_with_retries(
     host: str = elasticsearch_host,
@@ -29,8 +49,57 @@ def create_elasticsearch_client_with_retries(
     password: str = elasticsearch_password,
     max_retries: int = 5,
     retry_delay: int = 10,
+    maxsize: int = 25,
+) -> Elasticsearch:
+    """
+    Create an Elasticsearch client with retry logic.
+
+    Clients are thread-safe, so one client is created per set of connection
+    parameters and reused by later calls.
+
+    Args:
+        host: Elasticsearch host
+        port: Elasticsearch port
+        username: Username for basic auth
+        password: Password for basic auth
+        max_retries: Number of connection attempts
+        retry_delay: Delay between connection attempts in seconds
+        maxsize: Maximum number of pooled HTTP connections per node. This bounds
+            how many requests the shared client can have in flight at once, so
+            it should cover the app's worker thread count.
+
+    Raises:
+        ConnectionError: If Elasticsearch does not respond after max_retries attempts
+    """
+    client_key = (host, port, username, password, maxsize)
+    with _clients_lock:
+        elasticsearch_client = _clients.get(client_key)
+        if elasticsearch_client is not None:
+            return elasticsearch_client
+        client_lock = _client_locks.setdefault(client_key, Lock())
+
+    with client_lock:
+        # Another caller may have connected while this one was waiting
+        elasticsearch_client = _clients.get(client_key)
+        if elasticsearch_client is None:
+            elasticsearch_client = _connect_elasticsearch_with_retries(
+                host, port, username, password, max_retries, retry_delay, maxsize
+            )
+            with _clients_lock:
+                _clients[client_key] = elasticsearch_client
+        return elasticsearch_client
+
+
+def _connect_elasticsearch_with_retries(
+    host: str,
+    port: int,
+    username: str,
+    password: str,
+    max_retries: int,
+    retry_delay: int,
+    maxsize: int,
 ) -> Elasticsearch:
-    """Create an Elasticsearch client with retry logic."""
+    """Connect a new Elasticsearch client, pinging until it responds."""
     logger.info(
         f"Starting connection to Elasticsearch at {host}:{port}"
         + (f" with username: {username}" if use_auth else "")
@@ -44,7 +113,10 @@ def create_elasticsearch_client_with_retries(
                 "request_timeout": 30,
                 "retry_on_timeout": True,
                 "max_retries": 3,
+                "connections_per_node": maxsize,
             }
+            if OrjsonSerializer is not None:
+                config["serializer"] = OrjsonSerializer()
             if use_auth:
                 config["basic_auth"] = (username, password)
             if use_ssl:
@@ -78,7 +150,36 @@ def create_elasticsearch_client_with_retries(
             )
             if hasattr(e, "info"):
                 logger.error(f"Error info: {e.info}")
-            time.sleep(retry_delay)
+            if attempt < max_retries - 1:
+                time.sleep(retry_delay)
+
+    raise es_exceptions.ConnectionError(
+        f"Failed to connect to Elasticsearch at {host}:{port} "
+        f"after {max_retries} attempts"
+    )
+
+# HNSW with int8 scalar quantization: about 4x less vector memory than float32
+# and faster distance computation, at a small recall cost. Elasticsearch still
+# keeps the original float vectors and quantizes them itself.
+INT8_HNSW_INDEX_OPTIONS = {"type": "int8_hnsw", "m": 16, "ef_construction": 100}
+FLOAT_HNSW_INDEX_OPTIONS = {"type": "hnsw", "m": 16, "ef_construction": 100}
+
+# Fields left out of search hits. Nothing reads the stored vector back, and it
+# dominates the size of each hit. page_images stay, RAG generation uses them.
+SEARCH_SOURCE_EXCLUDES = ["embedding"]
+
+
+def _normalize(arr: np.ndarray) -> list[float]:
+    """Scale a vector to unit length, as dot_product similarity requires."""
+    return (arr / (np.linalg.norm(arr) + 1e-12)).tolist()
+
+
+def _nest_filter_dims(filter_dimensions: dict[str, Any]) -> list[dict[str, Any]]:
+    """Convert a {name: value(s)} mapping to the nested filter_dimensions format."""
+    return [
+        {"dimension_name": k, "values": v if type(v) is list else [v]}
+        for k, v in filter_dimensions.items()
+    ]
 
 
 class VectorStore:
@@ -94,6 +195,12 @@ class VectorStore:
         client: Elasticsearch,
         embeddings_providers: dict[str, EmbeddingModel],
         dims: int,
+        chunk_size: int = 1000,
+        max_chunk_bytes: int = 50 * 1024 * 1024,
+        thread_count: Optional[int] = None,
+        cache_size: int = 256,
+        cache_ttl: float = 300,
+        index_options: Optional[dict] = INT8_HNSW_INDEX_OPTIONS,
     ):
         """
         Initialize the VectorStore.
@@ -102,10 +209,43 @@ class VectorStore:
             client: Pre-configured Elasticsearch client
             embeddings_providers: The models used to generate embeddings
             dims: The dimensionality of the embeddings
+            chunk_size: Maximum number of documents per bulk request. Should stay
+                below max_chunk_bytes divided by the average document size.
+            max_chunk_bytes: Maximum size in bytes of a single bulk request
+            thread_count: Number of threads sending bulk requests concurrently.
+                Defaults to the number of CPUs.
+            cache_size: Maximum number of query results kept in the query cache
+            cache_ttl: Seconds a cached query result stays valid
+            index_options: index_options of the embedding field for indices created
+                through this store. INT8_HNSW_INDEX_OPTIONS quantizes vectors,
+                FLOAT_HNSW_INDEX_OPTIONS keeps them as float32.
         """
         self.client = client
         self.embeddings_providers = embeddings_providers
         self.dims = dims
+        self.chunk_size = chunk_size
+        self.max_chunk_bytes = max_chunk_bytes
+        self.thread_count = thread_count or os.cpu_count() or 8
+        self.index_options = index_options
+        # Results of get_relevant_documents, cleared whenever documents are added
+        # or deleted. Searches started before a write don't cache their results,
+        # which is tracked by counting writes.
+        self._qcache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._qlock = RLock()
+        self._write_generation = 0
+        # Query embeddings keyed on (text, model_id, input_type). They don't depend
+        # on index contents, so they survive query cache invalidation.
+        self._emb_cache = TTLCache(maxsize=2048)
+
+    def _invalidate_query_cache(self) -> None:
+        """
+        Drop cached query results, which may be stale after an index write.
+
+        Call it once the write is visible to searches, i.e. after the refresh.
+        """
+        with self._qlock:
+            self._write_generation += 1
+            self._qcache.clear()
 
     @staticmethod
     def create_index_with_retries(
@@ -114,6 +254,7 @@ class VectorStore:
         retries: int = 5,
         delay: int = 10,
         dims: int = 1024,
+        index_options: Optional[dict] = INT8_HNSW_INDEX_OPTIONS,
     ) -> None:
         """
         Attempt to create the Elasticsearch index with multiple retries.
@@ -124,10 +265,11 @@ class VectorStore:
             retries: Number of retry attempts
             delay: Delay between retries in seconds
             dims: Dimensionality of the embeddings
+            index_options: index_options of the embedding field's vector index
         """
         for attempt in range(retries):
             try:
-                VectorStore.create_index(client, index_name, dims)
+                VectorStore.create_index(client, index_name, dims, index_options)
                 return
             except Exception as e:
                 logger.warning(f"Attempt {attempt + 1} to create index failed: {e}")
@@ -136,10 +278,34 @@ class VectorStore:
         raise Exception("Failed to create index after several attempts")
 
     @staticmethod
-    def create_index(client: Elasticsearch, index_name: str, dims: int = 1024) -> None:
+    def create_index(
+        client: Elasticsearch,
+        index_name: str,
+        dims: int = 1024,
+        index_options: Optional[dict] = INT8_HNSW_INDEX_OPTIONS,
+    ) -> None:
         """
         Create the Elasticsearch index with appropriate settings and mappings.
+
+        Args:
+            client: Elasticsearch client instance
+            index_name: Name of the index to create
+            dims: Dimensionality of the embeddings
+            index_options: index_options of the embedding field's vector index, e.g.
+                FLOAT_HNSW_INDEX_OPTIONS to keep full precision vectors. None uses
+                the Elasticsearch default.
         """
+        embedding_mapping = {
+            "type": "dense_vector",
+            "dims": dims,
+            "index": True,
+            # Vectors are normalized before indexing and searching, so dot_product
+            # ranks like cosine without ES normalizing them on every comparison
+            "similarity": "dot_product",
+        }
+        if index_options is not None:
+            embedding_mapping["index_options"] = index_options
+
         if not client.indices.exists(index=index_name):
             client.indices.create(
                 index=index_name,
@@ -150,12 +316,7 @@ class VectorStore:
                     },
                     "mappings": {
                         "properties": {
-                            "embedding": {
-                                "type": "dense_vector",
-                                "dims": dims,
-                                "index": True,
-                                "similarity": "cosine",
-                            },
+                            "embedding": embedding_mapping,
                             "metadata": {
                                 "properties": {
                                     "contextualized_segment_text": {"type": "text"},
@@ -167,7 +328,10 @@ class VectorStore:
                                         "doc_values": False,
                                     },
                                     "file_url": {"type": "keyword"},
-                                    "title": {"type": "text"},
+                                    "title": {
+                                        "type": "text",
+                                        "fields": {"keyword": {"type": "keyword"}},
+                                    },
                                     "section_text": {"type": "text"},
                                     "index_name": {"type": "text"},
                                     "associated_organization_index_name": {
@@ -203,6 +367,75 @@ class VectorStore:
         else:
             logger.info(f"Index {index_name} doesn't exist.")
 
+    def _validate_embedding(self, embedding: Any) -> list[float]:
+        """
+        Check that an embedding is a finite vector of the store's dimensionality
+        and scale it to unit length for dot_product similarity.
+
+        Args:
+            embedding: The vector embedding to validate
+
+        Returns:
+            list[float]: The unit-length embedding as a plain list of floats
+
+        Raises:
+            ValueError: If the embedding is non-numeric, has the wrong shape or
+                contains NaN/Inf values
+        """
+        if embedding is None:
+            raise ValueError("Embedding is missing")
+        try:
+            arr = np.asarray(embedding, dtype=np.float64)
+        except (TypeError, ValueError):
+            raise ValueError("Embedding contains non-float values")
+        if arr.shape != (self.dims,):
+            raise ValueError(
+                f"Embedding dimension mismatch. Expected {self.dims}, got {arr.shape}"
+            )
+        if not np.isfinite(arr).all():
+            raise ValueError("Embedding contains NaN/Inf")
+        return _normalize(arr)
+
+    def _iter_actions(
+        self, documents: list[dict[str, Any]], index_name: str
+    ) -> Iterator[dict[str, Any]]:
+        """
+        Lazily build bulk index actions, skipping documents with invalid embeddings.
+
+        Args:
+            documents: list of documents, each containing an embedding and metadata
+            index_name: Name of the index to add documents to
+
+        Yields:
+            dict[str, Any]: A bulk action for each valid document
+        """
+        # Bind per-document callables once. Each action still gets its own dict:
+        # the bulk helpers buffer whole chunks, so a shared template would be
+        # overwritten before it is serialized.
+        validate_embedding = self._validate_embedding
+        for doc in documents:
+            metadata = doc.get("metadata", {})
+
+            # Validate embedding
+            try:
+                embedding = validate_embedding(doc.get("embedding"))
+            except ValueError as e:
+                logger.error(f"Invalid embedding for document: {metadata}: {e}")
+                continue
+
+            # Process filter dimensions without mutating the caller's metadata
+            filter_dimensions = metadata.get("filter_dimensions")
+            if filter_dimensions is not None:
+                metadata = {
+                    **metadata,
+                    "filter_dimensions": _nest_filter_dims(filter_dimensions),
+                }
+
+            yield {
+                "_index": index_name,
+                "_source": {"embedding": embedding, "metadata": metadata},
+            }
+
     def add_embeddings_bulk(
         self, documents: list[dict[str, Any]], index_name: str
     ) -> None:
@@ -214,40 +447,29 @@ class VectorStore:
             index_name: Name of the index to add documents to
         """
         try:
-            actions = []
-            for doc in documents:
-                # Validate embedding
-                embedding = doc.get("embedding")
-                if not embedding or len(embedding) != self.dims:
-                    logger.error(
-                        f"Invalid embedding for document: {doc.get('metadata', {})}"
-                    )
-                    continue
-
-                # Process filter dimensions
-                metadata = doc.get("metadata", {})
-                if "filter_dimensions" in metadata:
-                    metadata["filter_dimensions"] = [
-                        {
-                            "dimension_name": dim_name,
-                            "values": dim_values
-                            if isinstance(dim_values, list)
-                            else [dim_values],
-                        }
-                        for dim_name, dim_values in metadata[
-                            "filter_dimensions"
-                        ].items()
-                    ]
-
-                # Create bulk action
-                action = {
-                    "_index": index_name,
-                    "_source": {"embedding": embedding, "metadata": metadata},
-                }
-                actions.append(action)
+            # No forced refresh here, it slows indexing down. wait_for returns
+            # once the index's periodic refresh has made the documents visible,
+            # so the query cache is not invalidated before they can be found.
+            success, failed = 0, 0
+            for ok, item in parallel_bulk(
+                self.client,
+                self._iter_actions(documents, index_name),
+                thread_count=self.thread_count,
+                chunk_size=self.chunk_size,
+                max_chunk_bytes=self.max_chunk_bytes,
+                queue_size=4,
+                raise_on_error=False,
+                refresh="wait_for",
+            ):
+                if ok:
+                    success += 1
+                else:
+                    failed += 1
+                    logger.error(f"Failed to index document: {item}")
 
-            if actions:
-                success, failed = bulk(self.client, actions, refresh=True)
+            if success:
+                self._invalidate_query_cache()
+            if success or failed:
                 logger.info(
                     f"Bulk indexing completed. Success: {success}, Failed: {failed}"
                 )
@@ -260,7 +482,10 @@ class VectorStore:
             raise
 
     def add_embedding(
-        self, embedding: list[float], metadata: dict, index_name: Optional[str] = None
+        self,
+        embedding: Union[list[float], np.ndarray],
+        metadata: dict,
+        index_name: Optional[str] = None,
     ) -> None:
         """
         Add an embedding and its metadata to the index.
@@ -279,42 +504,37 @@ class VectorStore:
             if isinstance(embedding, dict) and "data" in embedding:
                 embedding = embedding["data"][0]["embedding"]
 
-            logger.debug(f"Embedding before adding to index {index_name}: {embedding}")
-
-            if len(embedding) != self.dims:
-                raise ValueError(
-                    f"Embedding dimension mismatch. Expected {self.dims}, got {len(embedding)}"
-                )
+            logger.opt(lazy=True).debug(
+                "Embedding before adding to index {}: dims={}",
+                lambda: index_name,
+                lambda: len(embedding),
+            )
 
-            if not all(isinstance(x, (float, int)) for x in embedding):
-                raise ValueError("Embedding contains non-float values")
+            embedding = self._validate_embedding(embedding)
 
             logger.info(f"Metadata: {metadata['title']} {metadata['pages']}")
             # Convert filter_dimensions to nested format
             if "filter_dimensions" in metadata:
-                nested_filter_dimensions = [
-                    {
-                        "dimension_name": dim_name,
-                        "values": (
-                            dim_values if isinstance(dim_values, list) else [dim_values]
-                        ),
-                    }
-                    for dim_name, dim_values in metadata["filter_dimensions"].items()
-                ]
-                metadata["filter_dimensions"] = nested_filter_dimensions
+                nested_filter_dimensions = _nest_filter_dims(
+                    metadata["filter_dimensions"]
+                )
             else:
                 logger.warning(
                     "filter_dimensions not found in metadata. Creating an empty list."
                 )
-                metadata["filter_dimensions"] = []
+                nested_filter_dimensions = []
+            metadata = {**metadata, "filter_dimensions": nested_filter_dimensions}
 
-            logger.info(f"Adding embedding to index {index_name} for: {metadata}")
+            logger.info(f"Adding embedding to index {index_name}")
             self.client.index(
                 index=index_name,
                 document={"embedding": embedding, "metadata": metadata},
+                refresh="wait_for",
             )
+            self._invalidate_query_cache()
             logger.info(
-                f"Successfully added embedding for: {metadata.copy().pop("page_images")} to index {index_name}"
+                f"Successfully added embedding for: {metadata['title']} "
+                f"{metadata['pages']} to index {index_name}"
             )
 
         except Exception as e:
@@ -324,6 +544,29 @@ class VectorStore:
             log_error(e, f"Error adding embedding to Elasticsearch index {index_name}")
             raise
 
+    def delete_file_documents(self, file_url: str, index_name: str) -> int:
+        """
+        Delete every section of a file from an index.
+
+        Args:
+            file_url: URL of the file whose sections should be deleted
+            index_name: Name of the index to delete from
+
+        Returns:
+            int: Number of deleted sections
+
+        Raises:
+            NotFoundError: If the index does not exist
+        """
+        delete_result = self.client.delete_by_query(
+            index=index_name,
+            body={"query": {"match": {"metadata.file_url": file_url}}},
+            refresh=True,
+        )
+        if delete_result["deleted"]:
+            self._invalidate_query_cache()
+        return delete_result["deleted"]
+
     def construct_filter_query(
         self,
         filter_dimensions: Optional[dict[str, Union[str, list[str]]]] = None,
@@ -345,19 +588,23 @@ class VectorStore:
 
         # Add titles filter if provided
         if document_titles:  # Check if document_titles is not None and not empty
-            if len(document_titles) == 1:
-                filter_query.append({"match": {"metadata.title": document_titles[0]}})
-            else:
-                filter_query.append(
-                    {
-                        "bool": {
-                            "should": [
+            # Exact, unanalyzed lookup that ES can cache as a filter. Indices
+            # created before metadata.title had a keyword subfield only match
+            # through the analyzed title field, so keep those clauses as well.
+            filter_query.append(
+                {
+                    "bool": {
+                        "should": [
+                            {"terms": {"metadata.title.keyword": document_titles}},
+                            *(
                                 {"match": {"metadata.title": title}}
                                 for title in document_titles
-                            ]
-                        }
+                            ),
+                        ],
+                        "minimum_should_match": 1,
                     }
-                )
+                }
+            )
 
         # Add dimension filters if provided
         if filter_dimensions:
@@ -397,9 +644,53 @@ class VectorStore:
         if visibility:
             filter_query.append({"term": {"metadata.visibility": visibility}})
 
-        logger.debug(f"Constructed filter query: {filter_query}")
+        logger.opt(lazy=True).debug("Constructed filter query: {}", lambda: filter_query)
         return filter_query
 
+    @staticmethod
+    def _vector_search_body(
+        query_vector: list[float],
+        filter_query: list[dict],
+        size: int,
+        num_candidates: Optional[int] = None,
+    ) -> dict:
+        """Build the kNN search body for a query vector."""
+        return {
+            "size": size,
+            "_source": {"excludes": SEARCH_SOURCE_EXCLUDES},
+            "knn": {
+                "field": "embedding",
+                "query_vector": _normalize(np.asarray(query_vector, dtype=np.float64)),
+                "k": size,
+                "num_candidates": num_candidates or max(100, size * 10),
+                "filter": filter_query,
+            },
+        }
+
+    @staticmethod
+    def _bm25_search_body(query: str, filter_query: list[dict], size: int) -> dict:
+        """Build the BM25 multi_match search body for a text query."""
+        return {
+            "size": size,
+            "_source": {"excludes": SEARCH_SOURCE_EXCLUDES},
+            "query": {
+                "bool": {
+                    "must": {
+                        "multi_match": {
+                            "query": query,
+                            "fields": [
+                                "metadata.contextualized_segment_text",
+                                "metadata.section_title",
+                                "metadata.title",
+                                "metadata.section_text",
+                            ],
+                        }
+                    },
+                    "filter": filter_query,
+                }
+            },
+        }
+
     def vector_search(
         self,
         query_vector: list[float],
@@ -408,9 +699,11 @@ class VectorStore:
         visibility: Optional[str] = None,
         document_titles: Optional[list[str]] = None,
         size: int = 10,
+        num_candidates: Optional[int] = None,
+        prebuilt_filter: Optional[list[dict]] = None,
     ) -> list[dict]:
         """
-        Perform a similarity search with optional multi-document filtering.
+        Perform an approximate kNN similarity search with optional multi-document filtering.
 
         Args:
             query_vector: The query vector to search against
@@ -419,6 +712,11 @@ class VectorStore:
             visibility: Optional visibility filter
             document_titles: Optional list of document titles to filter by
             size: Number of results to return
+            num_candidates: Number of HNSW candidates considered per shard. Higher
+                values trade latency for recall. Defaults to max(100, size * 10).
+            prebuilt_filter: Filter query already built by construct_filter_query.
+                When given, filter_dimensions, visibility and document_titles are
+                not used to build a new one.
 
         Returns:
             list[dict]: A list of search hits from Elasticsearch, filtered by the
@@ -434,45 +732,16 @@ class VectorStore:
             logger.info(f"Filtering for documents: {document_titles}")
 
         # Construct the filter query with document titles
-        filter_query = self.construct_filter_query(
-            filter_dimensions, visibility, document_titles
-        )
-
-        # Construct the full query
-        body = {
-            "size": size,
-            "query": {
-                "bool": {
-                    "must": {
-                        "script_score": {
-                            "query": {"match_all": {}},
-                            "script": {
-                                "source": "cosineSimilarity(params.query_vector, 'embedding') + 1.0",
-                                "params": {"query_vector": query_vector},
-                            },
-                        }
-                    },
-                    "filter": filter_query,
-                }
-            },
-        }
-
-        results = []
-        for index_name in index_names:
-            try:
-                logger.info(f"Searching in index: {index_name}")
-                response = self.client.search(index=index_name, body=body)
-                hits = response.get("hits", {}).get("hits", [])
-                if len(hits) == 0:
-                    logger.warning(f"No hits returned for index: {index_name}")
-                else:
-                    results.extend(hits)
-            except Exception as e:
-                logger.error(f"Error searching index {index_name}: {e}")
-                log_error(e, f"Error searching index {index_name}")
+        filter_query = prebuilt_filter
+        if filter_query is None:
+            filter_query = self.construct_filter_query(
+                filter_dimensions, visibility, document_titles
+            )
 
-        logger.info(f"Total results returned: {len(results)}")
-        return results
+        body = self._vector_search_body(
+            query_vector, filter_query, size, num_candidates
+        )
+        return self._msearch([body], index_names)[0]
 
     def bm25_search(
         self,
@@ -482,6 +751,7 @@ class VectorStore:
         visibility: Optional[str] = None,
         document_titles: Optional[list[str]] = None,
         size: int = 10,
+        prebuilt_filter: Optional[list[dict]] = None,
     ) -> list[dict]:
         """
         Perform a BM25 search with optional multi-document filtering.
@@ -493,6 +763,9 @@ class VectorStore:
             visibility: Optional visibility filter
             document_titles: Optional list of document titles to filter by
             size: Number of results to return
+            prebuilt_filter: Filter query already built by construct_filter_query.
+                When given, filter_dimensions, visibility and document_titles are
+                not used to build a new one.
 
         Returns:
             list[dict]: A list of search hits from Elasticsearch, filtered by the
@@ -508,50 +781,63 @@ class VectorStore:
             logger.info(f"Filtering for documents: {document_titles}")
 
         # Construct the filter query with document titles
-        filter_query = self.construct_filter_query(
-            filter_dimensions, visibility, document_titles
-        )
+        filter_query = prebuilt_filter
+        if filter_query is None:
+            filter_query = self.construct_filter_query(
+                filter_dimensions, visibility, document_titles
+            )
 
-        # Construct the full query
-        body = {
-            "size": size,
-            "query": {
-                "bool": {
-                    "must": {
-                        "multi_match": {
-                            "query": query,
-                            "fields": [
-                                "metadata.contextualized_segment_text",
-                                "metadata.section_title",
-                                "metadata.title",
-                                "metadata.section_text",
-                            ],
-                        }
-                    },
-                    "filter": filter_query,
-                }
-            },
-        }
+        body = self._bm25_search_body(query, filter_query, size)
+        return self._msearch([body], index_names)[0]
 
-        results = []
-        for index_name in index_names:
-            try:
-                logger.info(f"Searching in index: {index_name}")
-                response = self.client.search(index=index_name, body=body)
-                hits = response.get("hits", {}).get("hits", [])
-                if len(hits) == 0:
-                    logger.warning(f"No hits returned for index: {index_name}")
-                else:
-                    results.extend(hits)
-            except Exception as e:
-                logger.error(f"Error searching index {index_name}: {e}")
-                log_error(e, f"Error searching index {index_name}")
+    def _msearch(self, bodies: list[dict], index_names: list[str]) -> list[list[dict]]:
+        """
+        Run several search bodies against several indices in one round trip.
 
-        logger.info(f"Total results returned: {len(results)}")
+        Args:
+            bodies: The search bodies to run against every index
+            index_names: The indices to search in
+
+        Returns:
+            list[list[dict]]: For each body, the hits from all indices in index order
+        """
+        msearch_body = []
+        for body in bodies:
+            for index_name in index_names:
+                # Searches are deterministic for a given index state, so let
+                # ES serve repeats from its shard request cache
+                msearch_body.append({"index": index_name, "request_cache": True})
+                msearch_body.append(body)
+
+        results = [[] for _ in bodies]
+        try:
+            response = self.client.msearch(body=msearch_body)
+        except Exception as e:
+            logger.error(f"Error searching indices {index_names}: {e}")
+            log_error(e, f"Error searching indices {index_names}")
+            return results
+
+        # Responses come back in request order: grouped by body, then by index
+        for i, r in enumerate(response["responses"]):
+            index_name = index_names[i % len(index_names)]
+            if "error" in r:
+                logger.error(f"Error searching index {index_name}: {r['error']}")
+                continue
+            hits = r.get("hits", {}).get("hits", [])
+            if len(hits) == 0:
+                logger.warning(f"No hits returned for index: {index_name}")
+            else:
+                results[i // len(index_names)].extend(hits)
+
+        logger.info(f"Total results returned: {sum(len(r) for r in results)}")
         return results
 
     def combine_results_rrf(
-        self, vector_results: list[dict], bm25_results: list[dict], k: int = 60
+        self,
+        vector_results: list[dict],
+        bm25_results: list[dict],
+        k: int = 60,
+        top_k: int = 10,
     ) -> list[dict]:
         """
         Combine vector search and BM25 search results using Reciprocal Rank Fusion.
@@ -560,28 +846,30 @@ class VectorStore:
             vector_results: Results from vector search
             bm25_results: Results from BM25 search
             k: Constant to prevent division by zero and reduce the impact of high rankings
+            top_k: Number of combined results to return
 
         Returns:
-            Combined and re-ranked results
+            The top_k combined and re-ranked results
         """
-        combined_scores = {}
+        combined_scores = defaultdict(float)
         all_results = {}
 
-        # Process vector search results and BM25 search results
-        for rank, result in enumerate(vector_results + bm25_results):
-            doc_id = result["_id"]
-            score = 1 / (rank + k)
-            combined_scores[doc_id] = combined_scores.get(doc_id, 0) + score
-            all_results[doc_id] = result
-
-        # Sort the results by their combined scores
-        sorted_results = sorted(
-            combined_scores.items(), key=lambda x: x[1], reverse=True
+        # Process vector search results and BM25 search results. Each list is
+        # ranked on its own, and a document keeps its first (best ranked) hit.
+        for results in (vector_results, bm25_results):
+            for rank, result in enumerate(results):
+                doc_id = result["_id"]
+                combined_scores[doc_id] += 1.0 / (rank + k)
+                all_results.setdefault(doc_id, result)
+
+        # Select the best results by their combined scores
+        top_results = heapq.nlargest(
+            top_k, combined_scores.items(), key=lambda x: x[1]
         )
 
         # Create the final results list
         final_results = [
-            {**all_results[doc_id], "_score": score} for doc_id, score in sorted_results
+            {**all_results[doc_id], "_score": score} for doc_id, score in top_results
         ]
 
         return final_results
@@ -595,6 +883,81 @@ class VectorStore:
         """
         return self
 
+    def _embed_queries(
+        self, queries: list[str], model_id: str = "embed-english-v3.0"
+    ) -> list[list[float]]:
+        """
+        Embed search queries, reusing cached embeddings of previously seen queries.
+
+        Args:
+            queries: The text queries to embed
+            model_id: The Cohere embedding model to use
+
+        Returns:
+            list[list[float]]: One embedding per query, in order
+        """
+        keys = [(query, model_id, "search_query") for query in queries]
+        with self._qlock:
+            embeddings = [self._emb_cache.get(key) for key in keys]
+
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            new_embeddings = (
+                self.embeddings_providers["cohere"]
+                .embed(
+                    [queries[i] for i in missing],
+                    input_type="search_query",
+                    model_id=model_id,
+                )
+                .embeddings
+            )
+            with self._qlock:
+                for i, embedding in zip(missing, new_embeddings):
+                    embeddings[i] = tuple(embedding)
+                    self._emb_cache[keys[i]] = embeddings[i]
+            logger.debug(f"Embedded {len(missing)} new queries")
+
+        return [list(embedding) for embedding in embeddings]
+
+    @staticmethod
+    def _query_cache_key(
+        query: str,
+        index_names: list[str],
+        filter_dimensions: Optional[dict],
+        visibility: Optional[str],
+        document_titles: Optional[list[str]],
+    ) -> tuple:
+        """Build the query cache key for a search request."""
+        return (
+            query,
+            tuple(sorted(index_names)),
+            json.dumps(filter_dimensions, sort_keys=True),
+            visibility,
+            tuple(document_titles or ()),
+        )
+
+    @staticmethod
+    def _results_to_documents(combined_results: list[dict]) -> list[dict]:
+        """Convert fused search hits into documents with metadata and similarity."""
+        documents = []
+        for result in combined_results:
+            document = {
+                "metadata": result["_source"]["metadata"],
+                "similarity": result["_score"],
+            }
+            document["contextualized_segment_text"] = result["_source"][
+                "metadata"
+            ].get("contextualized_segment_text", "")
+
+            # Log the entire document, formatted only if debug logging is enabled
+            logger.opt(lazy=True).debug("Retrieved document: {}", lambda: result)
+
+            documents.append(document)
+        logger.opt(lazy=True).debug(
+            "{}", lambda: [document["similarity"] for document in documents]
+        )
+        return documents
+
     def get_relevant_documents(
         self,
         query: str,
@@ -617,13 +980,6 @@ class VectorStore:
             A list of relevant documents with their metadata and similarity scores
         """
         try:
-            query_embedding = (
-                self.embeddings_providers["cohere"]
-                .embed(query, input_type="search_query", model_id="embed-english-v3.0")
-                .embeddings[0]
-            )
-            logger.info(f"Query embedding: {query_embedding}")
-
             # Use the provided index_names or fallback to the instance's index_name
             logger.info(f"index_names is {index_names}")
             if index_names is None:
@@ -631,19 +987,29 @@ class VectorStore:
             elif isinstance(index_names, str):
                 index_names = [index_names]
 
-            # Perform vector search
-            vector_results = self.vector_search(
-                query_embedding,
-                index_names,
-                filter_dimensions,
-                visibility,
-                document_titles,
-            )
-
-            # Perform BM25 search
-            bm25_results = self.bm25_search(
+            cache_key = self._query_cache_key(
                 query, index_names, filter_dimensions, visibility, document_titles
             )
+            with self._qlock:
+                cached = self._qcache.get(cache_key)
+                generation = self._write_generation
+            if cached is not None:
+                logger.debug(f"Query cache hit for: {query}")
+                return list(cached)
+
+            query_embedding = self._embed_queries([query])[0]
+
+            # Perform vector and BM25 search in a single msearch round trip
+            filter_query = self.construct_filter_query(
+                filter_dimensions, visibility, document_titles
+            )
+            vector_results, bm25_results = self._msearch(
+                [
+                    self._vector_search_body(query_embedding, filter_query, 10),
+                    self._bm25_search_body(query, filter_query, 10),
+                ],
+                index_names,
+            )
 
             # Combine results using RRF
             combined_results = self.combine_results_rrf(vector_results, bm25_results)
@@ -652,23 +1018,12 @@ class VectorStore:
                 logger.warning("No relevant documents found.")
                 return []
 
-            documents = []
-            for result in combined_results:
-                document = {
-                    "metadata": result["_source"]["metadata"],
-                    "similarity": result["_score"],
-                }
-                document["contextualized_segment_text"] = result["_source"][
-                    "metadata"
-                ].get("contextualized_segment_text", "")
-
-                # Log the entire document
-                logger.debug(f"Retrieved document: {result}")
-
-                documents.append(document)
-            logger.debug([document["similarity"] for document in documents])
+            documents = self._results_to_documents(combined_results)
 
-            return documents
+            with self._qlock:
+                if self._write_generation == generation:
+                    self._qcache[cache_key] = documents
+            return list(documents)
         except ConnectError:
             error_message, stack_trace = log_error(
                 ConnectError(),
@@ -682,3 +1037,90 @@ class VectorStore:
             )
             logger.error(error_message)
             return []
+
+    def get_relevant_documents_batch(
+        self,
+        queries: list[str],
+        index_names: Optional[Union[str, list[str]]] = None,
+        filter_dimensions: Optional[dict] = None,
+        visibility: Optional[str] = None,
+        document_titles: Optional[list[str]] = None,
+    ) -> list[list[dict]]:
+        """
+        Retrieve relevant documents for several queries sharing the same filters.
+
+        Queries missing from the query cache are embedded in one embedding call and
+        searched with one msearch request holding their vector and BM25 searches.
+
+        Args:
+            queries: The text queries to search for
+            index_names: The index(es) to search in
+            filter_dimensions: dictionary of filter dimensions to filter by
+            visibility: The visibility to filter by
+            document_titles: list of documents to filter by
+
+        Returns:
+            For each query, in order, a list of relevant documents with their
+            metadata and similarity scores
+        """
+        try:
+            if index_names is None:
+                index_names = [self.index_name]
+            elif isinstance(index_names, str):
+                index_names = [index_names]
+
+            results: list[Optional[list[dict]]] = [None] * len(queries)
+            cache_keys = [
+                self._query_cache_key(
+                    query, index_names, filter_dimensions, visibility, document_titles
+                )
+                for query in queries
+            ]
+            with self._qlock:
+                generation = self._write_generation
+                for i, cache_key in enumerate(cache_keys):
+                    cached = self._qcache.get(cache_key)
+                    if cached is not None:
+                        results[i] = list(cached)
+
+            missing = [i for i, documents in enumerate(results) if documents is None]
+            if missing:
+                missing_queries = [queries[i] for i in missing]
+                query_embeddings = self._embed_queries(missing_queries)
+
+                filter_query = self.construct_filter_query(
+                    filter_dimensions, visibility, document_titles
+                )
+                bodies = []
+                for query, query_embedding in zip(missing_queries, query_embeddings):
+                    bodies.append(
+                        self._vector_search_body(query_embedding, filter_query, 10)
+                    )
+                    bodies.append(self._bm25_search_body(query, filter_query, 10))
+                hits = self._msearch(bodies, index_names)
+
+                for n, i in enumerate(missing):
+                    combined_results = self.combine_results_rrf(
+                        hits[2 * n], hits[2 * n + 1]
+                    )
+                    documents = self._results_to_documents(combined_results)
+                    if documents:
+                        with self._qlock:
+                            if self._write_generation == generation:
+                                self._qcache[cache_keys[i]] = documents
+                    results[i] = list(documents)
+
+            return results
+        except ConnectError:
+            error_message, stack_trace = log_error(
+                ConnectError(),
+                "Internal server error. Could not reach the document embedding endpoint.",
+            )
+            logger.error(error_message)
+            return [[] for _ in queries]
+        except Exception as e:
+            error_message, stack_trace = log_error(
+                e, "Error retrieving relevant documents"
+            )
+            logger.error(error_message)
+            return [[] for _ in queries]
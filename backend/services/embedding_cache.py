@@ -0,0 +1,122 @@
+"""
+Caches that let embedding strategies reuse vectors: persistent, content-addressed
+storage so identical texts are not re-embedded across process restarts, and an
+in-memory index for reusing the vector of a near-identical text.
+"""
+
+import hashlib
+import sqlite3
+from threading import Lock
+from typing import Iterable, Optional
+
+import numpy as np
+from loguru import logger
+
+
+class EmbeddingCache:
+    """
+    SQLite-backed embedding cache keyed on model id and a hash of the input text.
+
+    Vectors are stored as raw bytes; callers decide the encoding. Access is
+    serialized with a lock so one instance can be shared between threads.
+    """
+
+    def __init__(self, path: str):
+        """
+        Open (or create) the cache database.
+
+        Args:
+            path: Path of the SQLite database file
+        """
+        self.path = path
+        self._lock = Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            # WAL lets readers proceed while a batch of vectors is being written
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            self._conn.commit()
+        logger.info(f"Embedding cache opened at {path}")
+
+    @staticmethod
+    def make_key(model_id: str, text: str) -> str:
+        """Build the cache key for a text embedded with the given model."""
+        return f"{model_id}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the stored vector bytes for key, or None if not cached."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT vector FROM embeddings WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, vector: bytes) -> None:
+        """Store the vector bytes for key, replacing any previous value."""
+        self.set_many([(key, vector)])
+
+    def set_many(self, items: Iterable[tuple[str, bytes]]) -> None:
+        """Store several (key, vector bytes) pairs in one transaction."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                items,
+            )
+            self._conn.commit()
+
+
+class NearDuplicateIndex:
+    """
+    In-memory index that finds a previously embedded text nearly identical to a
+    new one, so boilerplate (headers, footers, standard paragraphs) that differs
+    only slightly is embedded once.
+
+    Texts are compared through cheap hashed bag-of-words sketches of their words
+    and word bigrams, with a brute-force inner product over unit-length sketches.
+    Once full, the oldest entries are overwritten. Not thread-safe.
+    """
+
+    def __init__(
+        self, threshold: float = 0.86, capacity: int = 10_000, dims: int = 256
+    ):
+        """
+        Initialize the index.
+
+        Args:
+            threshold: Minimum cosine similarity between sketches to count as a match
+            capacity: Maximum number of texts to remember
+            dims: Dimensionality of the hashed sketches
+        """
+        self.threshold = threshold
+        self._dims = dims
+        self._sketches = np.zeros((capacity, dims), dtype=np.float32)
+        self._vectors: list[Optional[np.ndarray]] = [None] * capacity
+        self._size = 0
+        self._next = 0
+
+    def _sketch(self, text: str) -> np.ndarray:
+        words = text.lower().split()
+        sketch = np.zeros(self._dims, dtype=np.float32)
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            h = hash(feature)
+            sketch[(h >> 1) % self._dims] += 1.0 if h & 1 else -1.0
+        norm = np.linalg.norm(sketch)
+        return sketch / norm if norm > 0 else sketch
+
+    def lookup(self, text: str) -> Optional[np.ndarray]:
+        """Return the vector of the most similar known text, if it is similar enough."""
+        if not self._size:
+            return None
+        scores = self._sketches[: self._size] @ self._sketch(text)
+        best = int(np.argmax(scores))
+        return self._vectors[best] if scores[best] >= self.threshold else None
+
+    def add(self, text: str, vector: np.ndarray) -> None:
+        """Remember the vector computed for text."""
+        self._sketches[self._next] = self._sketch(text)
+        self._vectors[self._next] = vector
+        self._next = (self._next + 1) % len(self._vectors)
+        self._size = min(self._size + 1, len(self._vectors))
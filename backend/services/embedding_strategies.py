@@ -3,11 +3,41 @@ This module provides different strategies for generating embeddings from process
 It allows for easy switching between different embedding providers and modalities.
 """
 
+import asyncio
+import io
+import json
+import os
+import tempfile
+import uuid
+import weakref
 from abc import ABC, abstractmethod
 from typing import Any, Optional
 import numpy as np
+from cohere.utils import SdkUtils
+from project_types.document_section import SectionRecord
+from services.embedding_cache import EmbeddingCache, NearDuplicateIndex
+from utils.cache import TTLCache
 from utils.error_handlers import log_error
-from utils.pdf_utils import extract_and_process_pdf_pages
+from utils.pdf_utils import extract_and_process_pdf_pages, get_pdf_process_pool
+
+# Maximum number of vectors each strategy keeps in memory for reuse
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", 5000))
+# Approximate token budget of one Cohere embedding request
+EMBED_BATCH_TOKEN_BUDGET = int(os.getenv("EMBED_BATCH_TOKEN_BUDGET", 50_000))
+# Reuse the vector of a near-identical text when their similarity reaches this
+# threshold (e.g. 0.86); unset disables near-duplicate reuse
+NEAR_DUPLICATE_THRESHOLD = (
+    float(os.environ["EMBED_NEAR_DUPLICATE_THRESHOLD"])
+    if os.getenv("EMBED_NEAR_DUPLICATE_THRESHOLD")
+    else None
+)
+# Cached vectors are kept at half precision; retrieval is insensitive to the loss
+CACHE_DTYPE = np.float16
+
+
+def _from_cache(vector: np.ndarray) -> np.ndarray:
+    """Convert a cached half-precision vector back to single precision."""
+    return vector.astype(np.float32)
 
 
 class EmbeddingStrategy(ABC):
@@ -17,15 +47,18 @@ class EmbeddingStrategy(ABC):
     """
 
     @abstractmethod
-    async def embed_document(self, document: dict[str, Any]) -> Optional[list[float]]:
+    async def embed_document(self, document: SectionRecord) -> Optional[np.ndarray]:
         """
         Generate embeddings for a processed document.
 
+        Vectors are returned as float32 arrays; conversion to plain floats is
+        left to the vector store.
+
         Args:
-            document: Dictionary containing processed document data and metadata
+            document: Processed document section and its metadata
 
         Returns:
-            Optional[list[float]]: The generated embedding vector, or None if embedding fails
+            Optional[np.ndarray]: The generated embedding vector, or None if embedding fails
         """
         pass
 
@@ -34,75 +67,326 @@ class CohereEmbeddingStrategy(EmbeddingStrategy):
     """
     Strategy for generating text-only embeddings using Cohere's API.
     Implements batching for improved efficiency.
+
+    Texts submitted within ``flush_delay`` seconds of the first pending one are
+    embedded in a single API call, and each caller awaits its own vector. A batch
+    is sent early once it reaches the batch size or its estimated token count
+    would exceed ``token_budget``. Pending texts are kept per event loop, so one
+    strategy can be shared between loops.
+
+    When an ``embedding_cache`` is given, vectors are also persisted by content
+    hash (as float16) so identical texts are not re-embedded across restarts.
+    With a ``near_duplicate_threshold``, a text nearly identical to one already
+    embedded reuses that text's vector instead of calling the API.
     """
 
-    def __init__(self, embeddings_providers: dict):
+    def __init__(
+        self,
+        embeddings_providers: dict,
+        flush_delay: float = 0.05,
+        embedding_cache: Optional[EmbeddingCache] = None,
+        token_budget: int = EMBED_BATCH_TOKEN_BUDGET,
+        near_duplicate_threshold: Optional[float] = NEAR_DUPLICATE_THRESHOLD,
+    ):
         self.embedding_model = embeddings_providers["cohere"]
-        self._text_batch = []
+        self._model_id = "embed-english-v3.0"
         self._batch_size = 96  # Cohere's recommended batch size
-        self._document_vectors = {}
-
-    async def _process_batch(self) -> dict[str, list[float]]:
+        self._flush_delay = flush_delay
+        self._token_budget = token_budget
+        self._embedding_cache = embedding_cache
+        self._document_vectors = TTLCache(maxsize=EMBED_CACHE_SIZE)  # LRU by text
+        self._near_duplicates = (
+            NearDuplicateIndex(threshold=near_duplicate_threshold)
+            if near_duplicate_threshold is not None
+            else None
+        )
+        self._batches: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def _batch_state(self, loop: asyncio.AbstractEventLoop) -> dict[str, Any]:
+        state = self._batches.get(loop)
+        if state is None:
+            state = {
+                "pending": [],
+                "tokens": 0,
+                "flush_handle": None,
+                "tasks": set(),
+                "inflight": {},  # text -> future of its queued or running embedding
+            }
+            self._batches[loop] = state
+        return state
+
+    async def _process_batch(self, texts: list[str]) -> dict[str, list[float]]:
         """
-        Process accumulated text batch and return embeddings.
+        Embed a batch of texts and return a mapping of text to embedding.
         """
-        if not self._text_batch:
+        if not texts:
             return {}
 
         try:
             response = await self.embedding_model.async_embed(
-                self._text_batch,
+                texts,
                 input_type="search_document",
-                model_id="embed-english-v3.0",
+                model_id=self._model_id,
                 batch_size=self._batch_size,
             )
+            return dict(zip(texts, response.embeddings))
+
+        except Exception as e:
+            log_error(e, "Error processing Cohere embedding batch")
+            return {}
 
-            # Create mapping of text to embedding
-            text_to_embedding = {}
-            for text, embedding in zip(self._text_batch, response.embeddings):
-                text_to_embedding[text] = embedding
+    def _cache_embeddings(self, embeddings: dict[str, list[float]]) -> None:
+        """Remember embeddings by text, evicting the least recently used ones."""
+        for text, embedding in embeddings.items():
+            vector = np.asarray(embedding, dtype=CACHE_DTYPE)
+            self._document_vectors[text] = vector
+            if self._near_duplicates is not None:
+                self._near_duplicates.add(text, vector)
+
+    def _load_persisted(self, text: str) -> Optional[np.ndarray]:
+        """Look up a text's embedding in the persistent cache."""
+        vector = self._embedding_cache.get(
+            EmbeddingCache.make_key(self._model_id, text)
+        )
+        if vector is None:
+            return None
+        return np.frombuffer(vector, dtype=CACHE_DTYPE)
 
-            # Clear the batch
-            self._text_batch = []
+    def _persist(self, embeddings: dict[str, list[float]]) -> None:
+        """Write freshly computed embeddings to the persistent cache."""
+        try:
+            self._embedding_cache.set_many(
+                (
+                    EmbeddingCache.make_key(self._model_id, text),
+                    np.asarray(embedding, dtype=CACHE_DTYPE).tobytes(),
+                )
+                for text, embedding in embeddings.items()
+            )
+        except Exception as e:
+            log_error(e, "Error persisting Cohere embeddings")
+
+    @staticmethod
+    def _estimate_tokens(text: str) -> int:
+        """Rough token count, matching the providers' rate limit estimate."""
+        return len(text) // 4 + 1
+
+    @staticmethod
+    def _take_pending(state: dict[str, Any]) -> list[tuple[str, asyncio.Future]]:
+        if state["flush_handle"] is not None:
+            state["flush_handle"].cancel()
+            state["flush_handle"] = None
+        batch, state["pending"] = state["pending"], []
+        state["tokens"] = 0
+        return batch
+
+    def _start_flush(self, loop: asyncio.AbstractEventLoop) -> None:
+        state = self._batch_state(loop)
+        batch = self._take_pending(state)
+        if not batch:
+            return
+        task = loop.create_task(self._embed_pending(batch))
+        state["tasks"].add(task)
+        task.add_done_callback(state["tasks"].discard)
+
+    async def flush(self) -> None:
+        """
+        Embed every text pending on the running event loop now, without waiting
+        for the batch to fill.
+        """
+        state = self._batch_state(asyncio.get_running_loop())
+        await self._embed_pending(self._take_pending(state))
 
-            return text_to_embedding
+    async def _embed_pending(self, batch: list[tuple[str, asyncio.Future]]) -> None:
+        if not batch:
+            return
 
+        inflight = self._batch_state(asyncio.get_running_loop())["inflight"]
+        embeddings = {}
+        try:
+            embeddings = await self._process_batch([text for text, _ in batch])
+            self._cache_embeddings(embeddings)
         except Exception as e:
-            log_error(e, "Error processing Cohere embedding batch")
-            self._text_batch = []  # Clear batch on error
-            return {}
+            # Waiting callers get None, as for texts the API didn't embed
+            log_error(e, "Error embedding pending Cohere batch")
+            embeddings = {}
+        finally:
+            for text, future in batch:
+                inflight.pop(text, None)
+                if not future.done():
+                    embedding = embeddings.get(text)
+                    future.set_result(
+                        np.asarray(embedding, dtype=np.float32)
+                        if embedding is not None
+                        else None
+                    )
 
-    async def embed_document(self, document: dict[str, Any]) -> Optional[list[float]]:
+        if self._embedding_cache is not None and embeddings:
+            await asyncio.to_thread(self._persist, embeddings)
+
+    async def embed_document(self, document: SectionRecord) -> Optional[np.ndarray]:
         try:
-            text = document.get("contextualized_segment_text")
+            text = document.contextualized_segment_text
             if not text:
                 return None
 
             # Check if we already have the embedding
-            if text in self._document_vectors:
-                return self._document_vectors[text]
+            cached = self._document_vectors.get(text)
+            if cached is not None:
+                return _from_cache(cached)
+
+            if self._embedding_cache is not None:
+                persisted = await asyncio.to_thread(self._load_persisted, text)
+                if persisted is not None:
+                    self._document_vectors[text] = persisted
+                    return _from_cache(persisted)
+
+            if self._near_duplicates is not None:
+                similar = self._near_duplicates.lookup(text)
+                if similar is not None:
+                    self._document_vectors[text] = similar
+                    return _from_cache(similar)
+
+            loop = asyncio.get_running_loop()
+            state = self._batch_state(loop)
+
+            # Share the result of an identical text that is already queued
+            inflight = state["inflight"].get(text)
+            if inflight is not None:
+                return await asyncio.shield(inflight)
+
+            # Add to the batch and wait until it is embedded
+            tokens = self._estimate_tokens(text)
+            # Send what is pending first if this text would overflow the budget
+            if state["pending"] and state["tokens"] + tokens > self._token_budget:
+                self._start_flush(loop)
+
+            future = loop.create_future()
+            state["pending"].append((text, future))
+            state["inflight"][text] = future
+            state["tokens"] += tokens
+
+            if (
+                len(state["pending"]) >= self._batch_size
+                or state["tokens"] >= self._token_budget
+            ):
+                self._start_flush(loop)
+            elif state["flush_handle"] is None:
+                state["flush_handle"] = loop.call_later(
+                    self._flush_delay, self._start_flush, loop
+                )
+
+            return await asyncio.shield(future)
 
-            # Add to batch
-            self._text_batch.append(text)
+        except Exception as e:
+            log_error(e, "Error generating Cohere embedding")
+            return None
 
-            # Process batch if it reaches the size limit
-            if len(self._text_batch) >= self._batch_size:
-                embeddings = await self._process_batch()
-                self._document_vectors.update(embeddings)
-                return embeddings.get(text)
 
-            # If this is the first document, process immediately
-            if len(self._text_batch) == 1:
-                embeddings = await self._process_batch()
-                self._document_vectors.update(embeddings)
-                return embeddings.get(text)
+class CohereBatchEmbeddingStrategy(CohereEmbeddingStrategy):
+    """
+    Cohere strategy for bulk ingestion that embeds texts through Cohere's
+    asynchronous embed jobs instead of the real-time endpoint.
+
+    Embed jobs are billed at a lower rate but take minutes to finish, so this is
+    only suitable for background ingestion, never for query embedding. Texts are
+    collected for longer and into much larger batches; each batch is uploaded as a
+    dataset, the job is polled until it completes, and pending callers are
+    resolved from its output. If a job fails, the batch falls back to the
+    real-time endpoint.
+    """
 
-            # Otherwise, wait for batch to fill
-            return None
+    REALTIME_BATCH_SIZE = 96
+
+    def __init__(
+        self,
+        embeddings_providers: dict,
+        flush_delay: float = 5.0,
+        batch_size: int = 10_000,
+        poll_interval: float = 10.0,
+        embedding_cache: Optional[EmbeddingCache] = None,
+        token_budget: int = 5_000_000,
+    ):
+        super().__init__(
+            embeddings_providers,
+            flush_delay=flush_delay,
+            embedding_cache=embedding_cache,
+            token_budget=token_budget,
+        )
+        self._batch_size = batch_size
+        self._poll_interval = poll_interval
+        self._client = self.embedding_model.provider.async_client
+
+    async def _wait_for_dataset(self, dataset_id: str) -> None:
+        while True:
+            response = await self._client.datasets.get(dataset_id)
+            status = response.dataset.validation_status
+            if status == "validated":
+                return
+            if status in ("failed", "skipped"):
+                raise RuntimeError(f"Embed dataset {dataset_id} validation {status}")
+            await asyncio.sleep(self._poll_interval)
+
+    async def _wait_for_job(self, job_id: str) -> Any:
+        while True:
+            job = await self._client.embed_jobs.get(job_id)
+            if job.status == "complete":
+                return job
+            if job.status in ("failed", "cancelled"):
+                raise RuntimeError(f"Embed job {job_id} {job.status}")
+            await asyncio.sleep(self._poll_interval)
+
+    @staticmethod
+    def _read_job_output(dataset: Any) -> dict[str, list[float]]:
+        """Download an embed job's output dataset and map each text to its vector."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "output.jsonl")
+            SdkUtils.save_dataset(dataset, path, format="jsonl")
+            embeddings = {}
+            with open(path) as f:
+                for line in f:
+                    record = json.loads(line)
+                    embeddings[record["text"]] = record["embeddings"]["float"]
+            return embeddings
+
+    async def _process_batch(self, texts: list[str]) -> dict[str, list[float]]:
+        """
+        Embed a batch of texts with an embed job and return a mapping of text to
+        embedding.
+        """
+        if not texts:
+            return {}
+
+        try:
+            data = "\n".join(json.dumps({"text": text}) for text in texts)
+            dataset = await self._client.datasets.create(
+                name=f"ingest-{uuid.uuid4().hex}",
+                type="embed-input",
+                data=io.BytesIO(data.encode("utf-8")),
+            )
+            await self._wait_for_dataset(dataset.id)
+
+            job = await self._client.embed_jobs.create(
+                dataset_id=dataset.id,
+                model=self._model_id,
+                input_type="search_document",
+                embedding_types=["float"],
+                truncate="END",
+            )
+            job = await self._wait_for_job(job.job_id)
+
+            output = await self._client.datasets.get(job.output_dataset_id)
+            return await asyncio.to_thread(self._read_job_output, output.dataset)
 
         except Exception as e:
-            log_error(e, "Error generating Cohere embedding")
-            return None
+            log_error(e, "Error running Cohere embed job, using real-time endpoint")
+            embeddings = {}
+            for i in range(0, len(texts), self.REALTIME_BATCH_SIZE):
+                embeddings.update(
+                    await super()._process_batch(
+                        texts[i : i + self.REALTIME_BATCH_SIZE]
+                    )
+                )
+            return embeddings
 
 
 class VoyageEmbeddingStrategy(EmbeddingStrategy):
@@ -111,71 +395,106 @@ class VoyageEmbeddingStrategy(EmbeddingStrategy):
     Handles PDF-to-image conversion and embedding generation with efficient batching.
     """
 
-    def __init__(self, embeddings_providers, zoom: float = 3.0):
+    def __init__(self, embeddings_providers):
         self.embedding_model = embeddings_providers["voyage"]
-        self.zoom = zoom
-        self._document_vectors = {}  # Cache for document vectors
+        # LRU cache of page vectors keyed by (pdf_url, 0-based page number)
+        self._document_vectors = TTLCache(maxsize=EMBED_CACHE_SIZE)
         self._batch_size = 128  # Voyage's recommended batch size
+        self._max_concurrent_batches = 4  # Stay within Voyage's rate limits
+        self._semaphores: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
 
-    def _pdf_to_screenshots(self, file_path: str, zoom: float = 1.0) -> list[str]:
+    async def _pdf_to_screenshots(self, file_path: str) -> list[str]:
         """
-        Convert PDF pages to base64 encoded images.
+        Convert PDF pages to base64 encoded images in the PDF process pool.
 
         Args:
             file_path: Path to the PDF file
-            zoom: Zoom factor for rendering quality
 
         Returns:
             list[str]: list of base64 encoded images
         """
-        return extract_and_process_pdf_pages(
-            file_path=file_path,
-            target_width=1568,  # Anthropic's preferred width
-            target_height=1568,  # Anthropic's preferred height
-            zoom=zoom,
+        return await asyncio.get_running_loop().run_in_executor(
+            get_pdf_process_pool(),
+            extract_and_process_pdf_pages,
+            file_path,
+            1568,  # Anthropic's preferred width
+            1568,  # Anthropic's preferred height
         )
 
-    async def embed_document(self, document: dict[str, Any]) -> Optional[list[float]]:
+    async def _embed_batch(self, batch: list[str]) -> Any:
+        """Embed a batch of page images, limiting concurrent requests per event loop."""
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self._max_concurrent_batches)
+            self._semaphores[loop] = semaphore
+
+        async with semaphore:
+            return await self.embedding_model.async_embed(
+                inputs=[[page] for page in batch],
+                model_id="voyage-multimodal-3",
+                input_type="document",
+            )
+
+    async def embed_document(self, document: SectionRecord) -> Optional[np.ndarray]:
         try:
             # Get PDF URL and page number from metadata
-            metadata = document.get("metadata", {})
-            pdf_url = metadata.get("file_url")
-            pages = metadata.get("pages", [])
-            page_images = metadata.get("page_images", [])
+            metadata = document.metadata
+            pdf_url = metadata.file_url
+            pages = metadata.pages
+            page_images = metadata.page_images
 
             if not pdf_url or not pages:
                 return None
 
             page_num = pages[0] - 1  # Convert to 0-based index
 
-            # Check if we already have vectors for this document
-            if pdf_url not in self._document_vectors:
-                # Use page_images if available, otherwise generate them
-                if not page_images:
-                    page_images = self._pdf_to_screenshots(
-                        file_path=pdf_url, zoom=self.zoom
-                    )
-
-                # Process images in batches
-                document_vectors = []
-                for i in range(0, len(page_images), self._batch_size):
-                    batch = page_images[i : i + self._batch_size]
-                    batch_response = await self.embedding_model.async_embed(
-                        inputs=[[page] for page in batch],
-                        model_id="voyage-multimodal-3",
-                        input_type="document",
+            # Check if we already have the vector for this page
+            cached = self._document_vectors.get((pdf_url, page_num))
+            if cached is not None:
+                return _from_cache(cached)
+
+            # Use the section's page images if available, otherwise render the
+            # whole document so every page's vector gets cached
+            if page_images:
+                page_nums = [page - 1 for page in pages[: len(page_images)]]
+            else:
+                page_images = await self._pdf_to_screenshots(file_path=pdf_url)
+                page_nums = list(range(len(page_images)))
+
+            # Process images in concurrent batches
+            responses = await asyncio.gather(
+                *(
+                    self._embed_batch(page_images[i : i + self._batch_size])
+                    for i in range(0, len(page_images), self._batch_size)
+                ),
+                return_exceptions=True,
+            )
+            # Fill one preallocated array, normalizing each batch as it is copied
+            # in rather than collecting every vector into a list first
+            document_vectors = None
+            for batch_index, batch_response in enumerate(responses):
+                if isinstance(batch_response, BaseException):
+                    raise batch_response
+                block = np.asarray(batch_response.embeddings, dtype=np.float32)
+                norms = np.linalg.norm(block, axis=1, keepdims=True)
+                np.divide(block, norms, out=block, where=norms > 0)
+                if document_vectors is None:
+                    document_vectors = np.empty(
+                        (len(page_images), block.shape[1]), dtype=CACHE_DTYPE
                     )
-                    document_vectors.extend(batch_response.embeddings)
+                start = batch_index * self._batch_size
+                document_vectors[start : start + len(block)] = block
 
-                # Cache the vectors
-                self._document_vectors[pdf_url] = np.array(document_vectors)
+            # Cache the vectors page by page, so one large PDF can't pin all of
+            # its pages in the cache
+            if document_vectors is not None:
+                for num, vector in zip(page_nums, document_vectors):
+                    self._document_vectors[(pdf_url, num)] = vector
 
             # Return the vector for the specific page
-            document_vectors = self._document_vectors[pdf_url]
-            if 0 <= page_num < len(document_vectors):
-                return document_vectors[page_num].tolist()
-
-            return None
+            vector = self._document_vectors.get((pdf_url, page_num))
+            return _from_cache(vector) if vector is not None else None
 
         except Exception as e:
             log_error(e, "Error generating Voyage multimodal embedding")
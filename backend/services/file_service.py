@@ -3,17 +3,77 @@ from models.user import User
 import tempfile
 from utils.error_handlers import log_error
 from loguru import logger
-import fitz
 import os
-from PIL import Image
 import urllib.parse
 from services.document_ingestion_service import DocumentProcessor
+from utils.pdf_utils import get_pdf_process_pool, render_pdf_thumbnails
 from elasticsearch import NotFoundError
-from threading import Thread
+from threading import Lock, Thread, Timer
 from datetime import datetime, timezone
 import asyncio
 
 
+class _TeeReader:
+    """
+    Read-only stream wrapper that copies every chunk read into a second file.
+
+    It deliberately has no seek(), so S3 consumes it strictly sequentially.
+    """
+
+    def __init__(self, source, sink):
+        self._source = source
+        self._sink = sink
+
+    def read(self, size=-1):
+        chunk = self._source.read(size)
+        self._sink.write(chunk)
+        return chunk
+
+
+class _ProgressReporter:
+    """
+    Coalesces processing progress updates for one document into at most one
+    MongoDB write per interval, writing only the latest progress and step.
+    """
+
+    def __init__(self, doc_id, interval: float = 0.5):
+        self._doc_id = doc_id
+        self._interval = interval
+        self._lock = Lock()
+        # Held across the write so a terminal flush waits for a timer flush
+        # in flight and progress never goes backwards; update() never waits on it
+        self._write_lock = Lock()
+        self._pending = None
+        self._timer = None
+
+    def update(self, progress: float, step: str = None):
+        with self._lock:
+            if step is None and self._pending is not None:
+                step = self._pending[1]
+            self._pending = (min(max(progress, 0.0), 1.0), step)
+            if self._timer is None:
+                self._timer = Timer(self._interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """Write the pending update now, e.g. before a terminal status change."""
+        with self._write_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                pending, self._pending = self._pending, None
+            if pending is None:
+                return
+
+            progress, step = pending
+            updates = {"set__processing_progress": progress}
+            if step:
+                updates["set__processing_step"] = step
+            FileMetadata.objects(id=self._doc_id).update(**updates)
+
+
 class FileService:
     def __init__(
         self, s3_service, document_processor: DocumentProcessor, elasticsearch_client
@@ -21,6 +81,22 @@ class FileService:
         self.s3_service = s3_service
         self.document_processor = document_processor
         self.elasticsearch_client = elasticsearch_client
+        # Bucket name as used for S3 operations, without hyphens
+        self._s3_bucket_name = (os.getenv("AWS_S3_BUCKET_NAME") or "").replace(
+            "-", ""
+        )
+
+        # (title, index names) of uploads that have not saved their metadata yet.
+        # A concurrent upload with the same title gets the title conflict error
+        # the metadata check would give it once the first upload is recorded.
+        # Requests run on their own event loops and threads, hence the lock.
+        self._inflight_uploads: set[tuple] = set()
+        self._inflight_lock = Lock()
+
+        # One long-lived event loop runs every upload's ingestion, so uploads are
+        # processed concurrently and async clients keep their connection pools
+        self._bg_loop = asyncio.new_event_loop()
+        Thread(target=self._bg_loop.run_forever, daemon=True).start()
 
     async def process_upload(
         self,
@@ -31,31 +107,74 @@ class FileService:
         user_id,
         nominal_creator_name,
         filter_dimensions,
+    ):
+        key = (
+            title,
+            tuple(index_names)
+            if isinstance(index_names, (list, tuple))
+            else index_names,
+        )
+        with self._inflight_lock:
+            duplicate = key in self._inflight_uploads
+            if not duplicate:
+                self._inflight_uploads.add(key)
+        if duplicate:
+            return self._title_conflict(title, index_names)
+
+        try:
+            return await self._start_upload(
+                uploaded_file,
+                title,
+                index_names,
+                file_visibility,
+                user_id,
+                nominal_creator_name,
+                filter_dimensions,
+            )
+        finally:
+            with self._inflight_lock:
+                self._inflight_uploads.discard(key)
+
+    @staticmethod
+    def _title_conflict(title, index_names):
+        error_message, _ = log_error(
+            ValueError(
+                f"A document with the title '{title}' already exists in the '{index_names}' index."
+            ),
+            "Document title conflict check",
+        )
+        return {"error": error_message}
+
+    async def _start_upload(
+        self,
+        uploaded_file,
+        title,
+        index_names,
+        file_visibility,
+        user_id,
+        nominal_creator_name,
+        filter_dimensions,
     ):
         try:
             # Check for existing document
-            existing_document = FileMetadata.objects(
-                title=title, index_names__contains=index_names
-            ).first()
+            existing_document = (
+                FileMetadata.objects(title=title, index_names__contains=index_names)
+                .only("id")
+                .first()
+            )
             if existing_document:
-                error_message, _ = log_error(
-                    ValueError(
-                        f"A document with the title '{title}' already exists in the '{index_names}' index."
-                    ),
-                    "Document title conflict check",
-                )
-                return {"error": error_message}
+                return self._title_conflict(title, index_names)
 
             # Phase 1: Quick initial upload (0.0 -> 0.1)
+            # Stream the upload straight to S3, writing the local copy needed for
+            # background processing as it goes instead of reading it back
             with tempfile.NamedTemporaryFile(delete=False) as tf:
-                uploaded_file.save(tf.name)
                 file_path = tf.name
-
-            # Upload to S3
-            file_url = self.s3_service.upload_file_to_s3(
-                file_path, uploaded_file.filename
-            )
+                file_url = self.s3_service.upload_fileobj_to_s3(
+                    _TeeReader(uploaded_file.stream, tf), uploaded_file.filename
+                )
             if file_url is None:
+                os.remove(file_path)
                 error_message, _ = log_error(
                     Exception("Failed to upload file to S3"), "S3 upload attempt"
                 )
@@ -82,11 +201,12 @@ class FileService:
             ).save()
 
             # Phase 2: Start background processing
-            Thread(
-                target=self._process_document_background,
-                args=(file_path, metadata.id, uploaded_file.filename),
-                daemon=True,
-            ).start()
+            asyncio.run_coroutine_threadsafe(
+                self._process_document_background(
+                    file_path, metadata.id, uploaded_file.filename
+                ),
+                self._bg_loop,
+            )
 
             # Return immediately with document ID
             return {"message": "File upload started", "doc_id": str(metadata.id)}
@@ -95,70 +215,69 @@ class FileService:
             error_message, _ = log_error(e, "Upload initialization")
             return {"error": error_message}, 500
 
-    def _process_document_background(self, file_path, doc_id, filename):
+    async def _process_document_background(self, file_path, doc_id, filename):
         try:
-            metadata = FileMetadata.objects(id=doc_id).first()
+            # MongoDB calls run in worker threads so they don't stall the loop
+            metadata = await asyncio.to_thread(
+                FileMetadata.objects(id=doc_id).first
+            )
+            progress = _ProgressReporter(doc_id)
 
             # Generate thumbnails (0.1 -> 0.2)
-            metadata.update_progress(0.15, "Generating thumbnails")
-            thumbnails = self.generate_pdf_thumbnails(file_path)
+            progress.update(0.15, "Generating thumbnails")
+            thumbnails = await self.generate_pdf_thumbnails(file_path)
 
             thumbnail_urls = []
             if thumbnails:
-                for j, img in enumerate(thumbnails):
-                    thumbnail_file_path = f"{file_path}_thumb_{j}.jpg"
-                    img.save(thumbnail_file_path)
-                    thumbnail_url = self.s3_service.upload_file_to_s3(
-                        thumbnail_file_path, f"{filename}_thumb_{j}.jpg"
+                # Upload every thumbnail concurrently, keeping page order
+                uploaded = await asyncio.gather(
+                    *(
+                        asyncio.to_thread(
+                            self._upload_thumbnail, file_path, filename, j, jpeg_bytes
+                        )
+                        for j, jpeg_bytes in enumerate(thumbnails)
                     )
-                    if thumbnail_url:
-                        thumbnail_url = urllib.parse.quote(thumbnail_url, safe=":/")
-                        thumbnail_urls.append(thumbnail_url)
-                    os.remove(thumbnail_file_path)
-                metadata.update_progress(0.2, "Thumbnails generated")
+                )
+                thumbnail_urls = [url for url in uploaded if url]
+                progress.update(0.2, "Thumbnails generated")
 
             # Document processing and ingestion (0.2 -> 1.0)
             try:
-                metadata.update_progress(0.3, "Processing document text")
-
-                # Run async ingest in the background thread
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-
-                ingest_result = loop.run_until_complete(
-                    self.document_processor.ingest(
-                        file_path=file_path,
-                        file_url=metadata.s3_url,
-                        title=metadata.title,
-                        thumbnail_urls=thumbnail_urls,
-                        index_names=metadata.index_names,
-                        file_visibility=metadata.visibility,
-                        originating_user_id=str(metadata.originating_user.id),
-                        nominal_creator_name=metadata.nominal_creator_name,
-                        filter_dimensions=metadata.filter_dimensions,
-                        progress_callback=lambda progress,
-                        step: metadata.update_progress(
-                            0.3 + (progress * 0.7),  # Scale remaining 70% of progress
-                            step,
-                        ),
-                    )
+                progress.update(0.3, "Processing document text")
+
+                ingest_result = await self.document_processor.ingest(
+                    file_path=file_path,
+                    file_url=metadata.s3_url,
+                    title=metadata.title,
+                    thumbnail_urls=thumbnail_urls,
+                    index_names=metadata.index_names,
+                    file_visibility=metadata.visibility,
+                    originating_user_id=str(metadata.originating_user.id),
+                    nominal_creator_name=metadata.nominal_creator_name,
+                    filter_dimensions=metadata.filter_dimensions,
+                    progress_callback=lambda fraction, step: progress.update(
+                        0.3 + (fraction * 0.7),  # Scale remaining 70% of progress
+                        step,
+                    ),
                 )
-                loop.close()
 
+                # Terminal transitions are written immediately
+                await asyncio.to_thread(progress.flush)
                 if ingest_result:
                     metadata.processing_status = ProcessingStatus.COMPLETED
                     metadata.processing_progress = 1.0
                     metadata.processing_step = "Processing complete"
                     metadata.processing_completed_at = datetime.now(timezone.utc)
-                    metadata.save()
+                    await asyncio.to_thread(metadata.save)
                 else:
                     raise Exception("Document ingestion failed")
 
             except Exception as e:
                 logger.error(f"Error during document ingestion: {str(e)}")
+                await asyncio.to_thread(progress.flush)
                 metadata.processing_status = ProcessingStatus.FAILED
                 metadata.processing_error = str(e)
-                metadata.save()
+                await asyncio.to_thread(metadata.save)
                 raise
 
             finally:
@@ -171,26 +290,36 @@ class FileService:
         except Exception as e:
             logger.error(f"Background processing error: {str(e)}")
             try:
-                metadata = FileMetadata.objects(id=doc_id).first()
+                metadata = await asyncio.to_thread(
+                    FileMetadata.objects(id=doc_id).first
+                )
                 metadata.processing_status = ProcessingStatus.FAILED
                 metadata.processing_error = str(e)
-                metadata.save()
+                await asyncio.to_thread(metadata.save)
             except Exception as inner_e:
                 logger.error(f"Error updating metadata after failure: {str(inner_e)}")
 
-    def generate_pdf_thumbnails(self, pdf_path):
+    def _upload_thumbnail(self, file_path, filename, j, jpeg_bytes):
+        """Write one thumbnail next to the PDF, upload it to S3 and remove it."""
+        thumbnail_file_path = f"{file_path}_thumb_{j}.jpg"
         try:
-            pdf_document = fitz.open(pdf_path)
-            thumbnails = []
-
-            for page_num in range(min(2, len(pdf_document))):
-                page = pdf_document.load_page(page_num)
-                pix = page.get_pixmap(dpi=150)
-                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                img.thumbnail((900, 1600))
-                thumbnails.append(img)
+            with open(thumbnail_file_path, "wb") as f:
+                f.write(jpeg_bytes)
+            thumbnail_url = self.s3_service.upload_file_to_s3(
+                thumbnail_file_path, f"{filename}_thumb_{j}.jpg"
+            )
+            if thumbnail_url:
+                return urllib.parse.quote(thumbnail_url, safe=":/")
+            return None
+        finally:
+            os.remove(thumbnail_file_path)
 
-            return thumbnails
+    async def generate_pdf_thumbnails(self, pdf_path) -> list[bytes]:
+        """Render JPEG thumbnails of the first pages in the PDF process pool."""
+        try:
+            return await asyncio.wrap_future(
+                get_pdf_process_pool().submit(render_pdf_thumbnails, pdf_path)
+            )
 
         except Exception as e:
             error_message, _ = log_error(e, "PDF thumbnail generation")
@@ -199,7 +328,9 @@ class FileService:
     async def delete_document(self, file_url, index_name):
         try:
             # Delete document from MongoDB
-            document = FileMetadata.objects(s3_url=file_url).first()
+            document = (
+                FileMetadata.objects(s3_url=file_url).only("id", "title").first()
+            )
             if not document:
                 error_message, _ = log_error(
                     Exception(
@@ -213,19 +344,19 @@ class FileService:
             document.delete()
             logger.info(f"Document '{document_title}' deleted from MongoDB")
 
-            # Delete document from Elasticsearch
-            query = {"query": {"match": {"metadata.file_url": file_url}}}
+            # Delete document from Elasticsearch through the vector store, so its
+            # cached search results are dropped too
             try:
-                delete_result = self.elasticsearch_client.delete_by_query(
-                    index=index_name, body=query
+                deleted = self.document_processor.vector_store.delete_file_documents(
+                    file_url, index_name
                 )
-                if delete_result["deleted"] == 0:
+                if deleted == 0:
                     logger.warning(
                         f"No documents found in Elasticsearch for deletion. Index: {index_name}, file_url: {file_url}"
                     )
                 else:
                     logger.info(
-                        f"Document deleted from Elasticsearch. Index: {index_name}, Deleted count: {delete_result['deleted']}"
+                        f"Document deleted from Elasticsearch. Index: {index_name}, Deleted count: {deleted}"
                     )
             except NotFoundError:
                 logger.warning(f"Index {index_name} not found in Elasticsearch")
@@ -238,9 +369,7 @@ class FileService:
             # Delete file from S3
             try:
                 s3_key = self.s3_service.extract_s3_key(file_url)
-                bucket_name = os.getenv("AWS_S3_BUCKET_NAME")
-                # Remove hyphens from bucket name for S3 operations
-                s3_bucket_name = bucket_name.replace("-", "")
+                s3_bucket_name = self._s3_bucket_name
                 self.s3_service.s3_client.delete_object(
                     Bucket=s3_bucket_name, Key=s3_key
                 )
@@ -1,81 +1,126 @@
-from typing import Dict, List, Optional, Set, Tuple, Any
-from urllib.parse import parse_qs
-from flask import jsonify
+import re
+from collections import defaultdict
+from threading import Lock
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Any
+from urllib.parse import parse_qsl
+from flask import g, has_request_context, jsonify
 from loguru import logger
-from mongoengine import Q
-from mongoengine.errors import DoesNotExist
+from mongoengine import Q, signals
 
 from models.file_metadata import FileMetadata
-from models.index_registry import IndexRegistry
+from models.index_registry import FilterDimension, IndexRegistry
 from models.user_organization import UserOrganization
 from models.user import User
+from utils.cache import TTLCache
 
 
-class FilterService:
-    @staticmethod
-    def parse_indices(
-        parsed_params: Dict[str, List[str]],
-    ) -> List[Dict[str, Optional[str]]]:
-        """Parse indices from query parameters."""
-        indices = []
-        index_count = 0
-
-        while f"indices[{index_count}][name]" in parsed_params:
-            index_data = {
-                "display_name": parsed_params.get(
-                    f"indices[{index_count}][display_name]", [None]
-                )[0],
-                "name": parsed_params.get(f"indices[{index_count}][name]", [None])[0],
-                "role_of_current_user": parsed_params.get(
-                    f"indices[{index_count}][role_of_current_user]", [None]
-                )[0],
-            }
-            indices.append(index_data)
-            index_count += 1
+# Bracketed query parameters, e.g. indices[0][name] and filterDimValues[1][0]
+INDEX_PARAM_RE = re.compile(r"indices\[(\d+)\]\[(\w+)\]")
+FILTER_DIM_VALUE_RE = re.compile(r"filterDimValues\[(\d+)\]\[(\d+)\]")
+INDEX_PARAM_FIELDS = ("display_name", "name", "role_of_current_user")
 
-        return indices
+# Dimension id -> name mappings by set of index names. Registries change rarely,
+# so mappings are cached process-wide: saving or deleting a registry or dimension
+# clears the cache, and the TTL bounds staleness from changes in other processes.
+_dimension_mapping_cache = TTLCache(maxsize=512, ttl=300)
+_dimension_mapping_lock = Lock()
 
-    @staticmethod
-    def parse_filter_dimensions(
-        parsed_params: Dict[str, List[str]],
-    ) -> Tuple[List[str], List[List[str]]]:
-        """Parse filter dimension names and values."""
-        filter_dim_names = parsed_params.get("filterDimNames[]", [])
-        filter_dim_values = []
-
-        value_index = 0
-        while f"filterDimValues[{value_index}][0]" in parsed_params:
-            values = []
-            inner_value_index = 0
-            while (
-                f"filterDimValues[{value_index}][{inner_value_index}]" in parsed_params
-            ):
-                values.append(
-                    parsed_params[
-                        f"filterDimValues[{value_index}][{inner_value_index}]"
-                    ][0]
-                )
-                inner_value_index += 1
-            filter_dim_values.append(values)
-            value_index += 1
 
-        return filter_dim_names, filter_dim_values
+def clear_dimension_mapping_cache(*args, **kwargs) -> None:
+    """Drop every cached dimension mapping. Usable as a mongoengine signal receiver."""
+    with _dimension_mapping_lock:
+        _dimension_mapping_cache.clear()
+
+
+for _sender in (IndexRegistry, FilterDimension):
+    signals.post_save.connect(clear_dimension_mapping_cache, sender=_sender)
+    signals.post_delete.connect(clear_dimension_mapping_cache, sender=_sender)
+
+# FileMetadata fields read when listing documents
+DOCUMENT_LIST_FIELDS = (
+    "id",
+    "title",
+    "s3_url",
+    "thumbnail_urls",
+    "nominal_creator_name",
+    "index_names",
+    "filter_dimensions",
+    "visibility",
+    "organizations",
+    "originating_user",
+)
+
 
+class FilterService:
     @staticmethod
-    def parse_pagination_sorting(parsed_params: Dict[str, List[str]]) -> Dict[str, Any]:
-        """Parse pagination and sorting parameters."""
-        page = int(parsed_params.get("page", [1])[0])
-        sort_field = parsed_params.get("sortField", ["title"])[0]
-        sort_order = parsed_params.get("sortOrder", ["asc"])[0]
-        per_page = 9 if sort_field == "title" else 1000
+    def parse_params(query_string: str) -> Dict[str, Any]:
+        """
+        Parse indices, filter dimensions, pagination and sorting from the query
+        string in a single pass over its parameters. Where a parameter repeats,
+        its first value is used.
+        """
+        indices: Dict[int, Dict[str, Optional[str]]] = {}
+        values_by_dim: Dict[int, Dict[int, str]] = {}
+        filter_dim_names: List[str] = []
+        scalars: Dict[str, str] = {}
+
+        for key, value in parse_qsl(query_string):
+            if key == "filterDimNames[]":
+                filter_dim_names.append(value)
+                continue
+
+            match = INDEX_PARAM_RE.fullmatch(key)
+            if match:
+                if match[2] in INDEX_PARAM_FIELDS:
+                    index_data = indices.setdefault(
+                        int(match[1]), dict.fromkeys(INDEX_PARAM_FIELDS)
+                    )
+                    if index_data[match[2]] is None:
+                        index_data[match[2]] = value
+                continue
+
+            match = FILTER_DIM_VALUE_RE.fullmatch(key)
+            if match:
+                values_by_dim.setdefault(int(match[1]), {}).setdefault(
+                    int(match[2]), value
+                )
+                continue
 
+            scalars.setdefault(key, value)
+
+        sort_field = scalars.get("sortField", "title")
         return {
-            "page": page,
+            "indices": [
+                indices[position]
+                for position in sorted(indices)
+                if indices[position]["name"] is not None
+            ],
+            "filter_dim_names": filter_dim_names,
+            "filter_dim_values": [
+                [values_by_dim[dim][i] for i in sorted(values_by_dim[dim])]
+                for dim in sorted(values_by_dim)
+            ],
+            "page": int(scalars.get("page", 1)),
             "sort_field": sort_field,
-            "sort_order": sort_order,
-            "per_page": per_page,
+            "sort_order": scalars.get("sortOrder", "asc"),
+            "per_page": 9 if sort_field == "title" else 1000,
         }
 
+    def get_params(self, query_string: str) -> Dict[str, Any]:
+        """
+        Parsed filter parameters for the query string, memoized on the current
+        request so it is parsed at most once per request.
+        """
+        if not has_request_context():
+            return self.parse_params(query_string)
+
+        cached = g.get("_filter_params")
+        if cached is not None and cached[0] == query_string:
+            return cached[1]
+        params = self.parse_params(query_string)
+        g._filter_params = (query_string, params)
+        return params
+
     @staticmethod
     def build_query(
         indices: List[Dict[str, Optional[str]]],
@@ -105,44 +150,87 @@ class FilterService:
     @staticmethod
     def get_dimension_mapping(all_index_names: Set[str]) -> Dict[str, str]:
         """Create mapping of dimension IDs to names from indices."""
-        dimension_mapping = {}
+        key = frozenset(all_index_names)
+        with _dimension_mapping_lock:
+            cached = _dimension_mapping_cache.get(key)
+        if cached is not None:
+            logger.debug(f"Dimension mapping cache hit for {len(key)} indices")
+            return cached
+        logger.debug(f"Dimension mapping cache miss for {len(key)} indices")
 
-        for index_name in all_index_names:
-            index_registry = IndexRegistry.objects(index_name=index_name).first()
-            if index_registry and index_registry.filter_dimensions:
-                for dim in index_registry.filter_dimensions:
-                    dimension_mapping[str(dim.id)] = dim.name
+        dimension_mapping = {}
+        if all_index_names:
+            # One query for the registries and one for their dimensions, reading
+            # raw documents instead of dereferencing each registry's dimensions
+            registries = (
+                IndexRegistry.objects(index_name__in=list(all_index_names))
+                .only("filter_dimensions")
+                .as_pymongo()
+            )
+            dimension_ids = {
+                dim_id
+                for registry in registries
+                for dim_id in registry.get("filter_dimensions", [])
+            }
+            if dimension_ids:
+                dimensions = (
+                    FilterDimension.objects(id__in=list(dimension_ids))
+                    .only("name")
+                    .as_pymongo()
+                )
+                for dim in dimensions:
+                    dimension_mapping[str(dim["_id"])] = dim["name"]
 
         logger.info(f"Found dimension mapping: {dimension_mapping}")
+        with _dimension_mapping_lock:
+            _dimension_mapping_cache[key] = dimension_mapping
         return dimension_mapping
 
     @staticmethod
-    def check_document_access(doc: FileMetadata, current_user: User) -> bool:
-        """Check if current user has access to document."""
-        if doc.visibility == "public":
-            return True
-
-        try:
-            if doc.originating_user and doc.originating_user.id == current_user.id:
-                return True
+    def get_user_organization_ids(current_user: User) -> Set[Any]:
+        """Ids of the organizations the user is an active member of."""
+        memberships = (
+            UserOrganization.objects(user=current_user.id, is_active=True)
+            .only("organization")
+            .as_pymongo()
+        )
+        return {membership["organization"] for membership in memberships}
 
-            user_orgs = UserOrganization.objects(
-                user=current_user.id, organization__in=doc.organizations, is_active=True
-            )
-            return bool(user_orgs)
-        except (DoesNotExist, AttributeError):
-            user_orgs = UserOrganization.objects(
-                user=current_user.id, organization__in=doc.organizations, is_active=True
+    @staticmethod
+    def build_access_query(user_org_ids: Set[Any], current_user_id: Any) -> Q:
+        """Build the MongoDB query for documents the current user may see."""
+        return (
+            Q(visibility="public")
+            | Q(originating_user=current_user_id)
+            | Q(organizations__in=list(user_org_ids))
+        )
+
+    def get_access_query(self, current_user: User) -> Q:
+        """
+        Access query for the current user, memoized on the current request so
+        the user's memberships are read at most once per request.
+        """
+        if not has_request_context():
+            return self.build_access_query(
+                self.get_user_organization_ids(current_user), current_user.id
             )
-            return bool(user_orgs)
+
+        cached = g.get("_access_query")
+        if cached is not None and cached[0] == current_user.id:
+            return cached[1]
+        query = self.build_access_query(
+            self.get_user_organization_ids(current_user), current_user.id
+        )
+        g._access_query = (current_user.id, query)
+        return query
 
     @staticmethod
     def process_document(
-        doc: FileMetadata, dimension_mapping: Dict[str, str]
+        doc: Dict[str, Any], dimension_mapping: Dict[str, str]
     ) -> Dict[str, Any]:
-        """Process a single document into the required format."""
+        """Process a single raw FileMetadata document into the required format."""
         filter_dims = {}
-        for dim_id, values in doc.filter_dimensions.items():
+        for dim_id, values in (doc.get("filter_dimensions") or {}).items():
             if dim_id in dimension_mapping:
                 dim_name = dimension_mapping[dim_id]
                 if isinstance(values, list):
@@ -152,77 +240,88 @@ class FilterService:
                 else:
                     filter_dims[dim_name] = str(values)
 
+        thumbnail_urls = doc.get("thumbnail_urls")
+        index_names = doc.get("index_names")
         return {
-            "id": str(doc.id),
-            "title": doc.title,
-            "s3_url": doc.s3_url,
-            "thumbnail_urls": [doc.thumbnail_urls[0]] if doc.thumbnail_urls else [],
-            "organization": doc.nominal_creator_name,
-            "index_name": doc.index_names[0] if doc.index_names else None,
+            "id": str(doc["_id"]),
+            "title": doc.get("title"),
+            "s3_url": doc.get("s3_url"),
+            "thumbnail_urls": [thumbnail_urls[0]] if thumbnail_urls else [],
+            "organization": doc.get("nominal_creator_name"),
+            "index_name": index_names[0] if index_names else None,
             "filter_dimensions": filter_dims,
-            "file_visibility": doc.visibility,
+            "file_visibility": doc.get("visibility"),
         }
 
-    @staticmethod
-    def group_documents(documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Group documents by filter dimensions."""
-        grouped_docs = {}
-        all_dimensions = set()
-
-        # Get all unique dimensions
+    def iter_processed_documents(
+        self, documents: Iterable[Dict[str, Any]]
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily process raw documents, resolving each document's dimensions from
+        the registries of its own indices.
+        """
+        # Documents mostly share a few index combinations, so each combination's
+        # mapping is looked up once per call (and served from the module cache)
+        mappings: Dict[frozenset, Dict[str, str]] = {}
         for doc in documents:
-            all_dimensions.update(doc["filter_dimensions"].keys())
+            key = frozenset(doc.get("index_names") or ())
+            dimension_mapping = mappings.get(key)
+            if dimension_mapping is None:
+                dimension_mapping = mappings[key] = self.get_dimension_mapping(key)
+            yield self.process_document(doc, dimension_mapping)
+
+    def process_documents(
+        self, documents: Iterable[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Process raw documents in a single pass."""
+        return list(self.iter_processed_documents(documents))
 
-        # Create groups for each dimension
-        for dimension in all_dimensions:
-            for doc in documents:
-                if dimension in doc["filter_dimensions"]:
-                    group_key = dimension
-                    if group_key not in grouped_docs:
-                        grouped_docs[group_key] = []
-                    grouped_docs[group_key].append(doc)
+    @staticmethod
+    def group_documents(documents: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Group documents by filter dimensions, consuming them in a single pass."""
+        grouped_docs = defaultdict(list)
+        # Lowercase each title once, not once per group the document is in
+        title_keys = {}
+        for doc in documents:
+            title_keys[doc["id"]] = (doc["title"] or "").lower()
+            for dimension in doc["filter_dimensions"]:
+                grouped_docs[dimension].append(doc)
 
         # Sort groups
         return [
-            {"groupName": k, "documents": sorted(v, key=lambda x: x["title"].lower())}
+            {"groupName": k, "documents": sorted(v, key=lambda x: title_keys[x["id"]])}
             for k, v in sorted(grouped_docs.items())
         ]
 
     def filter_documents(self, query_string: str, current_user: User):
         """Main method to filter documents based on query parameters."""
         try:
-            # Parse query string
-            parsed_params = parse_qs(query_string)
-
-            # Parse parameters
-            indices = self.parse_indices(parsed_params)
-            filter_dim_names, filter_dim_values = self.parse_filter_dimensions(
-                parsed_params
+            params = self.get_params(query_string)
+
+            # Build the query, including access control, so MongoDB does the
+            # filtering, sorting and (for the title sort) pagination
+            query = self.build_query(
+                params["indices"],
+                params["filter_dim_names"],
+                params["filter_dim_values"],
             )
-            params = self.parse_pagination_sorting(parsed_params)
-
-            # Build and execute query
-            query = self.build_query(indices, filter_dim_names, filter_dim_values)
-            all_documents = FileMetadata.objects(query).order_by(
-                f"{params['sort_order']}_{params['sort_field']}"
+            query &= self.get_access_query(current_user)
+            sort_direction = "-" if params["sort_order"] == "desc" else "+"
+            # Raw documents with only the fields used below, skipping document
+            # hydration and reference dereferencing
+            documents = (
+                FileMetadata.objects(query)
+                .only(*DOCUMENT_LIST_FIELDS)
+                .order_by(f"{sort_direction}{params['sort_field']}")
             )
 
-            # Get dimension mapping
-            all_index_names = {idx for doc in all_documents for idx in doc.index_names}
-            dimension_mapping = self.get_dimension_mapping(all_index_names)
-
-            # Process documents
-            processed_docs = []
-            for doc in all_documents:
-                if self.check_document_access(doc, current_user):
-                    processed_docs.append(self.process_document(doc, dimension_mapping))
-
             # Handle pagination and response
             if params["sort_field"] == "title":
-                total_documents = len(processed_docs)
-                start_idx = (params["page"] - 1) * params["per_page"]
-                end_idx = start_idx + params["per_page"]
-                paginated_docs = processed_docs[start_idx:end_idx]
+                total_documents = documents.count()
+                start_idx = max(params["page"] - 1, 0) * params["per_page"]
+                paginated_docs = self.process_documents(
+                    documents.skip(start_idx).limit(params["per_page"]).as_pymongo()
+                )
 
                 return jsonify(
                     {
@@ -235,7 +334,11 @@ class FilterService:
                     }
                 ), 200
             else:
-                grouped_docs = self.group_documents(processed_docs)
+                # Groups span every matching document, so all of them are needed;
+                # they are streamed from the cursor straight into their groups
+                grouped_docs = self.group_documents(
+                    self.iter_processed_documents(documents.as_pymongo())
+                )
                 groups_per_page = 3
                 total_groups = len(grouped_docs)
                 total_pages = max(
@@ -1,28 +1,54 @@
 from datetime import datetime, timedelta, timezone
+from threading import Lock
 from typing import Optional, Tuple, List, Dict
 from uuid import uuid4
 from loguru import logger
+from mongoengine import signals
 from models.user import User
 from models.chat import Chat
 from models.organization import Organization
+from utils.cache import TTLCache
+
+# Indices listed for guests change on the scale of minutes to hours, while every
+# guest page load asks for them. Saving or deleting an organization clears the
+# cache; the TTL bounds staleness from changes made by other processes.
+_guest_indices_cache = TTLCache(maxsize=1, ttl=60)
+_guest_indices_lock = Lock()
+
+
+def clear_guest_indices_cache(*args, **kwargs) -> None:
+    """Drop the cached guest indices. Usable as a mongoengine signal receiver."""
+    with _guest_indices_lock:
+        _guest_indices_cache.clear()
+
+
+signals.post_save.connect(clear_guest_indices_cache, sender=Organization)
+signals.post_delete.connect(clear_guest_indices_cache, sender=Organization)
 
 
 class GuestSessionManager:
+    # Session lookups and cleanup scans rely on the User indexes on session_id and
+    # (is_guest, session_expires_at); see models/user.py.
+
     def __init__(self):
         # Core session management settings
         self.GUEST_SESSION_DURATION = timedelta(hours=6)
         self.MAX_MESSAGES_PER_SESSION = 50
         logger.info(
-            f"GuestSessionManager initialized with duration={self.GUEST_SESSION_DURATION}, "
-            f"max_messages={self.MAX_MESSAGES_PER_SESSION}"
+            "GuestSessionManager initialized with duration={}, max_messages={}",
+            self.GUEST_SESSION_DURATION,
+            self.MAX_MESSAGES_PER_SESSION,
         )
 
     def _create_guest_user(self, session_id: str) -> User:
         """Helper method to create a guest user with a specific session ID"""
         try:
-            expires_at = datetime.now(timezone.utc) + self.GUEST_SESSION_DURATION
-            logger.debug(
-                f"Creating guest user - Session ID: {session_id}, Expires: {expires_at}"
+            now = datetime.now(timezone.utc)
+            expires_at = now + self.GUEST_SESSION_DURATION
+            logger.opt(lazy=True).debug(
+                "Creating guest user - Session ID: {}, Expires: {}",
+                lambda: session_id,
+                lambda: expires_at,
             )
 
             guest_user = User(
@@ -34,7 +60,7 @@ class GuestSessionManager:
                 is_guest=True,
                 is_verified=True,
                 session_id=session_id,
-                created_at=datetime.now(timezone.utc),
+                created_at=now,
                 session_expires_at=expires_at,
                 subscription_status="guest",
                 cycle_token_limit=self.MAX_MESSAGES_PER_SESSION,
@@ -42,17 +68,18 @@ class GuestSessionManager:
             ).save()
 
             logger.info(
-                f"Guest user created successfully - "
-                f"Session: {session_id}, "
-                f"Expires: {expires_at}, "
-                f"Message Limit: {self.MAX_MESSAGES_PER_SESSION}"
+                "Guest user created successfully - "
+                "Session: {}, Expires: {}, Message Limit: {}",
+                session_id,
+                expires_at,
+                self.MAX_MESSAGES_PER_SESSION,
             )
             return guest_user
         except Exception as e:
             logger.error(
-                f"Failed to create guest user - "
-                f"Session: {session_id}, "
-                f"Error: {str(e)}",
+                "Failed to create guest user - Session: {}, Error: {}",
+                session_id,
+                e,
                 exc_info=True,
             )
             raise
@@ -61,15 +88,18 @@ class GuestSessionManager:
         self, session_id: Optional[str] = None
     ) -> Tuple[User, str]:
         """Get existing guest session or create new one"""
-        logger.debug(
-            f"get_or_create_guest_session called with session_id: {session_id}"
+        logger.opt(lazy=True).debug(
+            "get_or_create_guest_session called with session_id: {}",
+            lambda: session_id,
         )
 
         if session_id:
             normalized_session_id = (
                 session_id if session_id.startswith("guest_") else f"guest_{session_id}"
             )
-            logger.debug(f"Normalized session ID: {normalized_session_id}")
+            logger.opt(lazy=True).debug(
+                "Normalized session ID: {}", lambda: normalized_session_id
+            )
 
             guest_user = User.objects(
                 session_id=normalized_session_id,
@@ -78,27 +108,27 @@ class GuestSessionManager:
             ).first()
 
             if guest_user:
-                logger.info(f"Found existing session: {normalized_session_id}")
+                logger.info("Found existing session: {}", normalized_session_id)
                 is_valid = self.is_session_valid(guest_user)
                 logger.info(
-                    f"Session validity check - "
-                    f"Session: {normalized_session_id}, "
-                    f"Valid: {is_valid}"
+                    "Session validity check - Session: {}, Valid: {}",
+                    normalized_session_id,
+                    is_valid,
                 )
                 if is_valid:
                     return guest_user, normalized_session_id
 
             logger.info(
-                f"Creating new session with provided ID: {normalized_session_id}"
+                "Creating new session with provided ID: {}", normalized_session_id
             )
             try:
                 guest_user = self._create_guest_user(normalized_session_id)
                 return guest_user, normalized_session_id
             except Exception as e:
                 logger.error(
-                    f"Failed to create guest session - "
-                    f"Session: {normalized_session_id}, "
-                    f"Error: {str(e)}"
+                    "Failed to create guest session - Session: {}, Error: {}",
+                    normalized_session_id,
+                    e,
                 )
                 raise
 
@@ -107,13 +137,13 @@ class GuestSessionManager:
     def create_guest_session(self) -> Tuple[User, str]:
         """Create a new guest session with generated ID"""
         session_id = f"guest_{uuid4().hex}"
-        logger.info(f"Generating new guest session with ID: {session_id}")
+        logger.info("Generating new guest session with ID: {}", session_id)
         try:
             guest_user = self._create_guest_user(session_id)
             return guest_user, session_id
         except Exception as e:
             logger.error(
-                f"Failed to create new guest session - Error: {str(e)}", exc_info=True
+                "Failed to create new guest session - Error: {}", e, exc_info=True
             )
             raise
 
@@ -121,21 +151,23 @@ class GuestSessionManager:
         """
         Check if a guest session is still valid with detailed logging
         """
-        logger.debug(f"Checking session validity for user: {guest_user.session_id}")
+        logger.opt(lazy=True).debug(
+            "Checking session validity for user: {}", lambda: guest_user.session_id
+        )
 
         # Log initial state
-        logger.debug(
-            f"Session state - "
-            f"Is Guest: {guest_user.is_guest}, "
-            f"Message Count: {guest_user.current_cycle_message_count}, "
-            f"Expires At: {guest_user.session_expires_at}"
+        logger.opt(lazy=True).debug(
+            "Session state - Is Guest: {}, Message Count: {}, Expires At: {}",
+            lambda: guest_user.is_guest,
+            lambda: guest_user.current_cycle_message_count,
+            lambda: guest_user.session_expires_at,
         )
 
         if not guest_user.is_guest:
             logger.warning(
-                f"Invalid guest status - "
-                f"Session: {guest_user.session_id}, "
-                f"Is Guest: {guest_user.is_guest}"
+                "Invalid guest status - Session: {}, Is Guest: {}",
+                guest_user.session_id,
+                guest_user.is_guest,
             )
             return False
 
@@ -145,39 +177,32 @@ class GuestSessionManager:
         # Ensure session_expires_at is timezone-aware
         if expires_at.tzinfo is None:
             expires_at = expires_at.replace(tzinfo=timezone.utc)
-            logger.debug(
-                f"Made expiration timezone-aware - "
-                f"Session: {guest_user.session_id}, "
-                f"Expires At: {expires_at}"
+            logger.opt(lazy=True).debug(
+                "Made expiration timezone-aware - Session: {}, Expires At: {}",
+                lambda: guest_user.session_id,
+                lambda: expires_at,
             )
 
         # Check expiration
         if current_time > expires_at:
             logger.info(
-                f"Session expired - "
-                f"Session: {guest_user.session_id}, "
-                f"Current Time: {current_time}, "
-                f"Expired At: {expires_at}"
+                "Session expired - Session: {}, Current Time: {}, Expired At: {}",
+                guest_user.session_id,
+                current_time,
+                expires_at,
             )
             return False
 
         # Check message limit
         if guest_user.current_cycle_message_count >= self.MAX_MESSAGES_PER_SESSION:
             logger.info(
-                f"Message limit reached - "
-                f"Session: {guest_user.session_id}, "
-                f"Current Count: {guest_user.current_cycle_message_count}, "
-                f"Limit: {self.MAX_MESSAGES_PER_SESSION}"
+                "Message limit reached - Session: {}, Current Count: {}, Limit: {}",
+                guest_user.session_id,
+                guest_user.current_cycle_message_count,
+                self.MAX_MESSAGES_PER_SESSION,
             )
             return False
 
-        # Log successful validation
-        logger.info(
-            f"Session validated successfully - "
-            f"Session: {guest_user.session_id}, "
-            f"Expires In: {expires_at - current_time}, "
-            f"Messages Remaining: {self.MAX_MESSAGES_PER_SESSION - guest_user.current_cycle_message_count}"
-        )
         return True
 
     def cleanup_expired_sessions(self):
@@ -185,40 +210,35 @@ class GuestSessionManager:
         current_time = datetime.now(timezone.utc)
         logger.info("Starting cleanup of expired guest sessions")
 
-        expired_users = User.objects(is_guest=True, session_expires_at__lt=current_time)
-        expired_count = expired_users.count()
-        logger.info(f"Found {expired_count} expired sessions to clean up")
-
-        success_count = 0
-        error_count = 0
+        expired_ids = list(
+            User.objects(is_guest=True, session_expires_at__lt=current_time).scalar(
+                "id"
+            )
+        )
+        if not expired_ids:
+            logger.info("No expired guest sessions to clean up")
+            return
 
-        for user in expired_users:
-            try:
-                logger.debug(f"Cleaning up session: {user.session_id}")
-                chat_count = Chat.objects(user=user).count()
-                Chat.objects(user=user).delete()
-                user.delete()
-                success_count += 1
-                logger.info(
-                    f"Cleaned up session successfully - "
-                    f"Session: {user.session_id}, "
-                    f"Chats Removed: {chat_count}"
-                )
-            except Exception as e:
-                error_count += 1
-                logger.error(
-                    f"Failed to cleanup session - "
-                    f"Session: {user.session_id}, "
-                    f"Error: {str(e)}",
-                    exc_info=True,
-                )
+        logger.info("Found {} expired sessions to clean up", len(expired_ids))
 
-        logger.info(
-            f"Cleanup completed - "
-            f"Total: {expired_count}, "
-            f"Successful: {success_count}, "
-            f"Failed: {error_count}"
-        )
+        try:
+            # Two bulk deletes instead of a count and two deletes per session
+            deleted_chats = Chat.objects(user__in=expired_ids).delete()
+            deleted_users = User.objects(id__in=expired_ids).delete()
+            logger.info(
+                "Cleanup completed - "
+                "Total: {}, Sessions Removed: {}, Chats Removed: {}",
+                len(expired_ids),
+                deleted_users,
+                deleted_chats,
+            )
+        except Exception as e:
+            logger.error(
+                "Failed to cleanup expired sessions - Total: {}, Error: {}",
+                len(expired_ids),
+                e,
+                exc_info=True,
+            )
 
 
 class GuestService:
@@ -229,34 +249,44 @@ class GuestService:
     @staticmethod
     def get_organization_indices_for_guest() -> List[Dict]:
         """Get all organization indices accessible to guest users"""
+        with _guest_indices_lock:
+            cached = _guest_indices_cache.get("indices")
+        if cached is not None:
+            return cached
+
         logger.debug("Fetching organization indices for guest session")
-        indices = []
 
         try:
-            organizations = Organization.objects()
-            logger.debug(f"Found {len(organizations)} total organizations")
-
-            for org in organizations:
-                if org.index_name:
-                    indices.append(
-                        {
-                            "display_name": org.name,
-                            "visibility_options_for_user": ["public"],
-                            "name": org.index_name,
-                            "role_of_current_user": "viewer",
-                        }
-                    )
+            # Only the two fields read below are fetched; orgs without an index are
+            # filtered out by the query itself
+            organizations = (
+                Organization.objects(index_name__nin=[None, ""])
+                .only("name", "index_name")
+                .as_pymongo()
+            )
+            indices = [
+                {
+                    "display_name": org["name"],
+                    "visibility_options_for_user": ["public"],
+                    "name": org["index_name"],
+                    "role_of_current_user": "viewer",
+                }
+                for org in organizations
+            ]
 
             logger.info(
-                f"Retrieved organization indices for guest session - "
-                f"Total Organizations: {len(organizations)}, "
-                f"Accessible Indices: {len(indices)}"
+                "Retrieved organization indices for guest session - "
+                "Accessible Indices: {}",
+                len(indices),
             )
+            with _guest_indices_lock:
+                _guest_indices_cache["indices"] = indices
             return indices
 
         except Exception as e:
             logger.error(
-                f"Failed to fetch organization indices for guest - " f"Error: {str(e)}",
+                "Failed to fetch organization indices for guest - Error: {}",
+                e,
                 exc_info=True,
             )
             return []
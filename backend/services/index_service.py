@@ -142,17 +142,19 @@ class IndexService:
                 raise ValueError(error_message)
 
             # Generate archive name
-            timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
-            archive_name = f"archived_{index_name}_{timestamp}"
+            archived_at = datetime.now(timezone.utc)
+            archive_name = f"archived_{index_name}_{archived_at:%Y%m%d_%H%M%S}"
 
             # Update index registry
             index.update(
                 is_archived=True,
-                archived_at=datetime.now(timezone.utc),
+                archived_at=archived_at,
                 archived_name=archive_name,
             )
 
-            # Make index read-only and clone it
+            # Make index read-only and clone it. The clone API rejects sources that
+            # are not write-blocked, so the put_settings call cannot be folded into
+            # the clone request; the clone body only fixes the target's blocks.
             if isinstance(self._index_ops, VectorStore):
                 self._index_ops.client.indices.put_settings(
                     index=index_name,
@@ -210,7 +212,11 @@ class VectorStoreAdapter(IndexOperations):
         self.vector_store = vector_store
 
     def create_index(self, index_name: str) -> None:
-        self.vector_store.create_index(self.vector_store.client, index_name)
+        self.vector_store.create_index(
+            self.vector_store.client,
+            index_name,
+            index_options=self.vector_store.index_options,
+        )
 
     def delete_index(self, index_name: str) -> None:
         self.vector_store.client.indices.delete(index=index_name, ignore=[404])
@@ -1,12 +1,126 @@
-from typing import Optional, Any, Union, Iterator, AsyncIterator, List, Dict
+import asyncio
+import hashlib
+from threading import Lock
+from typing import (
+    Optional,
+    Any,
+    Union,
+    Iterator,
+    AsyncIterator,
+    List,
+    Dict,
+    Hashable,
+    Tuple,
+    Callable,
+)
+from project_types.error_types import ProviderError
 from project_types.llm_provider import (
     LLMProvider,
     ProviderResponse,
     Message,
     MessageContent,
 )
+from utils.cache import TTLCache
 from utils.types import NotGiven, NOT_GIVEN
 
+# System blocks shorter than this are too small for a provider to cache; it is a
+# character count, so it stays below the providers' token minimums
+PROMPT_CACHE_MIN_CHARS = 1024
+# Most cache_control breakpoints Anthropic accepts in a single request
+MAX_CACHE_CONTROL_BLOCKS = 4
+EPHEMERAL_CACHE_CONTROL = {"type": "ephemeral"}
+# Prepared system messages hold their prompt text, so prompts longer than this
+# (e.g. whole documents passed for contextualization) are built uncached
+SYSTEM_MESSAGE_CACHE_MAX_CHARS = 32_768
+# Default cap on concurrent provider calls made by LLM.ainvoke_many
+DEFAULT_BATCH_CONCURRENCY = 8
+# Upper bounds, in estimated tokens, of the size bins batched requests are
+# grouped into, so each provider batch holds requests of similar length
+BATCH_BIN_BOUNDARIES = (128, 512, 2048, 8192)
+
+# Optional generation parameters forwarded to the provider when given
+GENERATE_PARAMS = (
+    "frequency_penalty",
+    "function_call",
+    "functions",
+    "logit_bias",
+    "max_tokens",
+    "n",
+    "presence_penalty",
+    "response_format",
+    "seed",
+    "stop",
+    "temperature",
+    "tool_choice",
+    "tools",
+    "top_p",
+    "user",
+)
+
+
+async def _coalesce(chunks: AsyncIterator[str], max_wait: float) -> AsyncIterator[str]:
+    """
+    Re-chunk a stream: after each chunk, also take the chunks that arrive within
+    max_wait seconds and yield them joined, so bursts become a single write.
+    """
+    iterator = chunks.__aiter__()
+    pending: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            try:
+                buffer = [await pending]
+            except StopAsyncIteration:
+                return
+            # The next read stays pending across the yield rather than being
+            # cancelled, which would close the provider's stream
+            pending = asyncio.ensure_future(iterator.__anext__())
+            while True:
+                done, _ = await asyncio.wait({pending}, timeout=max_wait)
+                if not done:
+                    break
+                try:
+                    buffer.append(pending.result())
+                except StopAsyncIteration:
+                    pending = None
+                    yield "".join(buffer)
+                    return
+                except Exception:
+                    # Deliver the chunks that arrived before the error first
+                    pending = None
+                    yield "".join(buffer)
+                    raise
+                pending = asyncio.ensure_future(iterator.__anext__())
+            yield "".join(buffer)
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+def _text_digest(text: str) -> Tuple[int, str]:
+    """Compact stand-in for a prompt text in cache keys."""
+    return len(text), hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _estimated_size(messages: List[Message]) -> int:
+    """Rough token count of the latest message, used to bin batched requests."""
+    if not messages:
+        return 0
+    content = messages[-1]["content"]
+    if isinstance(content, str):
+        return len(content) // 4
+    return sum(len(block.get("text", "")) for block in content) // 4
+
+
+def _given_params(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """The generation parameters in arguments that were actually passed."""
+    return {
+        name: arguments[name]
+        for name in GENERATE_PARAMS
+        if arguments[name] is not NOT_GIVEN
+    }
+
 
 class LLM:
     """
@@ -48,23 +162,95 @@ class LLM:
         """
         self.provider = provider
         self.system_prompts = system_prompts
+        # Prepared system messages by prompt content; callers share the cached
+        # message, so it must not be mutated
+        self._system_message_cache = TTLCache(maxsize=128)
+        self._system_message_lock = Lock()
+
+    @staticmethod
+    def _system_prompts_key(
+        prompts: Union[str, List[Dict[str, Any]]], auto_cache: bool
+    ) -> Optional[Hashable]:
+        """
+        Hashable digest of the prompts, or None if they are too long to memoize
+        or a block cannot be hashed. Texts are keyed by length and SHA-1 rather
+        than by content.
+        """
+        if isinstance(prompts, str):
+            if len(prompts) > SYSTEM_MESSAGE_CACHE_MAX_CHARS:
+                return None
+            return (auto_cache, _text_digest(prompts))
+        if (
+            sum(len(block.get("text", "")) for block in prompts)
+            > SYSTEM_MESSAGE_CACHE_MAX_CHARS
+        ):
+            return None
+
+        def block_item(k: str, v: Any) -> Tuple[str, Any]:
+            if k == "text" and isinstance(v, str):
+                return k, _text_digest(v)
+            return k, tuple(sorted(v.items())) if isinstance(v, dict) else v
+
+        try:
+            key = (
+                auto_cache,
+                tuple(
+                    tuple(sorted(block_item(k, v) for k, v in block.items()))
+                    for block in prompts
+                ),
+            )
+            hash(key)
+        except TypeError:
+            return None
+        return key
 
     def _prepare_system_message(
-        self, system_prompts: Union[str, List[Dict[str, Any]], None] = None
+        self,
+        system_prompts: Union[str, List[Dict[str, Any]], None] = None,
+        auto_cache: bool = True,
     ) -> Message:
         """
-        Prepare system message from prompts.
+        Prepare system message from prompts. Messages are memoized by a digest of
+        the prompt content, so repeated prompts return the same (shared) message.
+        Prompts longer than SYSTEM_MESSAGE_CACHE_MAX_CHARS are not memoized.
+
+        For providers with prompt caching, the last large text block is marked
+        ephemeral (unless the caller already marked it or used every allowed
+        breakpoint), so its prefix is not prefilled again on the next call.
 
         Args:
             system_prompts: Custom system prompt(s) or None to use default.
+            auto_cache: Whether to add cache_control to the last large text block.
 
         Returns:
             Message: Formatted system message
         """
         prompts = system_prompts if system_prompts is not None else self.system_prompts
+        auto_cache = auto_cache and getattr(
+            self.provider, "supports_prompt_cache", False
+        )
+
+        key = self._system_prompts_key(prompts, auto_cache)
+        if key is not None:
+            with self._system_message_lock:
+                cached = self._system_message_cache.get(key)
+            if cached is not None:
+                return cached
 
+        message = self._build_system_message(prompts, auto_cache)
+        if key is not None:
+            with self._system_message_lock:
+                self._system_message_cache[key] = message
+        return message
+
+    def _build_system_message(
+        self, prompts: Union[str, List[Dict[str, Any]]], auto_cache: bool
+    ) -> Message:
+        """Format prompts as a system message, adding a cache breakpoint if asked."""
         if isinstance(prompts, str):
-            return {"role": "system", "content": prompts}
+            if not auto_cache or len(prompts) <= PROMPT_CACHE_MIN_CHARS:
+                return {"role": "system", "content": prompts}
+            prompts = [{"type": "text", "text": prompts}]
 
         # Convert list of content blocks to MessageContent format
         content_blocks: List[MessageContent] = []
@@ -79,8 +265,59 @@ class LLM:
                 content_block["cache_control"] = block["cache_control"]
             content_blocks.append(content_block)
 
+        if auto_cache:
+            self._add_cache_breakpoint(content_blocks)
+
         return {"role": "system", "content": content_blocks}
 
+    @staticmethod
+    def _add_cache_breakpoint(content_blocks: List[MessageContent]) -> None:
+        """Mark the last text block large enough to cache as ephemeral, in place."""
+        if (
+            sum(1 for block in content_blocks if block.get("cache_control"))
+            >= MAX_CACHE_CONTROL_BLOCKS
+        ):
+            return
+        for block in reversed(content_blocks):
+            if block["type"] == "text" and len(block["text"]) > PROMPT_CACHE_MIN_CHARS:
+                block.setdefault("cache_control", dict(EPHEMERAL_CACHE_CONTROL))
+                return
+
+    def _with_system_message(
+        self,
+        messages: List[Message],
+        system_prompts: Union[str, List[Dict[str, Any]], None],
+    ) -> List[Message]:
+        """
+        Prepend the call's system message if it brings system prompts.
+        Providers read the messages more than once, so a new list is built
+        (the caller's list is left untouched).
+        """
+        if system_prompts is None:
+            return messages
+        return [self._prepare_system_message(system_prompts), *messages]
+
+    def _dispatch(
+        self,
+        generate: Callable[..., Any],
+        messages: List[Message],
+        model_id: str,
+        stream: bool,
+        system_prompts: Union[str, List[Dict[str, Any]], None],
+        params: Dict[str, Any],
+    ) -> Any:
+        """
+        Shared body of invoke and ainvoke: call the provider's generate or
+        agenerate with the system message prepended. For agenerate the
+        returned coroutine is awaited by the caller.
+        """
+        return generate(
+            messages=self._with_system_message(messages, system_prompts),
+            model_id=model_id,
+            stream=stream,
+            **params,
+        )
+
     def invoke(
         self,
         messages: List[Message],
@@ -144,29 +381,14 @@ class LLM:
             Union[ProviderResponse, Iterator[str]]: Either a ProviderResponse for non-streaming
             requests or an iterator of string chunks for streaming requests.
         """
-        # Prepend system message if system prompts are provided
-        if system_prompts is not None:
-            messages = [self._prepare_system_message(system_prompts)] + messages
-
-        return self.provider.generate(
-            messages=messages,
-            model_id=model_id,
-            stream=stream,
-            frequency_penalty=frequency_penalty,
-            function_call=function_call,
-            functions=functions,
-            logit_bias=logit_bias,
-            max_tokens=max_tokens,
-            n=n,
-            presence_penalty=presence_penalty,
-            response_format=response_format,
-            seed=seed,
-            stop=stop,
-            temperature=temperature,
-            tool_choice=tool_choice,
-            tools=tools,
-            top_p=top_p,
-            user=user,
+        # Only forward the parameters the caller set, so providers get no sentinels
+        return self._dispatch(
+            self.provider.generate,
+            messages,
+            model_id,
+            stream,
+            system_prompts,
+            _given_params(locals()),
         )
 
     async def ainvoke(
@@ -190,69 +412,115 @@ class LLM:
         tools: list[Any] | NotGiven = NOT_GIVEN,
         top_p: Optional[float] | NotGiven = NOT_GIVEN,
         user: str | NotGiven = NOT_GIVEN,
+        coalesce_ms: Optional[float] = None,
     ) -> Union[ProviderResponse, AsyncIterator[str]]:
         """
         Asynchronously invoke the language model with a given list of messages.
 
-        Args:
-            messages (List[Message]): List of messages to send to the model.
-            model_id (str): The identifier for the model to use.
-            stream (bool, optional): Whether to stream the response. Defaults to False.
-            system_prompts (Union[str, List[Dict[str, Any]]], optional): Custom system prompt(s).
-                Can be a simple string or a list of message blocks with optional cache_control.
-                For Anthropic, use message blocks to enable caching of large content:
-                [
-                    {
-                        "type": "text",
-                        "text": "You are a helpful assistant.",
-                    },
-                    {
-                        "type": "text",
-                        "text": "<large document content>",
-                        "cache_control": {"type": "ephemeral"}
-                    }
-                ]
-            frequency_penalty (Optional[float], optional): Penalty for token frequency.
-            function_call (Any, optional): Function calling configuration.
-            functions (list[Any], optional): Available functions.
-            logit_bias (Optional[dict[str, int]], optional): Token biases.
-            max_tokens (Optional[int], optional): Maximum tokens to generate.
-            n (Optional[int], optional): Number of completions.
-            presence_penalty (Optional[float], optional): Penalty for token presence.
-            response_format (Any, optional): Format specification for the response.
-            seed (Optional[int], optional): Random seed.
-            stop (Union[Optional[str], list[str]], optional): Stop sequences.
-            temperature (Optional[float], optional): Sampling temperature.
-            tool_choice (Any, optional): Tool selection configuration.
-            tools (list[Any], optional): Available tools.
-            top_p (Optional[float], optional): Nucleus sampling parameter.
-            user (str, optional): User identifier.
+        Takes the same arguments as invoke, plus:
+            coalesce_ms (Optional[float], optional): When streaming, join chunks that
+                arrive within this many milliseconds of each other into one. 0 joins
+                only chunks that are already available. None (default) disables it.
 
         Returns:
             Union[ProviderResponse, AsyncIterator[str]]: Either a ProviderResponse for non-streaming
             requests or an async iterator of string chunks for streaming requests.
         """
-        # Prepend system message if system prompts are provided
-        if system_prompts is not None:
-            messages = [self._prepare_system_message(system_prompts)] + messages
+        response = await self._dispatch(
+            self.provider.agenerate,
+            messages,
+            model_id,
+            stream,
+            system_prompts,
+            _given_params(locals()),
+        )
+        if stream and coalesce_ms is not None:
+            return _coalesce(response, coalesce_ms / 1000)
+        return response
 
-        return await self.provider.agenerate(
-            messages=messages,
-            model_id=model_id,
-            stream=stream,
-            frequency_penalty=frequency_penalty,
-            function_call=function_call,
-            functions=functions,
-            logit_bias=logit_bias,
-            max_tokens=max_tokens,
-            n=n,
-            presence_penalty=presence_penalty,
-            response_format=response_format,
-            seed=seed,
-            stop=stop,
-            temperature=temperature,
-            tool_choice=tool_choice,
-            tools=tools,
-            top_p=top_p,
-            user=user,
+    async def ainvoke_many(
+        self,
+        batch: List[Tuple[List[Message], str]],
+        system_prompts: Union[str, List[Dict[str, Any]], None] = None,
+        max_concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+        **kwargs: Any,
+    ) -> List[ProviderResponse]:
+        """
+        Asynchronously invoke the language model for several requests at once.
+
+        Providers exposing abatch_generate(requests, **kwargs) receive the batch
+        split by estimated request size (see BATCH_BIN_BOUNDARIES), one call per
+        size bin, letting them batch server-side. Otherwise the requests are sent
+        as individual calls, at most max_concurrency at a time.
+
+        Args:
+            batch (List[Tuple[List[Message], str]]): (messages, model_id) pairs.
+            system_prompts (Union[str, List[Dict[str, Any]]], optional): System
+                prompt(s) shared by every request, as for ainvoke.
+            max_concurrency (int, optional): Most individual calls in flight when
+                the provider has no batch API.
+            **kwargs: Generation parameters shared by every request, as for
+                ainvoke. Streaming is not supported.
+
+        Returns:
+            List[ProviderResponse]: Responses in the order of the batch.
+
+        Raises:
+            ProviderError: If abatch_generate returns a different number of
+                responses than it was given requests.
+        """
+        if kwargs.get("stream"):
+            raise ValueError("ainvoke_many does not support streaming")
+        kwargs.pop("stream", None)
+
+        batch_generate = getattr(self.provider, "abatch_generate", None)
+        if batch_generate is not None:
+            params = {
+                name: value for name, value in kwargs.items() if value is not NOT_GIVEN
+            }
+            # A batch runs as long as its longest request, so requests of similar
+            # size are batched together and the bins are dispatched concurrently
+            bins: Dict[int, List[int]] = {}
+            for position, (messages, _) in enumerate(batch):
+                size = _estimated_size(messages)
+                bin_index = sum(size > bound for bound in BATCH_BIN_BOUNDARIES)
+                bins.setdefault(bin_index, []).append(position)
+
+            async def generate_bin(positions: List[int]):
+                requests = [
+                    (
+                        self._with_system_message(batch[i][0], system_prompts),
+                        batch[i][1],
+                    )
+                    for i in positions
+                ]
+                responses = await batch_generate(requests, **params)
+                if len(responses) != len(requests):
+                    raise ProviderError(
+                        f"abatch_generate returned {len(responses)} responses "
+                        f"for {len(requests)} requests"
+                    )
+                return responses
+
+            results = await asyncio.gather(
+                *(generate_bin(positions) for positions in bins.values())
+            )
+            responses: List[ProviderResponse] = [None] * len(batch)
+            for positions, bin_responses in zip(bins.values(), results):
+                for i, response in zip(positions, bin_responses):
+                    responses[i] = response
+            return responses
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def invoke_one(messages: List[Message], model_id: str):
+            async with semaphore:
+                return await self.ainvoke(
+                    messages, model_id, system_prompts=system_prompts, **kwargs
+                )
+
+        return list(
+            await asyncio.gather(
+                *(invoke_one(messages, model_id) for messages, model_id in batch)
+            )
         )
@@ -1,86 +1,183 @@
 import os
-import time
+import random
+import threading
+from typing import Optional
 from loguru import logger
-from pymongo.errors import ServerSelectionTimeoutError
+from pymongo.errors import ConfigurationError, ServerSelectionTimeoutError
 from flask_mongoengine import MongoEngine
 from mongoengine import disconnect_all
 
 
+# Set once the server has answered a ping; backs the readiness probe
+db_ready = threading.Event()
+
+# Client-wide: bounds how long any request blocks while MongoDB is unreachable
+SERVER_SELECTION_TIMEOUT_MS = 30000
+
+# Upper bound on the pause between pings that fail for reasons other than a
+# timeout (e.g. authentication)
+MAX_RETRY_DELAY = 60
+
+
+class _ServerWait:
+    """A background wait for MongoDB, started by one connect_db call."""
+
+    def __init__(self):
+        self.stopped = threading.Event()  # Set to end the wait early
+        self.done = threading.Event()  # Set once the wait has ended
+        self.error: Optional[Exception] = None  # Why the wait gave up, if it did
+        self.thread: Optional[threading.Thread] = None
+
+    def stop(self) -> None:
+        """Ask the ping thread to exit after its current attempt."""
+        self.stopped.set()
+
+
+# Wait of the latest connect_db call; replaced (and stopped) on reconnect
+_server_wait: Optional[_ServerWait] = None
+
+
+def is_db_ready() -> bool:
+    """Whether MongoDB has been reached since startup."""
+    return db_ready.is_set()
+
+
+def _wait_for_server(
+    app, db: MongoEngine, host: str, retry_delay: float, wait: _ServerWait
+) -> None:
+    """
+    Ping MongoDB until it answers, then mark the database as ready.
+
+    Timeouts are retried straight away, since each ping already waited for
+    a server. Other errors are retried with jittered exponential backoff.
+    An invalid configuration ends the wait and is stored on it for
+    connect_db to raise; so does being stopped by a later connect_db call.
+    """
+    attempt = 0
+    try:
+        while not wait.stopped.is_set():
+            attempt += 1
+            try:
+                # Each ping waits up to serverSelectionTimeoutMS for a server;
+                # the loop keeps the startup wait going past that
+                with app.app_context():
+                    db.get_db().command("ping")
+                # A replaced wait must not vouch for the new connection
+                if not wait.stopped.is_set():
+                    db_ready.set()
+                    logger.info("MongoDB connected successfully")
+                return
+            except ServerSelectionTimeoutError as e:
+                logger.opt(lazy=True).error(
+                    "MongoDB not reachable yet: {}. "
+                    "Connection details: Host={}, Timeout={}ms",
+                    lambda: e,
+                    lambda: host,
+                    lambda: app.config["MONGODB_SETTINGS"]["serverSelectionTimeoutMS"],
+                )
+            except ConfigurationError as e:
+                logger.error("Invalid MongoDB configuration, giving up: {}", e)
+                wait.error = e
+                return
+            except Exception as e:
+                delay = min(retry_delay * 2 ** (attempt - 1), MAX_RETRY_DELAY)
+                delay *= 0.5 + random.random()
+                logger.error(
+                    "Error while pinging MongoDB (attempt {}), retrying in {:.1f}s: {}",
+                    attempt,
+                    delay,
+                    e,
+                )
+                wait.stopped.wait(delay)
+    finally:
+        wait.done.set()
+
+
 def connect_db(app, db: MongoEngine, max_retries=5, retry_delay=10):
     """
-    Initialize MongoDB connection with retry logic.
+    Initialize MongoDB connection and wait for the server.
+
+    The connection is registered immediately; a daemon thread then pings the
+    server until it answers and sets db_ready. The ping thread of a previous
+    call is stopped first. The runtime server selection timeout stays short
+    so requests made during an outage fail quickly.
+
+    By default startup blocks until the server answers and fails fast
+    otherwise. With MONGO_CONNECT_IN_BACKGROUND set, it returns right away
+    and the readiness probe (/api/readyz) keeps traffic off the instance
+    until db_ready is set.
 
     Args:
         app: Flask application instance
         db: MongoEngine instance
-        max_retries: Maximum number of connection attempts
-        retry_delay: Delay between retries in seconds
+        max_retries: Number of retry_delay periods to wait for the server
+        retry_delay: Seconds per retry period, and the initial backoff
 
     Raises:
-        ServerSelectionTimeoutError: If connection fails after max retries
+        ConfigurationError: If the connection settings are invalid
+        ServerSelectionTimeoutError: If the server did not answer within
+            max_retries * retry_delay seconds when connecting in the foreground
     """
-    # Always disconnect existing connections first
+    global _server_wait
+
+    # Always disconnect existing connections first, and stop pinging them
+    if _server_wait is not None:
+        _server_wait.stop()
     disconnect_all()
+    db_ready.clear()
 
     mongodb_uri = os.environ.get("MONGODB_URI", "mongodb://mongo:27017/documents")
-    logger.info(
-        f"Attempting to connect to MongoDB at: {mongodb_uri.split('@')[-1]}"
-    )  # Log only the host part, not credentials
+    # Only the host part is logged, never the credentials
+    host = mongodb_uri.rsplit("@", 1)[-1]
+    logger.info("Attempting to connect to MongoDB at: {}", host)
 
-    # Configure MongoDB settings with increased timeouts for cloud connections
+    # Configure MongoDB settings with increased timeouts for cloud connections.
+    # Pool bounds and write concern come from the config (see BaseConfig).
     app.config["MONGODB_SETTINGS"] = {
         "host": mongodb_uri,
         "connect": False,  # Defer connection until init_app
-        "serverSelectionTimeoutMS": 30000,  # 30 second timeout
+        "serverSelectionTimeoutMS": SERVER_SELECTION_TIMEOUT_MS,
         "connectTimeoutMS": 30000,
         "socketTimeoutMS": 30000,
-        "maxPoolSize": 100,
-        "minPoolSize": 10,
+        "maxPoolSize": app.config.get("MONGO_MAX_POOL", 100),
+        "minPoolSize": app.config.get("MONGO_MIN_POOL", 0),
         "retryWrites": True,
         "retryReads": True,
-        "w": "majority",  # Write concern for better reliability
     }
+    write_concern = app.config.get("MONGO_WRITE_CONCERN")
+    if write_concern:
+        app.config["MONGODB_SETTINGS"]["w"] = (
+            int(write_concern) if write_concern.isdigit() else write_concern
+        )
 
-    retries = 0
-    while retries < max_retries:
-        try:
-            db.init_app(app)
-            # Test the connection
-            with app.app_context():
-                db.get_db()
-            logger.info("MongoDB connected successfully")
-            return
-        except ServerSelectionTimeoutError as e:
-            retries += 1
-            logger.warning(
-                f"Attempt {retries}/{max_retries}: MongoDB connection failed with error: {e}. "
-                f"Retrying in {retry_delay} seconds...\n"
-                f"Connection details: Host={mongodb_uri.split('@')[-1]}, "
-                f"Timeout={app.config['MONGODB_SETTINGS']['serverSelectionTimeoutMS']}ms"
-            )
-            time.sleep(retry_delay)
-            # Ensure clean state before retry
-            disconnect_all()
-        except ValueError as e:
-            if "Extension already initialized" in str(e):
-                logger.warning("MongoEngine extension already initialized")
-                return
-            logger.error(f"ValueError during MongoDB connection: {e}")
+    try:
+        db.init_app(app)
+    except ConfigurationError as e:
+        logger.error("Invalid MongoDB configuration: {}", e)
+        raise
+    except ValueError as e:
+        if "Extension already initialized" not in str(e):
+            logger.error("ValueError during MongoDB connection: {}", e)
             raise
-        except Exception as e:
-            retries += 1
-            logger.error(
-                f"Attempt {retries}/{max_retries}: Unexpected error during MongoDB connection: {str(e)}. "
-                f"Error type: {type(e).__name__}. Retrying in {retry_delay} seconds..."
-            )
-            time.sleep(retry_delay)
-            # Ensure clean state before retry
-            disconnect_all()
-
-    error_msg = (
-        f"MongoDB connection failed after {max_retries} attempts. "
-        f"Last known connection details: Host={mongodb_uri.split('@')[-1]}, "
-        f"Timeout={app.config['MONGODB_SETTINGS']['serverSelectionTimeoutMS']}ms"
+        logger.warning("MongoEngine extension already initialized")
+
+    wait = _server_wait = _ServerWait()
+    wait.thread = threading.Thread(
+        target=_wait_for_server,
+        args=(app, db, host, retry_delay, wait),
+        name="mongodb-ping",
+        daemon=True,
     )
-    logger.error(error_msg)
-    raise ServerSelectionTimeoutError(error_msg)
+    wait.thread.start()
+
+    if app.config.get("MONGO_CONNECT_IN_BACKGROUND", False):
+        return
+
+    if not wait.done.wait(max_retries * retry_delay):
+        wait.stop()
+        logger.error("Failed to connect to MongoDB at {}", host)
+        raise ServerSelectionTimeoutError(
+            f"MongoDB at {host} did not answer within {max_retries * retry_delay}s"
+        )
+    if wait.error is not None:
+        raise wait.error
@@ -763,10 +763,14 @@ class OrganizationService:
     # Access control methods
     def is_admin(self, user: User, organization: Organization) -> bool:
         """Check if user is an admin of the organization."""
-        user_org = UserOrganization.objects(
-            user=user.id, organization=organization.id, role="admin"
-        ).first()
-        return bool(user_org)
+        return (
+            UserOrganization.objects(
+                user=user.id, organization=organization.id, role="admin"
+            )
+            .only("id")
+            .first()
+            is not None
+        )
 
     def has_access(self, user: User, organization: Union[Organization, str]) -> bool:
         """
@@ -785,10 +789,12 @@ class OrganizationService:
         if isinstance(organization, str):
             organization = self._get_organization(organization)
 
-        user_org = UserOrganization.objects(
-            user=user.id, organization=organization.id
-        ).first()
-        return bool(user_org)
+        return (
+            UserOrganization.objects(user=user.id, organization=organization.id)
+            .only("id")
+            .first()
+            is not None
+        )
 
     def verify_password(self, organization_id: str, password: str) -> bool:
         """
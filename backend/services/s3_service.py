@@ -3,13 +3,17 @@ import urllib
 import uuid
 
 import boto3
+from boto3.s3.transfer import TransferConfig
 from flask import current_app
 from flask import jsonify
 from loguru import logger
 from ratelimit import limits, sleep_and_retry
 from utils.error_handlers import log_error
 
-# Initialize S3 client
+# Multipart settings for streamed uploads
+STREAM_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024, use_threads=True
+)
 
 
 class S3Service:
@@ -181,6 +185,49 @@ class S3Service:
             logger.error(error_message)
             return None
 
+    def upload_fileobj_to_s3(self, fileobj, filename, bucket_name=None):
+        """
+        Stream a file-like object to Amazon S3 without staging it on disk.
+
+        Large payloads are sent as a multipart upload. Like upload_file_to_s3, the
+        object is stored under a unique key.
+
+        Args:
+            fileobj: A readable binary file-like object.
+            filename (str): The name to be used for the file in S3.
+            bucket_name (str, optional): The name of the S3 bucket. If None, uses the default bucket from environment variables.
+
+        Returns:
+            str or None: The URL of the uploaded file in S3 if successful, None if an error occurs.
+        """
+        try:
+            if not bucket_name:
+                bucket_name = os.getenv("AWS_S3_BUCKET_NAME")
+
+            aws_region = os.getenv("AWS_REGION")
+
+            logger.info(f"Streaming upload with filename: {filename}")
+
+            if not bucket_name or not aws_region:
+                raise ValueError(
+                    "AWS_S3_BUCKET_NAME or AWS_REGION environment variable is not set"
+                )
+
+            s3_key = f"{uuid.uuid4()}-{filename}"
+            self.s3_client.upload_fileobj(
+                fileobj, bucket_name, s3_key, Config=STREAM_TRANSFER_CONFIG
+            )
+            file_url = f"https://{bucket_name}.s3.{aws_region}.amazonaws.com/{s3_key}"
+
+            logger.info(f"File uploaded to S3 with URL: {file_url}")
+
+            return file_url
+
+        except Exception as e:
+            error_message, stack_trace = log_error(e, "Error uploading file to S3")
+            logger.error(error_message)
+            return None
+
     @staticmethod
     def extract_s3_key(s3_url: str) -> str:
         """Extract the S3 key from a given S3 URL."""
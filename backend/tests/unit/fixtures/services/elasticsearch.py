@@ -24,7 +24,8 @@ def get_test_es_index() -> str:
 def mock_embedding_model():
     """Create a mock embedding model for testing VectorStore"""
     mock = MagicMock()
-    mock.embed.return_value = [[0.1, 0.2, 0.3]]  # Simple 3D vector for testing
+    # Simple 3D vector for testing, shaped like a Cohere embed response
+    mock.embed.return_value.embeddings = [[0.1, 0.2, 0.3]]
     return mock
 
 
@@ -32,7 +33,9 @@ def mock_embedding_model():
 def vector_store(mock_es_client, mock_embedding_model):
     """Create VectorStore instance with mocked dependencies"""
     return VectorStore(
-        client=mock_es_client, embedding_model=mock_embedding_model, dims=3
+        client=mock_es_client,
+        embeddings_providers={"cohere": mock_embedding_model},
+        dims=3,
     )
 
 
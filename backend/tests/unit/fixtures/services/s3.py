@@ -22,6 +22,9 @@ def mock_s3_service():
     mock.upload_file_to_s3.return_value = (
         "https://test-bucket.s3.amazonaws.com/test.pdf"
     )
+    mock.upload_fileobj_to_s3.return_value = (
+        "https://test-bucket.s3.amazonaws.com/test.pdf"
+    )
     mock.extract_s3_key.return_value = "test.pdf"
 
     # Configure multipart upload operations
@@ -39,6 +42,7 @@ def mock_s3_service():
     mock.s3_client = MagicMock()
     mock.s3_client.download_file = MagicMock()
     mock.s3_client.upload_file = MagicMock()
+    mock.s3_client.upload_fileobj = MagicMock()
     mock.s3_client.delete_object = MagicMock()
     mock.s3_client.head_object = MagicMock(
         return_value={
@@ -0,0 +1,117 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import MagicMock, Mock
+
+import numpy as np
+import pytest
+
+from services import document_ingestion_service
+from services.document_ingestion_service import (
+    MAX_SECTIONS_IN_FLIGHT,
+    DocumentProcessor,
+)
+
+DIMS = 4
+
+
+class _Sections:
+    """Processing strategy stub streaming `count` sections"""
+
+    def __init__(self, count: int):
+        self.count = count
+        self.produced = 0
+
+    async def process_document(self, **kwargs):
+        for i in range(self.count):
+            self.produced += 1
+            yield SimpleNamespace(
+                contextualized_segment_text=f"section {i}",
+                metadata=SimpleNamespace(as_dict=lambda: {}),
+            )
+
+
+class _SlowEmbeddings:
+    """Embedding strategy stub that records how many calls overlap"""
+
+    def __init__(self, error: Exception = None):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.error = error
+
+    async def embed_document(self, document):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.001)
+        self.in_flight -= 1
+        if self.error is not None:
+            raise self.error
+        return np.zeros(DIMS, dtype=np.float32)
+
+
+@pytest.fixture(autouse=True)
+def no_mongo(monkeypatch):
+    """Answer index and file metadata lookups without MongoDB"""
+    registry = Mock()
+    registry.objects.get.return_value = Mock(index_display_name="Index")
+    monkeypatch.setattr(document_ingestion_service, "IndexRegistry", registry)
+    record = Mock(return_value=["doc-id"])
+    monkeypatch.setattr(DocumentProcessor, "_record_file_metadata", record)
+    return record
+
+
+def _processor(sections: _Sections, embeddings: _SlowEmbeddings) -> DocumentProcessor:
+    return DocumentProcessor(
+        llm_providers={},
+        vector_store=MagicMock(),
+        dims=DIMS,
+        processing_strategy=sections,
+        embedding_strategy=embeddings,
+    )
+
+
+async def _ingest(processor: DocumentProcessor):
+    return await processor.ingest(
+        file_path="doc.pdf",
+        file_url="https://files.test/doc.pdf",
+        title="Doc",
+        thumbnail_urls=[],
+        index_names=["index"],
+        file_visibility="private",
+        originating_user_id="user",
+        filter_dimensions={},
+    )
+
+
+@pytest.mark.unit
+class TestIngest:
+    """Test suite for streaming sections into the vector store"""
+
+    async def test_sections_in_flight_are_bounded(self):
+        """Test that the section stream is not read ahead of the embedding limit"""
+        sections = _Sections(MAX_SECTIONS_IN_FLIGHT * 3)
+        embeddings = _SlowEmbeddings()
+        processor = _processor(sections, embeddings)
+        indexed = 0
+        max_unindexed = 0
+
+        def add_embedding(*args, **kwargs):
+            nonlocal indexed, max_unindexed
+            max_unindexed = max(max_unindexed, sections.produced - indexed)
+            indexed += 1
+
+        processor.vector_store.add_embedding.side_effect = add_embedding
+
+        result = await _ingest(processor)
+
+        assert result["doc_ids"] == ["doc-id"]
+        assert indexed == sections.count
+        assert embeddings.max_in_flight == MAX_SECTIONS_IN_FLIGHT
+        # One more section may be read while waiting for a free slot
+        assert max_unindexed <= MAX_SECTIONS_IN_FLIGHT + 1
+
+    async def test_section_error_fails_ingestion(self, no_mongo):
+        """Test that an error embedding a section is not lost"""
+        processor = _processor(_Sections(3), _SlowEmbeddings(RuntimeError("boom")))
+
+        assert await _ingest(processor) is None
+        no_mongo.assert_not_called()
@@ -0,0 +1,138 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+from services import document_processing_strategies
+from services.document_processing_strategies import (
+    TITLE_MAX_CONCURRENCY,
+    SegmentationStrategy,
+    VoyageDocumentStrategy,
+)
+
+PAGE_COUNT = TITLE_MAX_CONCURRENCY * 3
+
+
+class _TitleProvider:
+    """Title provider stub that titles a text after itself and counts calls"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, messages, model_id, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(0)
+        text = messages[-1]["content"].split("\n\n")[1]
+        return SimpleNamespace(content=f"Title: **{text}**", raw_response=None)
+
+
+@pytest.fixture
+def rendered(monkeypatch):
+    """Record the pages of every render call, rendering page n as 'image n'"""
+    calls = []
+
+    def render(file_path, target_width, target_height, pages):
+        calls.append(list(pages))
+        return [f"image {page}" for page in pages]
+
+    monkeypatch.setattr(
+        document_processing_strategies, "extract_and_process_pdf_pages", render
+    )
+    return calls
+
+
+def _llm_providers(titles: _TitleProvider) -> dict:
+    return {"hyperbolic": titles, "anthropic": MagicMock()}
+
+
+async def _process(strategy, llm_providers):
+    return strategy.process_document(
+        file_path="doc.pdf",
+        file_url="https://files.test/doc.pdf",
+        title="Doc",
+        filter_dimensions={},
+        nominal_creator_name="",
+        llm_providers=llm_providers,
+    )
+
+
+@pytest.mark.unit
+class TestVoyageDocumentStrategy:
+    """Test suite for streaming pages out of a document"""
+
+    async def test_first_page_is_yielded_before_later_pages_are_processed(
+        self, monkeypatch, rendered
+    ):
+        """Test that titles and images are produced a bounded window ahead"""
+        page_texts = [f"page {i}" for i in range(PAGE_COUNT)]
+        monkeypatch.setattr(
+            VoyageDocumentStrategy,
+            "_extract_page_texts",
+            staticmethod(lambda file_path: page_texts),
+        )
+        titles = _TitleProvider()
+        sections = await _process(VoyageDocumentStrategy(), _llm_providers(titles))
+
+        first = await anext(sections)
+
+        assert first.metadata.section_title == "page 0"
+        assert first.metadata.page_images == ["image 1"]
+        assert titles.calls <= TITLE_MAX_CONCURRENCY
+        assert rendered == [[1]]
+
+        rest = [section async for section in sections]
+        assert [section.metadata.section_title for section in rest] == page_texts[1:]
+        assert titles.calls == PAGE_COUNT
+        assert rendered == [[page] for page in range(1, PAGE_COUNT + 1)]
+
+    async def test_closing_early_cancels_title_requests(self, monkeypatch, rendered):
+        """Test that abandoning the stream doesn't leave title requests running"""
+        monkeypatch.setattr(
+            VoyageDocumentStrategy,
+            "_extract_page_texts",
+            staticmethod(lambda file_path: [f"page {i}" for i in range(PAGE_COUNT)]),
+        )
+        titles = _TitleProvider()
+        sections = await _process(VoyageDocumentStrategy(), _llm_providers(titles))
+
+        await anext(sections)
+        await sections.aclose()
+        await asyncio.sleep(0.01)
+
+        assert titles.calls <= TITLE_MAX_CONCURRENCY + 1
+
+
+@pytest.mark.unit
+class TestSegmentationStrategy:
+    """Test suite for streaming segmented sections out of a document"""
+
+    async def test_pages_are_rendered_per_section(self, monkeypatch, rendered):
+        """Test that each page is rendered once, when its first section is built"""
+        strategy = SegmentationStrategy(
+            treeseg_configs=None, embeddings_providers={"cohere": MagicMock()}
+        )
+        monkeypatch.setattr(
+            strategy, "_extract_text", lambda file_path: (["a", "b", "c"], [1, 2, 3])
+        )
+
+        async def segment_text(full_text, component_map):
+            return [
+                {"text": "first", "pages": [1, 2]},
+                {"text": "second", "pages": [2, 3]},
+                {"text": "third", "pages": [3]},
+            ]
+
+        monkeypatch.setattr(strategy, "_segment_text", segment_text)
+
+        sections = [section async for section in await _process(strategy, None)]
+
+        assert rendered == [[1, 2], [3], []]
+        assert [section.metadata.page_images for section in sections] == [
+            ["image 1", "image 2"],
+            ["image 2", "image 3"],
+            ["image 3"],
+        ]
+        assert [section.metadata.section_title for section in sections] == [
+            "Untitled Section"
+        ] * 3
@@ -1,3 +1,6 @@
+import threading
+
+import numpy as np
 import pytest
 from unittest.mock import Mock, patch
 from elasticsearch import exceptions as es_exceptions
@@ -12,6 +15,11 @@ from services.elasticsearch_service import (
 class TestElasticsearchClientCreation:
     """Test suite for Elasticsearch client creation functionality"""
 
+    @pytest.fixture(autouse=True)
+    def clear_shared_clients(self, monkeypatch):
+        """Start every test without previously created shared clients"""
+        monkeypatch.setattr("services.elasticsearch_service._clients", {})
+
     @patch(
         "services.elasticsearch_service.Elasticsearch"
     )  # Patch where the client is actually used
@@ -69,6 +77,64 @@ class TestElasticsearchClientCreation:
         assert client == mock_es_instance
         mock_sleep.assert_called()
 
+    @patch("services.elasticsearch_service.Elasticsearch")
+    @patch("time.sleep")
+    def test_client_creation_raises_after_retries(self, mock_sleep, mock_es_class):
+        """Test that exhausting the retries raises instead of returning None"""
+        mock_es_class.return_value.ping.return_value = False
+
+        with pytest.raises(es_exceptions.ConnectionError):
+            create_elasticsearch_client_with_retries(
+                host="test-host", port=9200, max_retries=2, retry_delay=0
+            )
+
+        assert mock_es_class.return_value.ping.call_count == 2
+        # A later call tries again rather than getting a cached failure
+        mock_es_class.return_value.ping.return_value = True
+        client = create_elasticsearch_client_with_retries(host="test-host", port=9200)
+        assert client is mock_es_class.return_value
+
+    @patch("services.elasticsearch_service.Elasticsearch")
+    def test_slow_connection_does_not_block_other_hosts(self, mock_es_class):
+        """Test that connecting to one host doesn't hold the shared client lock"""
+        connecting, release = threading.Event(), threading.Event()
+
+        def make_client(**config):
+            client = Mock()
+            if "slow-host" in config["hosts"][0]:
+                client.ping.side_effect = lambda: connecting.set() or release.wait(5)
+            else:
+                client.ping.return_value = True
+            return client
+
+        mock_es_class.side_effect = make_client
+        slow = threading.Thread(
+            target=create_elasticsearch_client_with_retries,
+            kwargs={"host": "slow-host", "port": 9200},
+        )
+        slow.start()
+        try:
+            assert connecting.wait(5)
+            client = create_elasticsearch_client_with_retries(
+                host="fast-host", port=9200
+            )
+            assert client.ping.called
+        finally:
+            release.set()
+            slow.join(5)
+
+    @patch("services.elasticsearch_service.Elasticsearch")
+    def test_client_reused_for_same_connection(self, mock_es_class):
+        """Test that the client is shared between calls with the same parameters"""
+        mock_es_class.return_value.ping.return_value = True
+
+        first = create_elasticsearch_client_with_retries(host="test-host", port=9200)
+        second = create_elasticsearch_client_with_retries(host="test-host", port=9200)
+
+        assert first is second
+        mock_es_class.assert_called_once()
+        assert mock_es_class.call_args[1]["connections_per_node"] == 25
+
 
 @pytest.mark.unit
 class TestVectorStore:
@@ -78,7 +144,9 @@ class TestVectorStore:
     def vector_store(self, mock_es_client, mock_embedding_model):
         """Create VectorStore instance with mocked dependencies"""
         return VectorStore(
-            client=mock_es_client, embedding_model=mock_embedding_model, dims=3
+            client=mock_es_client,
+            embeddings_providers={"cohere": mock_embedding_model},
+            dims=3,
         )
 
     def test_create_index(self, mock_es_client):
@@ -94,6 +162,8 @@ class TestVectorStore:
             "dense_vector"
             in create_args["body"]["mappings"]["properties"]["embedding"]["type"]
         )
+        embedding_mapping = create_args["body"]["mappings"]["properties"]["embedding"]
+        assert embedding_mapping["index_options"]["type"] == "int8_hnsw"
 
         # Test when index already exists
         mock_es_client.reset_mock()
@@ -130,9 +200,27 @@ class TestVectorStore:
         mock_es_client.index.assert_called_once()
         index_args = mock_es_client.index.call_args[1]
         assert index_args["index"] == "test_index"
-        assert index_args["document"]["embedding"] == embedding
+        # Embeddings are stored at unit length for dot_product similarity
+        norm = sum(x * x for x in embedding) ** 0.5
+        assert index_args["document"]["embedding"] == pytest.approx(
+            [x / norm for x in embedding]
+        )
         assert isinstance(index_args["document"]["metadata"]["filter_dimensions"], list)
 
+    def test_add_embedding_accepts_ndarray(self, vector_store, mock_es_client):
+        """Test that embedding strategies' float32 arrays are stored as plain floats"""
+        embedding = np.array([0.1, 0.2, 0.3], dtype=np.float32)
+
+        metadata = {"title": "test doc", "pages": [1], "filter_dimensions": {}}
+
+        vector_store.add_embedding(embedding, metadata, "test_index")
+
+        stored = mock_es_client.index.call_args[1]["document"]["embedding"]
+        assert isinstance(stored, list)
+        assert all(isinstance(x, float) for x in stored)
+        norm = float(np.linalg.norm(embedding))
+        assert stored == pytest.approx([float(x) / norm for x in embedding])
+
     def test_add_embeddings_bulk(self, vector_store, mock_es_client):
         """Test bulk embedding addition"""
         documents = [
@@ -152,23 +240,32 @@ class TestVectorStore:
             },
         ]
 
-        # Mock the elasticsearch.helpers.bulk function instead of client.bulk
+        indexed_actions = []
+
+        def fake_parallel_bulk(client, actions, **kwargs):
+            indexed_actions.extend(actions)
+            return [(True, {}) for _ in indexed_actions]
+
+        # Mock the elasticsearch.helpers.parallel_bulk function instead of client.bulk
         with patch(
-            "services.elasticsearch_service.bulk", return_value=(2, [])
+            "services.elasticsearch_service.parallel_bulk",
+            side_effect=fake_parallel_bulk,
         ) as mock_bulk:
             vector_store.add_embeddings_bulk(documents, "test_index")
 
-            # Verify bulk was called with correct arguments
+            # Verify parallel_bulk was called with correct arguments
             mock_bulk.assert_called_once()
 
-            # Verify the actions passed to bulk
             call_args = mock_bulk.call_args
             assert call_args[0][0] == mock_es_client  # First arg should be the client
-            actions = call_args[0][1]  # Second arg should be the actions list
-            assert len(actions) == 2  # Should have 2 documents
+            assert call_args[1]["chunk_size"] == vector_store.chunk_size
+            assert call_args[1]["max_chunk_bytes"] == vector_store.max_chunk_bytes
+            # Waits for the periodic refresh rather than forcing one
+            assert call_args[1]["refresh"] == "wait_for"
+            assert len(indexed_actions) == 2  # Should have 2 documents
 
             # Verify the structure of the actions
-            for action in actions:
+            for action in indexed_actions:
                 assert action["_index"] == "test_index"
                 assert "embedding" in action["_source"]
                 assert "metadata" in action["_source"]
@@ -180,9 +277,9 @@ class TestVectorStore:
         self, vector_store, mock_es_client, vector_store_mock_responses
     ):
         """Test vector search functionality"""
-        mock_es_client.search.return_value = vector_store_mock_responses[
-            "vector_search"
-        ]
+        mock_es_client.msearch.return_value = {
+            "responses": [vector_store_mock_responses["vector_search"]]
+        }
 
         query_vector = [0.1, 0.2, 0.3]
         filter_dimensions = {"category": "test_category"}
@@ -196,13 +293,58 @@ class TestVectorStore:
 
         assert len(results) == 1
         assert results[0]["_source"]["metadata"]["title"] == "test doc"
-        mock_es_client.search.assert_called_once()
+        mock_es_client.msearch.assert_called_once()
+        knn = mock_es_client.msearch.call_args[1]["body"][1]["knn"]
+        assert sum(x * x for x in knn["query_vector"]) == pytest.approx(1.0)
+        assert knn["k"] == 10
+        assert knn["num_candidates"] >= knn["k"]
+
+    def test_vector_search_multiple_indices(
+        self, vector_store, mock_es_client, vector_store_mock_responses
+    ):
+        """Test that multi-index search uses one msearch and skips failed indices"""
+        mock_es_client.msearch.return_value = {
+            "responses": [
+                vector_store_mock_responses["vector_search"],
+                {"error": {"type": "index_not_found_exception"}, "status": 404},
+            ]
+        }
+
+        results = vector_store.vector_search(
+            query_vector=[0.1, 0.2, 0.3],
+            index_names=["test_index", "missing_index"],
+        )
+
+        assert len(results) == 1
+        mock_es_client.msearch.assert_called_once()
+        msearch_body = mock_es_client.msearch.call_args[1]["body"]
+        assert msearch_body[0]["index"] == "test_index"
+        assert msearch_body[2]["index"] == "missing_index"
+        assert msearch_body[0]["request_cache"] is True
+        assert "embedding" in msearch_body[1]["_source"]["excludes"]
+
+    def test_vector_search_prebuilt_filter(self, vector_store, mock_es_client):
+        """Test that a prebuilt filter is used as is"""
+        prebuilt_filter = [{"term": {"metadata.visibility": "public"}}]
+
+        with patch.object(vector_store, "construct_filter_query") as mock_construct:
+            vector_store.vector_search(
+                query_vector=[0.1, 0.2, 0.3],
+                index_names=["test_index"],
+                prebuilt_filter=prebuilt_filter,
+            )
+
+        mock_construct.assert_not_called()
+        knn = mock_es_client.msearch.call_args[1]["body"][1]["knn"]
+        assert knn["filter"] is prebuilt_filter
 
     def test_bm25_search(
         self, vector_store, mock_es_client, vector_store_mock_responses
     ):
         """Test BM25 search functionality"""
-        mock_es_client.search.return_value = vector_store_mock_responses["bm25_search"]
+        mock_es_client.msearch.return_value = {
+            "responses": [vector_store_mock_responses["bm25_search"]]
+        }
 
         results = vector_store.bm25_search(
             query="test query", index_names=["test_index"], size=10
@@ -210,17 +352,19 @@ class TestVectorStore:
 
         assert len(results) == 1
         assert results[0]["_source"]["metadata"]["title"] == "test doc"
-        mock_es_client.search.assert_called_once()
+        mock_es_client.msearch.assert_called_once()
 
     def test_get_relevant_documents(
         self, vector_store, mock_es_client, vector_store_mock_responses
     ):
         """Test document retrieval with combined search"""
-        # Mock vector search results
-        mock_es_client.search.side_effect = [
-            vector_store_mock_responses["vector_search"],
-            vector_store_mock_responses["bm25_search"],
-        ]
+        # Vector and BM25 searches share one msearch round trip
+        mock_es_client.msearch.return_value = {
+            "responses": [
+                vector_store_mock_responses["vector_search"],
+                vector_store_mock_responses["bm25_search"],
+            ]
+        }
 
         documents = vector_store.get_relevant_documents(
             query="test query",
@@ -231,7 +375,125 @@ class TestVectorStore:
         assert len(documents) > 0
         assert "metadata" in documents[0]
         assert "similarity" in documents[0]
-        assert mock_es_client.search.call_count == 2
+        mock_es_client.msearch.assert_called_once()
+
+    def test_get_relevant_documents_cache(
+        self,
+        vector_store,
+        mock_es_client,
+        mock_embedding_model,
+        vector_store_mock_responses,
+    ):
+        """Test that repeated queries are served from the query cache until a write"""
+        mock_es_client.msearch.return_value = {
+            "responses": [
+                vector_store_mock_responses["vector_search"],
+                vector_store_mock_responses["bm25_search"],
+            ]
+        }
+        kwargs = {
+            "query": "test query",
+            "index_names": ["test_index"],
+            "filter_dimensions": {"category": "test_category"},
+        }
+
+        first = vector_store.get_relevant_documents(**kwargs)
+        second = vector_store.get_relevant_documents(**kwargs)
+
+        assert first == second
+        mock_es_client.msearch.assert_called_once()
+        mock_embedding_model.embed.assert_called_once()
+
+        # Adding a document invalidates cached results
+        vector_store.add_embedding(
+            [0.1, 0.2, 0.3],
+            {"title": "new doc", "pages": [1], "page_images": []},
+            "test_index",
+        )
+        assert mock_es_client.index.call_args[1]["refresh"] == "wait_for"
+        vector_store.get_relevant_documents(**kwargs)
+        assert mock_es_client.msearch.call_count == 2
+
+        # So does deleting a file's sections
+        mock_es_client.delete_by_query.return_value = {"deleted": 2}
+        assert vector_store.delete_file_documents("s3://file.pdf", "test_index") == 2
+        assert mock_es_client.delete_by_query.call_args[1]["refresh"] is True
+        vector_store.get_relevant_documents(**kwargs)
+        assert mock_es_client.msearch.call_count == 3
+
+    def test_search_racing_a_write_is_not_cached(
+        self, vector_store, mock_es_client, vector_store_mock_responses
+    ):
+        """Test that results of a search overlapping a write are not cached"""
+        responses = {
+            "responses": [
+                vector_store_mock_responses["vector_search"],
+                vector_store_mock_responses["bm25_search"],
+            ]
+        }
+
+        def msearch_during_write(**kwargs):
+            # A document is indexed while this search is in flight
+            vector_store._invalidate_query_cache()
+            return responses
+
+        mock_es_client.msearch.side_effect = msearch_during_write
+        vector_store.get_relevant_documents("test query", index_names=["test_index"])
+
+        mock_es_client.msearch.side_effect = None
+        mock_es_client.msearch.return_value = responses
+        vector_store.get_relevant_documents("test query", index_names=["test_index"])
+        assert mock_es_client.msearch.call_count == 2
+
+    def test_query_embedding_cache(
+        self, vector_store, mock_es_client, mock_embedding_model
+    ):
+        """Test that a query is embedded once even when its filters change"""
+        vector_store.get_relevant_documents(
+            "test query", index_names=["test_index"], visibility="public"
+        )
+        vector_store.get_relevant_documents(
+            "test query", index_names=["test_index"], visibility="private"
+        )
+
+        assert mock_es_client.msearch.call_count == 2
+        mock_embedding_model.embed.assert_called_once()
+
+    def test_get_relevant_documents_batch(
+        self,
+        vector_store,
+        mock_es_client,
+        mock_embedding_model,
+        vector_store_mock_responses,
+    ):
+        """Test that batched queries share one embedding call and one msearch"""
+        mock_embedding_model.embed.return_value.embeddings = [
+            [0.1, 0.2, 0.3],
+            [0.3, 0.2, 0.1],
+        ]
+        mock_es_client.msearch.return_value = {
+            "responses": [
+                vector_store_mock_responses["vector_search"],
+                vector_store_mock_responses["bm25_search"],
+                {"hits": {"hits": []}},
+                {"hits": {"hits": []}},
+            ]
+        }
+
+        results = vector_store.get_relevant_documents_batch(
+            ["first query", "second query"], index_names=["test_index"]
+        )
+
+        assert len(results) == 2
+        assert len(results[0]) == 2
+        assert results[1] == []
+        mock_embedding_model.embed.assert_called_once()
+        assert mock_embedding_model.embed.call_args[0][0] == [
+            "first query",
+            "second query",
+        ]
+        mock_es_client.msearch.assert_called_once()
+        assert len(mock_es_client.msearch.call_args[1]["body"]) == 8
 
     def test_construct_filter_query(self, vector_store):
         """Test filter query construction"""
@@ -249,7 +511,12 @@ class TestVectorStore:
             len(filter_query) == 3
         )  # Should have title, dimension, and visibility filters
         assert any("metadata.visibility" in str(q) for q in filter_query)
-        assert any("metadata.title" in str(q) for q in filter_query)
+        title_filter = filter_query[0]["bool"]
+        title_clauses = title_filter["should"]
+        assert title_filter["minimum_should_match"] == 1
+        assert {"terms": {"metadata.title.keyword": document_titles}} in title_clauses
+        # Indices without the keyword subfield still match on the analyzed title
+        assert {"match": {"metadata.title": "doc1"}} in title_clauses
         assert any("metadata.filter_dimensions" in str(q) for q in filter_query)
 
     def test_combine_results_rrf(self, vector_store, mock_es_client):
@@ -329,3 +596,15 @@ class TestVectorStore:
 
         assert doc2_score > doc1_score, "Doc2 should have higher score than Doc1"
         assert doc2_score > doc3_score, "Doc2 should have higher score than Doc3"
+
+        # Each list is ranked independently of the other
+        assert doc1_score == pytest.approx(1 / 60)
+        assert doc3_score == pytest.approx(1 / 61)
+
+        # A document found by both searches keeps its vector search hit
+        doc2 = next(doc for doc in combined if doc["_id"] == "2")
+        assert doc2["_source"] is vector_results[1]["_source"]
+
+        # top_k bounds the number of fused results, keeping the best ones
+        top_one = vector_store.combine_results_rrf(vector_results, bm25_results, top_k=1)
+        assert [doc["_id"] for doc in top_one] == ["2"]
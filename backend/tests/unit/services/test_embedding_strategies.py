@@ -0,0 +1,179 @@
+import asyncio
+import io
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+import pytest
+from fastavro import parse_schema, writer
+
+from services.embedding_strategies import (
+    CohereBatchEmbeddingStrategy,
+    CohereEmbeddingStrategy,
+)
+
+# Shape of the records in a Cohere embed job's output dataset
+EMBED_OUTPUT_SCHEMA = parse_schema(
+    {
+        "type": "record",
+        "name": "EmbedOutput",
+        "fields": [
+            {"name": "text", "type": "string"},
+            {
+                "name": "embeddings",
+                "type": {
+                    "type": "record",
+                    "name": "Embeddings",
+                    "fields": [
+                        {"name": "float", "type": {"type": "array", "items": "float"}}
+                    ],
+                },
+            },
+        ],
+    }
+)
+
+
+class _CohereProvider:
+    """Cohere provider stub that records each batch and embeds a text as [len, 0]"""
+
+    def __init__(self, error: Exception = None):
+        self.batches = []
+        self.error = error
+
+    async def async_embed(self, texts, **kwargs):
+        self.batches.append(list(texts))
+        await asyncio.sleep(0)
+        if self.error is not None:
+            raise self.error
+        return SimpleNamespace(embeddings=[[float(len(text)), 0.0] for text in texts])
+
+
+def _strategy(provider: _CohereProvider, **kwargs) -> CohereEmbeddingStrategy:
+    return CohereEmbeddingStrategy(
+        {"cohere": provider}, near_duplicate_threshold=None, **kwargs
+    )
+
+
+async def _embed(strategy: CohereEmbeddingStrategy, *texts: str) -> list:
+    return await asyncio.wait_for(
+        asyncio.gather(
+            *(
+                strategy.embed_document(
+                    SimpleNamespace(contextualized_segment_text=text)
+                )
+                for text in texts
+            )
+        ),
+        timeout=1,
+    )
+
+
+def _avro_part(records: list[dict]) -> bytes:
+    buffer = io.BytesIO()
+    writer(buffer, EMBED_OUTPUT_SCHEMA, records)
+    return buffer.getvalue()
+
+
+@pytest.mark.unit
+class TestCohereEmbeddingStrategy:
+    """Test suite for batching concurrent Cohere embedding requests"""
+
+    async def test_full_batch_is_sent_without_waiting(self):
+        """Test that a batch is sent as soon as it reaches the batch size"""
+        provider = _CohereProvider()
+        strategy = _strategy(provider, flush_delay=60)
+        texts = [f"text {i}" for i in range(96)]
+
+        vectors = await _embed(strategy, *texts)
+
+        assert provider.batches == [texts]
+        assert [vector[0] for vector in vectors] == [len(text) for text in texts]
+
+    async def test_partial_batch_is_sent_after_flush_delay(self):
+        """Test that texts arriving within flush_delay share one request"""
+        provider = _CohereProvider()
+        strategy = _strategy(provider, flush_delay=0.01)
+
+        vectors = await _embed(strategy, "a", "bb", "ccc")
+
+        assert provider.batches == [["a", "bb", "ccc"]]
+        assert [vector.tolist() for vector in vectors] == [
+            [1.0, 0.0],
+            [2.0, 0.0],
+            [3.0, 0.0],
+        ]
+
+    async def test_token_budget_splits_batches(self):
+        """Test that a text overflowing the token budget starts a new request"""
+        provider = _CohereProvider()
+        # Each text is estimated at 6 tokens
+        strategy = _strategy(provider, flush_delay=0.01, token_budget=15)
+        texts = ["x" * 20, "y" * 20, "z" * 20]
+
+        await _embed(strategy, *texts)
+
+        assert provider.batches == [texts[:2], texts[2:]]
+
+    async def test_identical_texts_are_embedded_once(self):
+        """Test that an identical text already queued shares its result"""
+        provider = _CohereProvider()
+        strategy = _strategy(provider, flush_delay=0.01)
+
+        first, second = await _embed(strategy, "same", "same")
+
+        assert provider.batches == [["same"]]
+        assert first.tolist() == second.tolist() == [4.0, 0.0]
+
+    async def test_failed_request_resolves_all_to_none(self):
+        """Test that every caller of a failed request gets None"""
+        provider = _CohereProvider(error=RuntimeError("api down"))
+        strategy = _strategy(provider, flush_delay=0.01)
+
+        assert await _embed(strategy, "a", "b", "a") == [None, None, None]
+
+    async def test_failed_batch_processing_resolves_all_to_none(self):
+        """Test that an error escaping _process_batch still releases the callers"""
+        strategy = _strategy(_CohereProvider(), flush_delay=0.01)
+
+        with patch.object(
+            strategy, "_process_batch", side_effect=RuntimeError("bad batch")
+        ):
+            assert await _embed(strategy, "a", "b") == [None, None]
+
+        # Failed texts are not left in flight, so they can be retried
+        (vector,) = await _embed(strategy, "a")
+        assert vector.tolist() == [1.0, 0.0]
+
+
+@pytest.mark.unit
+class TestCohereBatchEmbeddingStrategy:
+    """Test suite for reading Cohere embed job output"""
+
+    def test_read_job_output(self):
+        """Test that every dataset part is downloaded and mapped text -> vector"""
+        parts = {
+            "https://datasets.test/part-0.avro": _avro_part(
+                [{"text": "first", "embeddings": {"float": [0.5, 0.25]}}]
+            ),
+            "https://datasets.test/part-1.avro": _avro_part(
+                [{"text": "second", "embeddings": {"float": [1.0, 0.0]}}]
+            ),
+        }
+        dataset = SimpleNamespace(
+            dataset_parts=[SimpleNamespace(url=url) for url in parts]
+        )
+
+        with patch(
+            "cohere.utils.requests.get",
+            side_effect=lambda url, **kwargs: Mock(raw=io.BytesIO(parts[url])),
+        ):
+            embeddings = CohereBatchEmbeddingStrategy._read_job_output(dataset)
+
+        assert embeddings == {"first": [0.5, 0.25], "second": [1.0, 0.0]}
+
+    def test_read_job_output_without_parts(self):
+        """Test that a dataset without downloadable parts raises"""
+        with pytest.raises(ValueError):
+            CohereBatchEmbeddingStrategy._read_job_output(
+                SimpleNamespace(dataset_parts=[])
+            )
@@ -32,6 +32,13 @@ class TestFilterRoutes:
 
         return es_mock
 
+    @pytest.fixture(autouse=True)
+    def clear_dimension_mapping_cache(self):
+        """Start every test without dimension mappings cached by earlier tests"""
+        from services.filter_service import clear_dimension_mapping_cache
+
+        clear_dimension_mapping_cache()
+
     @pytest.fixture
     def filter_app(self, minimal_app, mock_es_client):
         """Configure minimal app with filter blueprint"""
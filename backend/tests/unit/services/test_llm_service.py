@@ -0,0 +1,186 @@
+import asyncio
+
+import pytest
+from unittest.mock import MagicMock
+
+from project_types.error_types import ProviderError
+from services.llm_service import LLM, SYSTEM_MESSAGE_CACHE_MAX_CHARS, _coalesce
+
+
+@pytest.fixture
+def provider():
+    """Provider without prompt caching"""
+    mock = MagicMock()
+    mock.supports_prompt_cache = False
+    return mock
+
+
+@pytest.mark.unit
+class TestSystemMessages:
+    """Test suite for preparing system messages"""
+
+    def test_repeated_prompts_share_a_message(self, provider):
+        """Test that repeated prompts are memoized under a digest of their text"""
+        llm = LLM(provider)
+        prompts = [{"type": "text", "text": "Answer briefly."}]
+
+        first = llm._prepare_system_message(prompts)
+        assert llm._prepare_system_message([dict(block) for block in prompts]) is first
+
+        key = llm._system_prompts_key(prompts, auto_cache=False)
+        assert "Answer briefly." not in repr(key)
+
+    def test_long_prompts_are_not_memoized(self, provider):
+        """Test that whole-document prompts are built without being cached"""
+        llm = LLM(provider)
+        document = "x" * (SYSTEM_MESSAGE_CACHE_MAX_CHARS + 1)
+
+        message = llm._prepare_system_message([{"type": "text", "text": document}])
+
+        assert message["content"][0]["text"] == document
+        assert len(llm._system_message_cache) == 0
+
+    def test_no_system_message_without_system_prompts(self, provider):
+        """Test that calls without system prompts don't get the default prompt"""
+        llm = LLM(provider)
+        messages = [{"role": "user", "content": "Hi"}]
+
+        llm.invoke(messages, model_id="test-model")
+        assert provider.generate.call_args[1]["messages"] == messages
+
+        llm.invoke(messages, model_id="test-model", system_prompts="Be brief.")
+        assert provider.generate.call_args[1]["messages"] == [
+            {"role": "system", "content": "Be brief."},
+            *messages,
+        ]
+
+
+async def _stream(*chunks, delay: float = 0, error: Exception = None, closed=None):
+    """Provider-like stream yielding chunks, optionally spaced out or failing"""
+    try:
+        for chunk in chunks:
+            if delay:
+                await asyncio.sleep(delay)
+            yield chunk
+        if error is not None:
+            raise error
+    finally:
+        if closed is not None:
+            closed.append(True)
+
+
+async def _collect(chunks) -> list[str]:
+    return [chunk async for chunk in chunks]
+
+
+@pytest.mark.unit
+class TestCoalesce:
+    """Test suite for coalescing streamed chunks"""
+
+    async def test_burst_is_joined(self):
+        """Test that chunks available together are yielded as one"""
+        assert await _collect(_coalesce(_stream("a", "b", "c"), 0.05)) == ["abc"]
+
+    async def test_spaced_chunks_stay_separate(self):
+        """Test that chunks arriving after the wait window are not joined"""
+        chunks = _coalesce(_stream("a", "b", delay=0.05), 0.001)
+        assert await _collect(chunks) == ["a", "b"]
+
+    async def test_empty_stream(self):
+        """Test that an empty stream yields nothing"""
+        assert await _collect(_coalesce(_stream(), 0.05)) == []
+
+    async def test_error_mid_burst_delivers_buffer(self):
+        """Test that chunks read before a stream error are yielded before it raises"""
+        received = []
+        with pytest.raises(RuntimeError):
+            async for chunk in _coalesce(
+                _stream("a", error=RuntimeError("stream failed")), 0.05
+            ):
+                received.append(chunk)
+
+        assert received == ["a"]
+
+    async def test_aclose_stops_the_provider_stream(self):
+        """Test that closing early cancels the pending read and closes the source"""
+        closed = []
+        chunks = _coalesce(_stream("a", "b", delay=0.05, closed=closed), 0.001)
+
+        assert await chunks.__anext__() == "a"
+        await chunks.aclose()
+        await asyncio.sleep(0)
+
+        assert closed == [True]
+
+
+class _ConcurrentProvider:
+    """Provider without a batch API that records how many calls overlap"""
+
+    supports_prompt_cache = False
+
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def agenerate(self, messages, model_id, stream=False, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return messages[-1]["content"]
+
+
+class _BatchProvider:
+    """Provider with a batch API that echoes each request's last message"""
+
+    supports_prompt_cache = False
+
+    def __init__(self, drop: int = 0):
+        self.drop = drop
+        self.batches = []
+
+    async def abatch_generate(self, requests, **kwargs):
+        self.batches.append([messages[-1]["content"] for messages, _ in requests])
+        return [messages[-1]["content"] for messages, _ in requests][self.drop :]
+
+
+def _batch(*contents: str) -> list:
+    return [
+        ([{"role": "user", "content": content}], "test-model") for content in contents
+    ]
+
+
+@pytest.mark.unit
+class TestInvokeMany:
+    """Test suite for batched LLM requests"""
+
+    async def test_fallback_limits_concurrency(self):
+        """Test that without a batch API calls are bounded by max_concurrency"""
+        provider = _ConcurrentProvider()
+        contents = [f"request {i}" for i in range(6)]
+
+        responses = await LLM(provider).ainvoke_many(
+            _batch(*contents), max_concurrency=2
+        )
+
+        assert responses == contents
+        assert provider.max_in_flight == 2
+
+    async def test_batch_api_bins_by_size(self):
+        """Test that requests are binned by size and answered in batch order"""
+        provider = _BatchProvider()
+        long_request = "x" * 4000
+
+        responses = await LLM(provider).ainvoke_many(
+            _batch("short", long_request, "also short")
+        )
+
+        assert responses == ["short", long_request, "also short"]
+        assert sorted(provider.batches) == sorted(
+            [["short", "also short"], [long_request]]
+        )
+
+    async def test_batch_api_missing_responses_raise(self):
+        """Test that a bin answered with too few responses raises"""
+        with pytest.raises(ProviderError):
+            await LLM(_BatchProvider(drop=1)).ainvoke_many(_batch("a", "b"))
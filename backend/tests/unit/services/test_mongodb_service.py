@@ -0,0 +1,223 @@
+import threading
+import time
+
+import pytest
+from flask import Flask
+from unittest.mock import MagicMock
+from pymongo.errors import (
+    ConfigurationError,
+    OperationFailure,
+    ServerSelectionTimeoutError,
+)
+
+from blueprints.misc_routes import create_misc_blueprint
+from services import mongodb_service
+from services.mongodb_service import connect_db, db_ready, is_db_ready
+
+
+@pytest.fixture(autouse=True)
+def reset_db_ready():
+    """Start and end every test with the database not ready"""
+    db_ready.clear()
+    yield
+    db_ready.clear()
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config["MONGODB_SETTINGS"] = {"serverSelectionTimeoutMS": 30000}
+    return app
+
+
+def _db(*ping_results):
+    """MongoEngine mock whose pings raise or return the given results in turn"""
+    db = MagicMock()
+    db.get_db.return_value.command.side_effect = list(ping_results)
+    return db
+
+
+def _unreachable_db():
+    """MongoEngine mock whose pings always time out"""
+
+    def ping(command):
+        time.sleep(0.01)
+        raise ServerSelectionTimeoutError("down")
+
+    db = MagicMock()
+    db.get_db.return_value.command.side_effect = ping
+    return db
+
+
+class _RecordedStop(threading.Event):
+    """Stop event that records backoff waits instead of sleeping"""
+
+    def __init__(self):
+        super().__init__()
+        self.delays = []
+
+    def wait(self, timeout=None):
+        self.delays.append(timeout)
+        return False
+
+
+def _server_wait() -> mongodb_service._ServerWait:
+    wait = mongodb_service._ServerWait()
+    wait.stopped = _RecordedStop()
+    return wait
+
+
+@pytest.mark.unit
+class TestWaitForServer:
+    """Test suite for the background MongoDB ping loop"""
+
+    def test_ready_after_ping(self, app):
+        """Test that a successful ping marks the database as ready"""
+        wait = _server_wait()
+        assert not is_db_ready()
+
+        mongodb_service._wait_for_server(app, _db({"ok": 1}), "mongo", 10, wait)
+
+        assert is_db_ready()
+        assert wait.done.is_set()
+        assert wait.error is None
+
+    def test_timeouts_are_retried_without_backoff(self, app):
+        """Test that server selection timeouts are retried straight away"""
+        wait = _server_wait()
+        db = _db(ServerSelectionTimeoutError("down"), {"ok": 1})
+
+        mongodb_service._wait_for_server(app, db, "mongo", 10, wait)
+
+        assert is_db_ready()
+        assert wait.stopped.delays == []
+
+    def test_other_errors_are_retried_with_backoff(self, app):
+        """Test that e.g. auth failures are retried with growing, capped delays"""
+        wait = _server_wait()
+        failures = [OperationFailure("auth failed") for _ in range(5)]
+        db = _db(*failures, {"ok": 1})
+
+        mongodb_service._wait_for_server(app, db, "mongo", 10, wait)
+
+        assert is_db_ready()
+        assert len(wait.stopped.delays) == 5
+        for attempt, delay in enumerate(wait.stopped.delays, start=1):
+            base = min(10 * 2 ** (attempt - 1), mongodb_service.MAX_RETRY_DELAY)
+            assert base * 0.5 <= delay <= base * 1.5
+
+    def test_configuration_error_stops_retrying(self, app):
+        """Test that an invalid configuration is not retried but kept on the wait"""
+        wait = _server_wait()
+        error = ConfigurationError("bad uri")
+        db = _db(error, {"ok": 1})
+
+        mongodb_service._wait_for_server(app, db, "mongo", 10, wait)
+
+        assert not is_db_ready()
+        assert db.get_db.return_value.command.call_count == 1
+        assert wait.done.is_set()
+        assert wait.error is error
+
+    def test_stopped_wait_does_not_mark_ready(self, app):
+        """Test that a wait replaced by a reconnect exits without setting db_ready"""
+        wait = _server_wait()
+        wait.stop()
+
+        mongodb_service._wait_for_server(app, _db({"ok": 1}), "mongo", 10, wait)
+
+        assert not is_db_ready()
+        assert wait.done.is_set()
+
+
+@pytest.mark.unit
+class TestConnectDb:
+    """Test suite for connecting to MongoDB at startup"""
+
+    @pytest.fixture(autouse=True)
+    def no_disconnect(self, monkeypatch):
+        monkeypatch.setattr(mongodb_service, "disconnect_all", lambda: None)
+
+    @pytest.fixture(autouse=True)
+    def stop_ping_threads(self):
+        """Don't leave a test's ping thread running into the next test"""
+        yield
+        if mongodb_service._server_wait is not None:
+            mongodb_service._server_wait.stop()
+            mongodb_service._server_wait.thread.join(1)
+
+    def test_blocks_until_ready(self, app):
+        """Test that startup waits for the server by default"""
+        connect_db(app, _db({"ok": 1}), max_retries=5, retry_delay=1)
+
+        assert is_db_ready()
+        assert app.config["MONGODB_SETTINGS"]["serverSelectionTimeoutMS"] == 30000
+
+    def test_fails_fast_when_unreachable(self, app):
+        """Test that startup raises, and stops pinging, when the server is down"""
+        with pytest.raises(ServerSelectionTimeoutError):
+            connect_db(app, _unreachable_db(), max_retries=1, retry_delay=0.05)
+
+        wait = mongodb_service._server_wait
+        wait.thread.join(1)
+        assert not wait.thread.is_alive()
+        assert not is_db_ready()
+
+    def test_configuration_error_is_raised_immediately(self, app):
+        """Test that an invalid configuration doesn't wait out the retry budget"""
+        started = time.monotonic()
+
+        with pytest.raises(ConfigurationError):
+            connect_db(app, _db(ConfigurationError("bad uri")), retry_delay=10)
+
+        assert time.monotonic() - started < 5
+        assert not is_db_ready()
+
+    def test_reconnect_replaces_the_ping_thread(self, app):
+        """Test that connecting again stops the previous connection's pings"""
+        app.config["MONGO_CONNECT_IN_BACKGROUND"] = True
+        connect_db(app, _unreachable_db(), retry_delay=0.01)
+        first = mongodb_service._server_wait
+
+        connect_db(app, _db({"ok": 1}), retry_delay=0.01)
+        second = mongodb_service._server_wait
+
+        first.thread.join(1)
+        assert not first.thread.is_alive()
+        second.thread.join(1)
+        assert is_db_ready()
+
+    def test_background_connect_returns_immediately(self, app):
+        """Test that startup doesn't wait when a readiness probe gates traffic"""
+        app.config["MONGO_CONNECT_IN_BACKGROUND"] = True
+
+        connect_db(app, _unreachable_db(), max_retries=1, retry_delay=0.01)
+
+        assert not is_db_ready()
+        assert mongodb_service._server_wait.thread.is_alive()
+
+
+@pytest.mark.unit
+class TestProbes:
+    """Test suite for the liveness and readiness endpoints"""
+
+    @pytest.fixture
+    def client(self, app):
+        app.register_blueprint(create_misc_blueprint(MagicMock()))
+        return app.test_client()
+
+    def test_readyz_until_db_ready(self, client):
+        """Test that readiness fails until MongoDB has been reached"""
+        response = client.get("/api/readyz")
+        assert response.status_code == 503
+        assert response.get_json() == {"status": "starting"}
+
+        db_ready.set()
+
+        response = client.get("/api/readyz")
+        assert response.status_code == 200
+        assert response.get_json() == {"status": "ok"}
+
+    def test_livez_without_db(self, client):
+        """Test that liveness doesn't depend on MongoDB"""
+        assert client.get("/api/livez").status_code == 200
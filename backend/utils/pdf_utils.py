@@ -3,76 +3,144 @@ Utility functions for processing PDF files, including page extraction and image
 """
 
 import fitz  # PyMuPDF
-from PIL import Image
-import io
 import base64
-from typing import List, Tuple
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+from typing import Iterable, List, Optional, Tuple
 from loguru import logger
 import asyncio
 
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = Lock()
+
+
+def get_pdf_process_pool() -> ProcessPoolExecutor:
+    """
+    Return the shared process pool for CPU-bound PDF rasterization.
+
+    Rendering in worker processes keeps it from holding the GIL in the web server
+    and lets concurrent uploads use several cores. Workers are spawned rather than
+    forked so they don't inherit the server's threads and open connections.
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count(),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _process_pool
+
+
+def _render_page_jpeg(
+    page: fitz.Page,
+    target_width: int,
+    target_height: int,
+    quality: int = 85,
+) -> bytes:
+    """
+    Render a PDF page straight to JPEG bytes at the target dimensions.
+
+    The rendering matrix is chosen so the pixmap already has the aspect-ratio
+    preserving target size, so no PIL decode/resize round-trip is needed and
+    encoding happens inside PyMuPDF.
+
+    Args:
+        page: PyMuPDF page object
+        target_width: Target width for landscape pages
+        target_height: Target height for portrait pages
+        quality: JPEG quality
+
+    Returns:
+        bytes: JPEG-encoded page image
+    """
+    rect = page.rect
+    if rect.width > rect.height:  # Wider than tall
+        scale = target_width / rect.width
+    else:  # Taller than wide
+        scale = target_height / rect.height
+
+    pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False)
+    return pix.tobytes("jpeg", jpg_quality=quality)
+
 
 def extract_and_process_pdf_pages(
     file_path: str,
     target_width: int = 1568,
     target_height: int = 1568,
-    zoom: float = 3.0,
+    pages: Optional[Iterable[int]] = None,
 ) -> List[str]:
     """
-    Extract pages from a PDF file, convert them to images, resize them to target dimensions,
+    Extract pages from a PDF file, render them as JPEG images at the target dimensions,
     and encode them as base64 strings.
 
+    Each page is encoded exactly once; callers that attach the same page to several
+    sections share the resulting string object rather than holding decoded images.
+
     Args:
         file_path: Path to the PDF file
-        target_width: Target width for the resized images (default 1568 for Claude)
-        target_height: Target height for the resized images (default 1568 for Claude)
-        zoom: Zoom factor for initial PDF rendering (higher means better quality)
+        target_width: Target width for the rendered images (default 1568 for Claude)
+        target_height: Target height for the rendered images (default 1568 for Claude)
+        pages: 1-based numbers of the pages to render, in order; every page by
+            default. Numbers outside the document are skipped.
 
     Returns:
         List[str]: List of base64-encoded strings for each page image
     """
     try:
-        pdf = fitz.open(file_path)
         base64_images = []
 
-        # Initial rendering matrix with zoom
-        mat = fitz.Matrix(zoom, zoom)
-
-        for page_num in range(pdf.page_count):
-            # Get the page
-            page = pdf[page_num]
-
-            # Render page to pixmap
-            pix = page.get_pixmap(matrix=mat)
+        with fitz.open(file_path) as pdf:
+            selected = (
+                pdf
+                if pages is None
+                else (pdf[num - 1] for num in pages if 1 <= num <= pdf.page_count)
+            )
+            for page in selected:
+                jpeg_bytes = _render_page_jpeg(page, target_width, target_height)
+                base64_images.append(base64.b64encode(jpeg_bytes).decode())
 
-            # Convert pixmap to PIL Image
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+        return base64_images
 
-            # Calculate aspect ratio preserving dimensions
-            orig_width, orig_height = img.size
-            aspect_ratio = orig_width / orig_height
+    except Exception as e:
+        print(f"Error processing PDF: {str(e)}")
+        return []
 
-            if aspect_ratio > 1:  # Wider than tall
-                new_width = target_width
-                new_height = int(target_width / aspect_ratio)
-            else:  # Taller than wide
-                new_height = target_height
-                new_width = int(target_height * aspect_ratio)
 
-            # Resize image preserving aspect ratio
-            img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+def render_pdf_thumbnails(
+    pdf_path: str,
+    max_pages: int = 2,
+    dpi: int = 150,
+    max_width: int = 900,
+    max_height: int = 1600,
+) -> List[bytes]:
+    """
+    Render the first pages of a PDF as JPEG thumbnails.
 
-            # Convert to base64
-            buffered = io.BytesIO()
-            img.save(buffered, format="JPEG", quality=85)  # Use JPEG with good quality
-            img_base64 = base64.b64encode(buffered.getvalue()).decode()
-            base64_images.append(img_base64)
+    Pages are rendered at dpi, shrunk if needed to fit within max_width x
+    max_height while keeping their aspect ratio. Module-level so it can run in
+    the process pool.
 
-        pdf.close()
-        return base64_images
+    Args:
+        pdf_path: Path to the PDF file
+        max_pages: Number of leading pages to render
+        dpi: Rendering resolution before any shrinking
+        max_width: Maximum thumbnail width in pixels
+        max_height: Maximum thumbnail height in pixels
 
-    except Exception as e:
-        print(f"Error processing PDF: {str(e)}")
-        return []
+    Returns:
+        List[bytes]: JPEG-encoded thumbnails
+    """
+    thumbnails = []
+    with fitz.open(pdf_path) as pdf:
+        for page in pdf.pages(0, min(max_pages, pdf.page_count)):
+            rect = page.rect
+            scale = min(dpi / 72, max_width / rect.width, max_height / rect.height)
+            pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False)
+            thumbnails.append(pix.tobytes("jpeg", jpg_quality=75))
+    return thumbnails
 
 
 def get_pdf_dimensions(file_path: str) -> List[Tuple[float, float]]:
@@ -105,50 +173,21 @@ async def process_page_to_image(
     page: fitz.Page,
     target_width: int,
     target_height: int,
-    zoom: float,
 ) -> str:
     """
     Process a single PDF page to a base64 encoded image string.
 
     Args:
         page: PyMuPDF page object
-        target_width: Target width for the resized image
-        target_height: Target height for the resized image
-        zoom: Zoom factor for initial PDF rendering
+        target_width: Target width for the rendered image
+        target_height: Target height for the rendered image
 
     Returns:
         str: Base64-encoded image string
     """
     try:
-        # Create rendering matrix with zoom
-        mat = fitz.Matrix(zoom, zoom)
-
-        # Render page to pixmap
-        pix = page.get_pixmap(matrix=mat)
-
-        # Convert pixmap to PIL Image
-        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-
-        # Calculate aspect ratio preserving dimensions
-        orig_width, orig_height = img.size
-        aspect_ratio = orig_width / orig_height
-
-        if aspect_ratio > 1:  # Wider than tall
-            new_width = target_width
-            new_height = int(target_width / aspect_ratio)
-        else:  # Taller than wide
-            new_height = target_height
-            new_width = int(target_height * aspect_ratio)
-
-        # Resize image preserving aspect ratio
-        img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-
-        # Convert to base64
-        buffered = io.BytesIO()
-        img.save(buffered, format="JPEG", quality=85)  # Use JPEG with good quality
-        img_base64 = base64.b64encode(buffered.getvalue()).decode()
-
-        return img_base64
+        jpeg_bytes = _render_page_jpeg(page, target_width, target_height)
+        return base64.b64encode(jpeg_bytes).decode()
     except Exception as e:
         logger.error(f"Error processing page to image: {str(e)}")
         return ""
@@ -158,7 +197,6 @@ async def async_extract_and_process_pdf_pages(
     file_path: str,
     target_width: int = 1568,
     target_height: int = 1568,
-    zoom: float = 3.0,
 ) -> List[str]:
     """
     Extract pages from a PDF file, convert them to images, resize them to target dimensions,
@@ -168,7 +206,6 @@ async def async_extract_and_process_pdf_pages(
         file_path: Path to the PDF file
         target_width: Target width for the resized images (default 1568 for Claude)
         target_height: Target height for the resized images (default 1568 for Claude)
-        zoom: Zoom factor for initial PDF rendering (higher means better quality)
 
     Returns:
         List[str]: List of base64-encoded strings for each page image
@@ -178,7 +215,7 @@ async def async_extract_and_process_pdf_pages(
 
         # Process all pages concurrently
         tasks = [
-            process_page_to_image(pdf[page_num], target_width, target_height, zoom)
+            process_page_to_image(pdf[page_num], target_width, target_height)
             for page_num in range(pdf.page_count)
         ]
 
@@ -32,6 +32,9 @@ class NotGiven:
     ```
     """
 
+    # Identity-compared singleton (NOT_GIVEN); no per-instance state
+    __slots__ = ()
+
     def __bool__(self) -> Literal[False]:
         return False
 
@@ -9,7 +9,10 @@ from imports.k8s import (
     PodSpec,
     Container,
     ContainerPort,
+    EnvVar,
+    HttpGetAction,
     IntOrString,
+    Probe,
 )
 import os
 
@@ -53,6 +56,25 @@ class BackendChart(Chart):
             {"secretRef": {"name": "elasticsearch-secrets"}},
         ]
 
+    def _get_probes(self):
+        """Get readiness and liveness probes for backend container"""
+        port = IntOrString.from_number(5000)
+        return {
+            # Not ready until MongoDB has answered; the backend starts serving
+            # before that (MONGO_CONNECT_IN_BACKGROUND)
+            "readiness_probe": Probe(
+                http_get=HttpGetAction(path="/api/readyz", port=port),
+                period_seconds=5,
+                failure_threshold=3,
+            ),
+            "liveness_probe": Probe(
+                http_get=HttpGetAction(path="/api/livez", port=port),
+                initial_delay_seconds=30,
+                period_seconds=15,
+                failure_threshold=4,
+            ),
+        }
+
     def _create_deployment(self):
         """Create backend deployment"""
         actual_tag = "latest" if self.use_latest else self.image_tag
@@ -77,6 +99,13 @@ class BackendChart(Chart):
                                 else "IfNotPresent",
                                 ports=[ContainerPort(container_port=5000)],
                                 env_from=self._get_env_sources(),
+                                env=[
+                                    EnvVar(
+                                        name="MONGO_CONNECT_IN_BACKGROUND",
+                                        value="true",
+                                    )
+                                ],
+                                **self._get_probes(),
                             )
                         ]
                     ),